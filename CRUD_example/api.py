@@ -0,0 +1,277 @@
+# 'api' contains the resources of the JSON API, served by 'ApiListView' and
+# 'ApiDetailView' in 'views'. Each resource is a table that can be listed,
+# read, created, updated and deleted.
+# Rows are read with 'values_list', so no model object is created per row,
+# and '?fields=' selects the columns that are returned and queried. Lists are
+# paged with a cursor like the tables, see 'pagination'.
+# Objects are created and updated with the forms used by the pages, so the
+# rules checked and the work done on save (counters, logos, background jobs,
+# cached tables) are the same.
+#
+# Every GET response has an 'ETag' made of a hash of its body, so it changes
+# with the data whichever process changed it. A request sending the ETag back
+# in 'If-None-Match' gets a 304 response without the body. The rows are still
+# read to compute it. 'Last-Modified' is the newest date of the returned rows.
+# Those dates are set when an object is created and edits do not change them,
+# so 'If-Modified-Since' is not used to answer with a 304.
+
+# 'datetime' is used to find the newest date of the rows
+import datetime
+
+# 'json' reads the request body
+import json
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+# 'JsonResponse' returns the errors
+from django.http import JsonResponse
+
+# Import the models served by the API
+from CRUD_example.models import Customer, Software, CustomerSoftware
+
+# Import the forms checking and saving the objects
+from CRUD_example.forms import (
+    NewCustomerForm,
+    EditCustomerForm,
+    NewSoftwareForm,
+    EditSoftwareForm,
+    NewCustomerSoftwareForm,
+    EditCustomerSoftwareForm,
+)
+
+# 'delete_selected' deletes objects, or adds a job deleting them
+from CRUD_example.jobs import delete_selected
+
+# The cursor functions of the table views
+from CRUD_example.pagination import CURSOR_FIELD, MAX_PER_PAGE, decode_cursor, encode_cursor, keyset_filter
+
+
+# 'ApiError' is raised to answer a request with an error
+class ApiError(Exception):
+
+    def __init__(self, status, detail, errors=None):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.errors = errors
+
+    def response(self):
+        data = {'detail': self.detail}
+        if self.errors is not None:
+            data['errors'] = self.errors
+        return JsonResponse(data, status=self.status)
+
+
+# 'read_json' returns the JSON object in the body of a request
+def read_json(request):
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        raise ApiError(400, 'The body is not valid JSON.')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'The body must be a JSON object.')
+    return data
+
+
+# 'Resource' is the base class of the resources.
+class Resource:
+    model = None
+    # 'fields' maps the fields of the API to the lookups read with 'values_list'
+    fields = {}
+    # 'writable' are the fields sent to the forms, with the same names
+    writable = ()
+    # 'date_field' is the field giving 'Last-Modified'
+    date_field = None
+    # 'ordering' are the fields that can be used with '?ordering='
+    ordering = ('id',)
+    # 'filters' maps url parameters to id lookups that filter lists
+    filters = {}
+    # 'new_form' creates objects and 'edit_form' updates them
+    new_form = None
+    edit_form = None
+
+    # 'per_page' returns the page size, which can be set with '?per_page='
+    def per_page(self, request):
+        try:
+            per_page = int(request.GET.get('per_page', getattr(settings, 'API_PER_PAGE', 50)))
+        except ValueError:
+            raise ApiError(400, 'per_page must be a number.')
+        return max(1, min(per_page, MAX_PER_PAGE))
+
+    # 'selected_fields' returns the fields asked for with '?fields='
+    def selected_fields(self, request):
+        value = request.GET.get('fields', '')
+        if not value:
+            return list(self.fields)
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown or not names:
+            raise ApiError(400, 'Unknown fields: {}. Fields are: {}.'.format(', '.join(unknown), ', '.join(self.fields)))
+        # Keep the order of 'fields' and drop duplicates
+        return [name for name in self.fields if name in names]
+
+    # 'read' runs 'queryset' for the fields 'names' and returns the rows as
+    # dicts, the values of the extra lookups 'keys' of each row and the newest
+    # date of the rows
+    def read(self, queryset, names, keys=()):
+        lookups = [self.fields[name] for name in names]
+        extra = [key for key in keys if key not in lookups]
+        if self.date_field not in lookups and self.date_field not in extra:
+            extra.append(self.date_field)
+        columns = lookups + extra
+        positions = [columns.index(key) for key in keys]
+        date_position = columns.index(self.date_field)
+
+        rows = []
+        key_values = []
+        last_modified = None
+        for values in queryset.values_list(*columns):
+            rows.append(dict(zip(names, values)))
+            key_values.append([values[position] for position in positions])
+            date = values[date_position]
+            if isinstance(date, datetime.datetime) and (last_modified is None or date > last_modified):
+                last_modified = date
+        return rows, key_values, last_modified
+
+    # 'list' returns a page of objects, the cursor of the next page or None,
+    # and the newest date of the page
+    def list(self, request):
+        names = self.selected_fields(request)
+        order = request.GET.get('ordering', 'id')
+        if order.lstrip('-') not in self.ordering:
+            raise ApiError(400, 'ordering must be one of: {}.'.format(', '.join(self.ordering)))
+        field = self.fields[order.lstrip('-')]
+        descending = order.startswith('-')
+        keys = [field] if field == 'id' else [field, 'id']
+        ordered = ['-' + key if descending else key for key in keys]
+        queryset = self.model.objects.order_by(*ordered)
+
+        for parameter, lookup in self.filters.items():
+            if parameter in request.GET:
+                try:
+                    queryset = queryset.filter(**{lookup: int(request.GET[parameter])})
+                except ValueError:
+                    raise ApiError(400, '{} must be an id.'.format(parameter))
+
+        # The ordering is stored in the cursor so it is not used with another one
+        cursor = decode_cursor(request.GET.get(CURSOR_FIELD, ''))
+        if request.GET.get(CURSOR_FIELD):
+            if cursor is None or cursor[0] != order or not isinstance(cursor[1], list) or len(cursor[1]) != len(keys):
+                raise ApiError(400, 'The cursor is not valid for this ordering.')
+            queryset = queryset.filter(keyset_filter(ordered, cursor[1]))
+
+        per_page = self.per_page(request)
+        # Load one extra row to know if there is a next page
+        rows, key_values, last_modified = self.read(queryset[:per_page + 1], names, keys)
+        next = None
+        if len(rows) > per_page:
+            rows = rows[:per_page]
+            next = encode_cursor(order, key_values[per_page - 1], 'next')
+        return rows, next, last_modified
+
+    # 'retrieve' returns an object and its date, or None
+    def retrieve(self, request, id):
+        rows, key_values, last_modified = self.read(self.model.objects.filter(id=id), self.selected_fields(request))
+        if not rows:
+            return None, None
+        return rows[0], last_modified
+
+    # 'current' returns the writable fields of an object, used to fill in the
+    # fields missing from a 'PATCH'
+    def current(self, obj):
+        return {name: getattr(obj, name) for name in self.writable}
+
+    # 'form_data' returns the writable fields of a request body
+    def form_data(self, data):
+        return {name: data[name] for name in self.writable if name in data}
+
+    # 'create' saves a new object and returns its id
+    def create(self, data):
+        form = self.new_form(data=self.form_data(data))
+        obj = form.save() if form.is_valid() else None
+        if not obj:
+            raise ApiError(400, 'The object is not valid.', form.errors.get_json_data())
+        return obj.id
+
+    # 'update' saves the fields of 'data' to an object. With 'partial',
+    # missing fields keep their value.
+    def update(self, obj, data, partial):
+        values = self.current(obj) if partial else {}
+        values.update(self.form_data(data))
+        form = self.edit_form(data=values, instance=obj)
+        # 'save' returns False when the database refused the change
+        if not form.is_valid() or form.save() is False:
+            raise ApiError(400, 'The object is not valid.', form.errors.get_json_data())
+
+    # 'delete' deletes an object and returns a message
+    def delete(self, obj):
+        return delete_selected(self.model, [obj.id])
+
+
+# 'CustomerResource' serves 'Customer' objects
+class CustomerResource(Resource):
+    model = Customer
+    fields = {
+        'id': 'id',
+        'name': 'name',
+        'date_created': 'date_created',
+        'software_count': 'software_count',
+    }
+    writable = ('name',)
+    date_field = 'date_created'
+    ordering = ('id', 'name', 'date_created', 'software_count')
+    new_form = NewCustomerForm
+    edit_form = EditCustomerForm
+
+
+# 'SoftwareResource' serves 'Software' objects
+class SoftwareResource(Resource):
+    model = Software
+    fields = {
+        'id': 'id',
+        'name': 'name',
+        'image': 'image',
+        'image_status': 'image_status',
+        'date_added': 'date_added',
+        'customer_count': 'customer_count',
+    }
+    writable = ('name', 'image')
+    date_field = 'date_added'
+    ordering = ('id', 'name', 'date_added', 'customer_count')
+    new_form = NewSoftwareForm
+    edit_form = EditSoftwareForm
+
+
+# 'CustomerSoftwareResource' serves 'CustomerSoftware' objects. 'customer'
+# and 'software' are ids, their names are read with a join when selected.
+class CustomerSoftwareResource(Resource):
+    model = CustomerSoftware
+    fields = {
+        'id': 'id',
+        'customer': 'cid_id',
+        'customer_name': 'cid__name',
+        'software': 'sid_id',
+        'software_name': 'sid__name',
+        'date_obtained': 'date_obtained',
+    }
+    writable = ('customer', 'software')
+    date_field = 'date_obtained'
+    ordering = ('id', 'date_obtained')
+    filters = {
+        'customer': 'cid_id',
+        'software': 'sid_id',
+    }
+    new_form = NewCustomerSoftwareForm
+    edit_form = EditCustomerSoftwareForm
+
+    def current(self, obj):
+        return {'customer': obj.cid_id, 'software': obj.sid_id}
+
+
+# 'RESOURCES' maps each resource of the API to its class
+RESOURCES = {
+    'customers': CustomerResource,
+    'software': SoftwareResource,
+    'customersoftware': CustomerSoftwareResource,
+}
@@ -0,0 +1,42 @@
+# 'AppConfig' is used to configure the app when Django starts
+from django.apps import AppConfig
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+# 'register' adds a system check, run when the server or a command starts
+from django.core.checks import register
+
+# 'connection_created' is sent every time a database connection is opened
+from django.db.backends.signals import connection_created
+
+# 'post_save' and 'post_delete' are sent when an object is saved or deleted
+from django.db.models.signals import post_delete, post_save
+
+
+class CrudExampleConfig(AppConfig):
+    name = 'CRUD_example'
+
+    # 'ready' runs once the app is loaded
+    def ready(self):
+        # Import here, the app must be loaded before its modules are imported
+        from CRUD_example.db import configure_sqlite
+
+        # Apply 'settings.SQLITE_PRAGMAS' to every new connection
+        connection_created.connect(configure_sqlite)
+
+        # Refuse a process-local table cache when jobs change objects
+        from CRUD_example.checks import check_table_cache
+        register(check_table_cache)
+
+        # Remove changed users from the cache of 'CachedModelBackend'
+        from CRUD_example.backends import forget_user
+        from CRUD_example.models import User
+        post_save.connect(forget_user, sender=User)
+        post_delete.connect(forget_user, sender=User)
+
+        # Measure queries and templates for 'InstrumentationMiddleware'
+        if getattr(settings, 'INSTRUMENTATION', False):
+            from CRUD_example.instrumentation import add_query_recorder, time_templates
+            connection_created.connect(add_query_recorder)
+            time_templates()
@@ -9,8 +9,21 @@ https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+# 'get_asgi_application' returns a handler that reads streaming responses,
+# such as the table exports, off the event loop, see 'CRUD_example/handlers.py'
+from CRUD_example.handlers import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CRUD_example.settings')
 
 application = get_asgi_application()
+
+# Switch SQLite to 'settings.SQLITE_JOURNAL_MODE', see 'CRUD_example/db.py'
+from CRUD_example.db import set_journal_modes
+
+set_journal_modes()
+
+# Compile the templates before the first request, see 'CRUD_example/warmup.py'.
+# Django is set up by now, so the app can be imported.
+from CRUD_example.warmup import warm_templates
+
+warm_templates()
@@ -0,0 +1,220 @@
+# 'asyncviews' contains async variants of the table, create, edit, login and
+# register views, used instead of the regular views when 'settings.ASYNC_VIEWS'
+# is set and the site is served by 'asgi.py'.
+# Under ASGI, a regular view holds a thread for the whole request. Checking
+# and downloading a software image can take seconds, so a few slow image
+# servers could keep every thread busy. The software views here wait on those
+# servers with asyncio instead, and only use a thread for the database work.
+# Django 4.0 has no async ORM methods, so database work is run with
+# 'sync_to_async', in one call per step rather than one per query.
+# The login and register views hash passwords in the pool of 'hashers'
+# instead of the thread shared by every request.
+
+# 'asyncio' is used to find the async handlers
+import asyncio
+
+# 'update_wrapper' copies the attributes of the views to their async wrapper
+from functools import update_wrapper
+
+# 'sync_to_async' runs blocking code in a thread and waits for it
+from asgiref.sync import sync_to_async
+
+# 'redirect_to_login' sends unauthenticated users to the login page
+from django.contrib.auth.views import redirect_to_login
+
+# 'redirect' is used to return a 'HttpResponseRedirect'
+from django.shortcuts import redirect
+
+# 'off_thread' hashes passwords in a pool of threads
+from CRUD_example.hashers import off_thread
+
+# 'get_async_image_validator' checks image urls without blocking
+from CRUD_example.images import get_async_image_validator
+
+# 'ingest_logo_async' downloads and stores logos without blocking
+from CRUD_example.logos import ingest_logo_async
+
+# Import the views that have async variants.
+from CRUD_example.views import (
+    CustomersView,
+    NewCustomerView,
+    EditCustomerView,
+    SoftwareView,
+    NewSoftwareView,
+    EditSoftwareView,
+    CustomerSoftwareView,
+    NewCustomerSoftwareView,
+    EditCustomerSoftwareView,
+    RegisterView,
+    LoginView,
+)
+
+
+# 'is_authenticated' loads the user of a request, which may query the database
+def is_authenticated(request):
+    return request.user.is_authenticated
+
+
+# 'AsyncViewMixin' turns a class-based view into an async view.
+# Handlers defined with 'async def' are awaited, the others run in a thread.
+# It also replaces 'login_required', which can not be used on async views.
+class AsyncViewMixin:
+    # Set to False for pages open to unauthenticated users
+    login_required = True
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        # Django awaits views defined with 'async def'. Django 4.1 also awaits
+        # views with async handlers, 4.0 needs the view wrapped by hand.
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        # Keep 'view_class' and the other attributes of the view
+        return update_wrapper(async_view, view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        if self.login_required and not await sync_to_async(is_authenticated)(request):
+            return redirect_to_login(request.get_full_path())
+        if request.method.lower() in self.http_method_names:
+            handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+        else:
+            handler = self.http_method_not_allowed
+        if asyncio.iscoroutinefunction(handler):
+            return await handler(request, *args, **kwargs)
+        return await sync_to_async(handler)(request, *args, **kwargs)
+
+
+# 'AsyncSoftwareFormMixin' is used with the software create and edit views.
+# The image url is checked before the form is validated, and the logo is
+# downloaded before the software is saved, both on the event loop. The form
+# is validated and saved in a thread with the results.
+class AsyncSoftwareFormMixin:
+
+    async def post(self, request, *args, **kwargs):
+        url = request.POST.get('image', '')
+        self.image_probes = {}
+        if url:
+            self.image_probes[url] = await get_async_image_validator().probe(url)
+
+        form = await sync_to_async(self.get_validated_form)()
+        if form is None:
+            # The object to edit does not exist
+            return redirect(self.get_success_url())
+        if not form.is_valid():
+            return self.form_invalid(form)
+
+        logo = None
+        if form.needs_logo():
+            logo = await ingest_logo_async(form.cleaned_data['image'])
+        await sync_to_async(form.save)(logo=logo)
+        return redirect(self.get_success_url())
+
+    # 'get_validated_form' creates and validates the form, using the checked
+    # image urls
+    def get_validated_form(self):
+        form = self.get_form()
+        form.image_probes = self.image_probes
+        form.is_valid()
+        return form
+
+
+# Table views
+class AsyncCustomersView(AsyncViewMixin, CustomersView):
+    pass
+
+
+class AsyncSoftwareView(AsyncViewMixin, SoftwareView):
+    pass
+
+
+class AsyncCustomerSoftwareView(AsyncViewMixin, CustomerSoftwareView):
+    pass
+
+
+# Customer and relation forms have no network I/O, their handlers run in a thread
+class AsyncNewCustomerView(AsyncViewMixin, NewCustomerView):
+    pass
+
+
+class AsyncEditCustomerView(AsyncViewMixin, EditCustomerView):
+    pass
+
+
+class AsyncNewCustomerSoftwareView(AsyncViewMixin, NewCustomerSoftwareView):
+    pass
+
+
+class AsyncEditCustomerSoftwareView(AsyncViewMixin, EditCustomerSoftwareView):
+    pass
+
+
+# Software forms
+class AsyncNewSoftwareView(AsyncViewMixin, AsyncSoftwareFormMixin, NewSoftwareView):
+    pass
+
+
+class AsyncEditSoftwareView(AsyncViewMixin, AsyncSoftwareFormMixin, EditSoftwareView):
+
+    def get_validated_form(self):
+        # Load the object to edit first, like 'EditObjectMixin.post'
+        if self.get_object() is None:
+            return None
+        return super().get_validated_form()
+
+
+# 'AsyncPasswordFormMixin' is used with the login and register views.
+# The form is validated in a thread like the other views, but checking or
+# hashing the password is done in the hashing pool. Posts over the rate
+# limits are rejected first, see 'ratelimit'.
+class AsyncPasswordFormMixin:
+
+    async def post(self, request, *args, **kwargs):
+        wait = await sync_to_async(self.check_rate_limit)()
+        if wait:
+            return self.rate_limited(wait)
+        form = await sync_to_async(self.get_validated_form)()
+        if not form.is_valid():
+            return self.form_invalid(form)
+        return await self.password_form_valid(form)
+
+    def get_validated_form(self):
+        form = self.get_form()
+        form.is_valid()
+        return form
+
+
+# Login and register forms
+class AsyncRegisterView(AsyncViewMixin, AsyncPasswordFormMixin, RegisterView):
+    login_required = False
+
+    async def password_form_valid(self, form):
+        await off_thread(form.save)
+        return redirect(self.get_success_url())
+
+
+class AsyncLoginView(AsyncViewMixin, AsyncPasswordFormMixin, LoginView):
+    login_required = False
+
+    async def password_form_valid(self, form):
+        user = await off_thread(form.auth)
+        # Logging in writes the session, which is done in a thread like the
+        # other database work
+        return await sync_to_async(self.auth_response)(form, user)
+
+
+# 'ASYNC_VIEWS' maps the url names of the regular views to their async variants
+ASYNC_VIEWS = {
+    'customers': AsyncCustomersView,
+    'newcustomer': AsyncNewCustomerView,
+    'editcustomer': AsyncEditCustomerView,
+    'software': AsyncSoftwareView,
+    'newsoftware': AsyncNewSoftwareView,
+    'editsoftware': AsyncEditSoftwareView,
+    'customersoftware': AsyncCustomerSoftwareView,
+    'newcustomersoftware': AsyncNewCustomerSoftwareView,
+    'editcustomersoftware': AsyncEditCustomerSoftwareView,
+    'register': AsyncRegisterView,
+    'login': AsyncLoginView,
+}
@@ -0,0 +1,123 @@
+# 'backends' contains the authentication backend, see
+# 'settings.AUTHENTICATION_BACKENDS'.
+# 'AuthenticationMiddleware' loads the logged in 'User' on every request that
+# uses 'request.user', which is one query per page for a user browsing the
+# tables. 'CachedModelBackend' keeps the users it loaded in memory for
+# 'settings.USER_CACHE_TTL' seconds instead.
+# A user is removed from the cache when it is saved or deleted, which covers
+# password and 'is_active' changes. The cache belongs to one process, so other
+# processes see such a change after at most 'USER_CACHE_TTL' seconds.
+# Logging in with an unknown email is rejected without hashing the password.
+
+# 'copy' gives every request its own 'User' object
+import copy
+
+# 'threading' is used to lock the cache
+import threading
+
+# 'time' is used to expire cached users
+import time
+
+# 'OrderedDict' remembers the order in which users were used
+from collections import OrderedDict
+
+# 'PermissionDenied' stops 'authenticate' from trying the next backend
+from django.core.exceptions import PermissionDenied
+
+# 'ModelBackend' is Django's backend, which loads users from the database
+from django.contrib.auth.backends import ModelBackend
+
+# 'get_user_model' returns 'settings.AUTH_USER_MODEL'
+from django.contrib.auth import get_user_model
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+
+# 'UserModel' is the 'User' model
+UserModel = get_user_model()
+
+
+# 'UserCache' holds the users loaded by 'CachedModelBackend'.
+# Users expire after 'USER_CACHE_TTL' seconds, and once the cache holds
+# 'USER_CACHE_SIZE' users the least recently used one is removed.
+class UserCache:
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, id):
+        with self.lock:
+            entry = self.entries.get(id)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self.entries[id]
+                return None
+            self.entries.move_to_end(id)
+            return user
+
+    def set(self, id, user):
+        ttl = getattr(settings, 'USER_CACHE_TTL', 30)
+        size = getattr(settings, 'USER_CACHE_SIZE', 1024)
+        with self.lock:
+            self.entries[id] = (time.monotonic() + ttl, user)
+            self.entries.move_to_end(id)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+    def delete(self, id):
+        with self.lock:
+            self.entries.pop(id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# 'user_cache' is the 'UserCache' of this process
+user_cache = UserCache()
+
+
+# 'forget_user' is connected to the 'post_save' and 'post_delete' signals of
+# 'User' in 'apps'
+def forget_user(sender, instance, **kwargs):
+    user_cache.delete(instance.pk)
+
+
+# 'CachedModelBackend' is a 'ModelBackend'
+# 'CachedModelBackend' logs users in like 'ModelBackend' and caches the users
+# loaded for each request
+class CachedModelBackend(ModelBackend):
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # 'ModelBackend' hashes the password anyway, so logins for unknown
+            # emails take as long as the others. The register page already
+            # tells whether an email is used, so that hash protects nothing.
+            user = None
+        if user is not None and user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        # 'ModelBackend' is listed after this backend for older sessions only.
+        # Without this it would check the password a second time.
+        raise PermissionDenied
+
+    def get_user(self, user_id):
+        if not getattr(settings, 'USER_CACHE_TTL', 30):
+            return super().get_user(user_id)
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            user_cache.set(user_id, user)
+        # Requests may change their user, so they do not share the cached one
+        return copy.copy(user)
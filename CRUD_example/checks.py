@@ -0,0 +1,31 @@
+# 'checks' contains the system checks of the app, registered in 'apps'. They
+# run when the server or a command starts, and with 'manage.py check'.
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+# 'Error' is reported by a check
+from django.core.checks import Error
+
+# 'LocMemCache' is the local-memory cache, private to each process
+from django.core.cache.backends.locmem import LocMemCache
+
+# 'get_table_cache' returns the cache holding the table versions
+from CRUD_example.tablecache import get_table_cache
+
+
+# 'check_table_cache' requires a shared 'settings.TABLE_CACHE' when
+# 'settings.BACKGROUND_JOBS' is set. The jobs change objects in the 'runjobs'
+# process, and replace the cached tables by changing the versions in the
+# cache. With a local-memory cache, the server would never see the changes.
+def check_table_cache(app_configs, **kwargs):
+    if not getattr(settings, 'BACKGROUND_JOBS', False):
+        return []
+    if not isinstance(get_table_cache(), LocMemCache):
+        return []
+    return [Error(
+        'BACKGROUND_JOBS needs a TABLE_CACHE shared by every process.',
+        hint="'runjobs' runs in its own process. Use a shared backend such as Memcached, Redis or "
+             "the database cache for the '{}' cache.".format(getattr(settings, 'TABLE_CACHE', 'default')),
+        id='CRUD_example.E001',
+    )]
@@ -0,0 +1,102 @@
+# 'columns' contains the table columns that render html without templates.
+# A 'TemplateColumn' renders a template for every cell and reverses a url for
+# every button, which takes most of the time spent rendering a table. These
+# columns build the same html with string formatting instead. The urls only
+# differ by the id at the end, so the part before it is reversed once.
+
+# 'lru_cache' remembers the reversed url prefixes
+from functools import lru_cache
+
+# 'django_tables2' is a library for creating tables easily
+import django_tables2 as tables
+
+# 'reverse' returns the url of a named view
+from django.urls import reverse
+
+# 'escape' makes values safe to place in html
+# 'mark_safe' marks the built html as safe to output
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+# 'Software' holds the statuses of the images
+from CRUD_example.models import Software
+
+
+# 'url_prefix' returns the url of a named view without its last argument, so
+# 'url_prefix(name) + str(id)' is the same as 'reverse(name, args=[id])'.
+# Urls are only reversed once the first table is rendered, since 'urls'
+# imports the views and tables.
+@lru_cache(maxsize=None)
+def url_prefix(name):
+    url = reverse(name, args=[0])
+    if not url.endswith('0'):
+        raise ValueError('Url ' + name + ' does not end with its argument.')
+    return url[:-1]
+
+
+BUTTONS_HTML = (
+    '<div class="tableButtonWrapper">\n'
+    '    <button class="tableEditButton" onclick="location.href = \'{}{}\'">Edit</button>\n'
+    '    <button class="tableDeleteButton" onclick="location.href = \'{}{}\'">Delete</button>\n'
+    '</div>'
+)
+
+LOGO_HTML = (
+    '<div class="softwareImageWrapper">\n'
+    '    <img class="softwareImage" src="{}"/>\n'
+    '</div>'
+)
+
+LOGO_STATUS_HTML = (
+    '<div class="softwareImageWrapper">\n'
+    '    <span class="softwareImageStatus">{}</span>\n'
+    '</div>'
+)
+
+
+# 'ButtonsColumn' is a 'Column'
+# 'ButtonsColumn' displays an edit and a delete button for each row.
+# 'edit_url' and 'delete_url' are the names of views that take the row's id.
+class ButtonsColumn(tables.Column):
+    # Render every row, the column has no value of its own
+    empty_values = ()
+
+    def __init__(self, edit_url, delete_url, **kwargs):
+        kwargs.setdefault('orderable', False)
+        kwargs.setdefault('exclude_from_export', True)
+        super().__init__(**kwargs)
+        self.edit_url = edit_url
+        self.delete_url = delete_url
+
+    def render(self, record):
+        id = int(record.id)
+        return mark_safe(BUTTONS_HTML.format(
+            url_prefix(self.edit_url), id,
+            url_prefix(self.delete_url), id,
+        ))
+
+
+# 'LogoColumn' is a 'Column'
+# 'LogoColumn' displays the logo of a 'Software' object. The local thumbnail
+# is used when there is one, otherwise the remote image once it was checked.
+# Images that are not checked yet or invalid are replaced by their status.
+# 'software' is the attribute of the row holding the 'Software' object, or
+# None when the row is the 'Software' object itself.
+class LogoColumn(tables.Column):
+    empty_values = ()
+
+    def __init__(self, software=None, **kwargs):
+        kwargs.setdefault('orderable', False)
+        kwargs.setdefault('exclude_from_export', True)
+        super().__init__(**kwargs)
+        self.software = software
+
+    def render(self, record):
+        software = record if self.software is None else getattr(record, self.software)
+        if software.logo:
+            src = url_prefix('logo') + software.logo
+        elif software.image_status == Software.IMAGE_CHECKED:
+            src = software.image
+        else:
+            return mark_safe(LOGO_STATUS_HTML.format(escape(software.get_image_status_display())))
+        return mark_safe(LOGO_HTML.format(escape(src)))
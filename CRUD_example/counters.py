@@ -0,0 +1,90 @@
+# 'counters' keeps the relation counters up to date.
+# 'Customer.software_count' is the number of software a customer has, and
+# 'Software.customer_count' the number of customers using a software. They are
+# stored on the objects so the tables can show and sort by them without
+# counting 'CustomerSoftware' objects for every row.
+# Every place that creates, moves or deletes 'CustomerSoftware' objects records
+# the change in a 'CounterUpdate' and saves it in the same transaction.
+# 'python manage.py recountrelations' recomputes every counter.
+
+# 'Counter' adds up the change of each counter
+from collections import Counter, defaultdict
+
+# 'Count', 'F', 'OuterRef', 'Subquery' and 'Coalesce' let the database count
+# and change the counters without loading the objects
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Import the models holding the counters
+from CRUD_example.models import Customer, Software, CustomerSoftware
+
+
+# 'COUNTERS' maps each counted model to its counter field and the field of
+# 'CustomerSoftware' that refers to it
+COUNTERS = (
+    (Customer, 'software_count', 'cid'),
+    (Software, 'customer_count', 'sid'),
+)
+
+
+# 'CounterUpdate' collects the changes of the counters.
+# Objects whose counters change by the same amount are updated with a single
+# query, using 'F' so the database adds the change to the current value.
+class CounterUpdate:
+
+    def __init__(self):
+        self.changes = {Customer: Counter(), Software: Counter()}
+
+    # 'add' records relations between customer and software ids that were created
+    def add(self, pairs, delta=1):
+        for cid, sid in pairs:
+            self.changes[Customer][cid] += delta
+            self.changes[Software][sid] += delta
+
+    # 'remove' records relations that were deleted
+    def remove(self, pairs):
+        self.add(pairs, delta=-1)
+
+    # 'models' returns the models whose counters change
+    def models(self):
+        return [model for model, changes in self.changes.items() if any(changes.values())]
+
+    def save(self):
+        for model, field, relation in COUNTERS:
+            ids_by_delta = defaultdict(list)
+            for id, delta in self.changes[model].items():
+                if delta:
+                    ids_by_delta[delta].append(id)
+            for delta, ids in ids_by_delta.items():
+                model.objects.filter(id__in=ids).update(**{field: F(field) + delta})
+
+
+# 'relation_pairs' returns the (customer id, software id) of the relations in
+# a 'CustomerSoftware' queryset
+def relation_pairs(queryset):
+    return list(queryset.values_list('cid_id', 'sid_id'))
+
+
+# 'relation_count' counts the relations of each object in an update
+def relation_count(relation):
+    counts = (
+        CustomerSoftware.objects.filter(**{relation: OuterRef('pk')})
+        .order_by()
+        .values(relation)
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+# 'recount' sets every counter to the number of relations in the database and
+# returns how many objects of each model had a wrong counter
+def recount():
+    fixed = {}
+    for model, field, relation in COUNTERS:
+        fixed[model] = (
+            model.objects.annotate(actual=relation_count(relation))
+            .exclude(**{field: F('actual')})
+            .update(**{field: relation_count(relation)})
+        )
+    return fixed
@@ -0,0 +1,47 @@
+# 'db' contains the database tuning applied when a connection is opened.
+# SQLite's defaults favour safety over speed: the rollback journal blocks
+# readers while a write is committed, and a locked database fails right away.
+# 'settings.SQLITE_PRAGMAS' lists the PRAGMA statements run on every new SQLite
+# connection to change this, for example:
+#   synchronous = NORMAL    safe with WAL, fewer disk syncs per commit
+#   mmap_size               read the database file through memory mapping
+#   cache_size              pages kept in memory (negative values are in KiB)
+#   busy_timeout            milliseconds to wait for a lock before failing
+# 'settings.SQLITE_JOURNAL_MODE' is set apart: with WAL, readers are not
+# blocked by writers. The journal mode is stored in the database file, so it
+# is only set when the server starts, by 'wsgi.py' and 'asgi.py', and commands
+# such as 'manage.py check' do not change the file.
+from django.conf import settings
+
+# 'connections' holds the connection of each database
+from django.db import connections
+
+
+# 'configure_sqlite' is connected to the 'connection_created' signal in 'apps'
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+
+# 'set_journal_mode' sets the journal mode of a SQLite connection, by default
+# to 'settings.SQLITE_JOURNAL_MODE'
+def set_journal_mode(connection, mode=None):
+    mode = mode or getattr(settings, 'SQLITE_JOURNAL_MODE', None)
+    if connection.vendor != 'sqlite' or not mode:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode = {}'.format(mode))
+
+
+# 'set_journal_modes' sets the journal mode of every SQLite database and
+# closes the connections it opened
+def set_journal_modes():
+    for connection in connections.all():
+        set_journal_mode(connection)
+        connection.close()
@@ -0,0 +1,100 @@
+# 'exports' contains the CSV and JSON export of the table views.
+# Exports use the same columns and ordering as the tables. Rows are read from
+# the database in chunks and sent to the user while they are read, so the
+# size of an export does not change how much memory it needs, and the first
+# bytes are sent right away.
+# Under ASGI the rows are read in a thread by the handler of 'asgi.py', see
+# 'CRUD_example/handlers.py'.
+
+# 'csv' and 'json' are used to write the rows
+import csv
+import json
+
+# 'DjangoJSONEncoder' can encode dates as well as basic types
+from django.core.serializers.json import DjangoJSONEncoder
+
+# 'StreamingHttpResponse' sends a response while it is being generated
+from django.http import StreamingHttpResponse
+
+# 'sorted_table' reads the sort from the url, 'stable_order' makes the
+# ordering of a queryset end in 'id' and 'SortedRows' holds the sorted rows
+from CRUD_example.pagination import SortedRows, sorted_table, stable_order
+
+
+# 'EXPORT_FIELD' is the url parameter that triggers an export
+EXPORT_FIELD = 'export'
+
+# 'EXPORT_FORMATS' maps each export format to its content type
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+}
+
+# 'EXPORT_CHUNK_SIZE' is the number of rows read from the database at once
+EXPORT_CHUNK_SIZE = 2000
+
+
+# 'Echo' is a file-like object that returns what is written to it.
+# It lets 'csv.writer' produce lines for a streaming response.
+class Echo:
+
+    def write(self, value):
+        return value
+
+
+# 'csv_lines' turns the values from 'Table.as_values' into CSV lines
+def csv_lines(values):
+    writer = csv.writer(Echo())
+    for row in values:
+        yield writer.writerow(row)
+
+
+# 'json_lines' turns the values from 'Table.as_values' into a JSON list of
+# objects. The column names are used as keys.
+def json_lines(values, names):
+    # The first row holds the headers, which are not needed
+    next(values)
+    yield '['
+    separator = ''
+    for row in values:
+        yield separator + json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder)
+        separator = ',\n'
+    yield ']\n'
+
+
+# 'ExportMixin' is used together with 'SingleTableView'.
+# Adding '?export=csv' or '?export=json' to the url of a table view downloads
+# every row of the table, sorted like the table.
+# Columns that only contain html (buttons, logos) set 'exclude_from_export'.
+class ExportMixin:
+    # 'export_name' is the name of the downloaded file, without extension
+    export_name = 'table'
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get(EXPORT_FIELD)
+        if export_format in EXPORT_FORMATS:
+            return self.export(export_format)
+        return super().get(request, *args, **kwargs)
+
+    def export(self, export_format):
+        table_class = self.get_table_class()
+        kwargs = self.get_table_kwargs()
+        sort_table, keys = sorted_table(table_class, self.request, **kwargs)
+        queryset, keys = stable_order(self.get_table_data(), keys)
+        # Read the rows in chunks while they are sent
+        table = table_class(data=SortedRows(queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)), **kwargs)
+
+        values = table.as_values()
+        if export_format == 'csv':
+            lines = csv_lines(values)
+        else:
+            names = [
+                column.name
+                for column in table.columns.iterall()
+                if not column.column.exclude_from_export
+            ]
+            lines = json_lines(values, names)
+
+        response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[export_format])
+        response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(self.export_name, export_format)
+        return response
@@ -14,6 +14,13 @@ from django.utils.translation import gettext as _
 # with form data/entries to the user.
 from django.core.exceptions import ValidationError
 
+# 'IntegrityError' is raised when saving breaks a database constraint.
+# 'transaction' is used to roll back a save that failed.
+from django.db import IntegrityError, transaction
+
+# 'LookupSelect' is a dropdown that loads its options while the user searches
+from CRUD_example.widgets import LookupSelect
+
 # Import models to be used in the forms
 from CRUD_example.models import (
     User,
@@ -23,58 +30,36 @@ from CRUD_example.models import (
     CustomerSoftware,
 )
 
-# 'httplib2' is an Http library used for making 'HEAD' requests and
-# determining the Mime-Type of a url
-import httplib2
+# 'check_image' checks that a url is an image of a valid type.
+# It limits how long a check may take and caches the results.
+from CRUD_example.images import check_image
+
+# 'ingest_logo' stores a local copy of a software image
+from CRUD_example.logos import ingest_logo
+
+# 'invalidate' replaces the cached tables that show a changed model
+from CRUD_example.tablecache import invalidate
+
+# 'CounterUpdate' changes the relation counters of customers and software
+from CRUD_example.counters import CounterUpdate, relation_pairs
 
-# 'VALID_IMAGE_TYPES' is an array representing each valid image Mime-Type
-VALID_IMAGE_TYPES = [
-    'png',
-    'jpeg',
-    'jpg',
-]
+# 'enqueue' adds a background job, used when 'background_jobs' is set
+from CRUD_example.jobs import background_jobs, enqueue
 
 # 'validate_image' is used to validate that a url is an image
 def validate_image(self, url, cleaned_data):
-    # Create an Http instance
-    h = httplib2.Http()
-    # Encapsulate in try/catch to prevent serverside errors
-    try:
-        # Send a 'HEAD' request to the given url. It will follow redirects
-        # until it reaches the specified max redirects
-        response, content = h.request(url, "HEAD", redirections=10)
-        # Check if the last response was 'OK' (200)
-        if response.status == 200:
-            # Get the content type (Mime-Type) of the response
-            type = response['content-type']
-            # Split the content type at the slash
-            split_text = type.split('/')
-            # Check if the content type is an image
-            if split_text[0] == 'image':
-                # Check if the image type is in 'VALID_IMAGE_TYPES'
-                if split_text[1] in VALID_IMAGE_TYPES:
-                    # Get the final url location of the image
-                    cleaned_data['image'] = response['content-location']
-                    # Return cleaned_data
-                    return cleaned_data
-                else:
-                    # Image type is not supported, add an error
-                    self.add_error('image', ValidationError(_('Image is not of type PNG, JPG, or JPEG.')))
-            else:
-                # Content type was not an image, add an error
-                self.add_error('image', ValidationError(_('URL is not an image. Expected \'image/(png, jpg, jpeg)\', got \''+type+'\' instead.')))
-        else:
-            # Response was not 'OK', add an error
-            self.add_error('image', ValidationError(_('URL is not valid.')))
-    except httplib2.ServerNotFoundError:
-        # Server could not be reached, add an error
-        self.add_error('image', ValidationError(_('URL is not valid.')))
-    except httplib2.RedirectLimit:
-        # Max redirects has been reached, add an error
-        self.add_error('image', ValidationError(_('URL exceeded max redirects (10).')))
-    except:
-        # A catch-all for any other unexpected errors
-        self.add_error('image', ValidationError(_('URL is not valid.')))
+    # Async views check the url before validating the form and leave the
+    # result in 'image_probes'. Otherwise 'check_image' checks the url.
+    probe = getattr(self, 'image_probes', {}).get(url)
+    if probe is None and background_jobs():
+        # The url is checked by a job once the form is saved
+        return cleaned_data
+    error, location = check_image(url, probe)
+    if error is not None:
+        self.add_error('image', ValidationError(error))
+    else:
+        # Use the final url location of the image
+        cleaned_data['image'] = location
     # Return cleaned_data
     return cleaned_data
 
@@ -102,12 +87,6 @@ class RegisterForm(forms.Form):
             if len(e) < 3:
                 # Email is too small, add an error
                 self.add_error('email', ValidationError(_('Please enter a valid email.')))
-            
-            # Check if user already exists
-            user = User.objects.filter(email=self.cleaned_data['email'])
-            if user.exists():
-                # User with this email already exists, add an error
-                self.add_error('email', ValidationError(_('User with this email already exists.')))
         else:
             # 'email' field is not a string, add error
             self.add_error('email', ValidationError(_('Email must be a string.')))
@@ -125,15 +104,19 @@ class RegisterForm(forms.Form):
             # 'password' field is not a string, add error
             self.add_error('password', ValidationError(_('Password must be a string.')))
 
+        # Check if user already exists. This is the only check needing the
+        # database, so it is skipped when the form already has errors.
+        if not self.errors and User.objects.filter(email=e).exists():
+            # User with this email already exists, add an error
+            self.add_error('email', ValidationError(_('User with this email already exists.')))
+
         # Return the cleaned_data
         return cleaned_data
 
     # 'save' will create a new user from the data provided to the form
     def save(self):
-        # Create new user
+        # Create and save the new user
         user = User.objects.create_user(email=self.cleaned_data['email'], password=self.cleaned_data['password1'])
-        # Save new user
-        user.save()
         # Return the new user in case it is needed
         return user
 
@@ -198,10 +181,12 @@ class NewCustomerForm(forms.ModelForm):
 
         return cleaned_data
     
-    # 'save' creates a new 'Customer' object and saves it to the db
+    # 'save' creates a new 'Customer' object, saves it to the db and returns it
     def save(self):
         customer = Customer(name=self.cleaned_data['name'])
         customer.save()
+        invalidate(Customer)
+        return customer
 
 # 'EditCustomerForm' is a 'ModelForm'
 # 'EditCustomerForm' is a form for updating 'Customer' objects
@@ -245,11 +230,10 @@ class EditCustomerForm(forms.ModelForm):
     # 'save' updates a 'Customer' object with the data given to the form
     def save(self):
         # An id with no matches is possible, in which case nothing will happen.
-        customer = Customer.objects.filter(id=self.instance.id)
-        # Check if customer exists
-        if customer.exists():
-            # Customer exists, update it with values in form
-            customer.update(name = self.cleaned_data['name'])
+        # The view already loaded the customer, so it is updated without
+        # checking that it exists first.
+        Customer.objects.filter(id=self.instance.id).update(name = self.cleaned_data['name'])
+        invalidate(Customer)
 
 # 'NewSoftwareForm' is a 'ModelForm'
 # 'NewSoftwareForm' is a form for creating a new 'Software' object
@@ -278,9 +262,30 @@ class NewSoftwareForm(forms.ModelForm):
 
         return cleaned_data
 
-    def save(self):
-        software = Software(name=self.cleaned_data['name'], image=self.cleaned_data['image'])
+    # 'needs_logo' tells whether 'save' has to download the image
+    def needs_logo(self):
+        return True
+
+    # 'logo' is the file name of the image if it was already downloaded
+    def save(self, logo=None):
+        background = logo is None and background_jobs()
+        if background:
+            # The job checks the image and downloads it
+            logo = ''
+        elif logo is None:
+            # Download the image once so the tables can show a local thumbnail
+            logo = ingest_logo(self.cleaned_data['image'])
+        software = Software(
+            name=self.cleaned_data['name'],
+            image=self.cleaned_data['image'],
+            logo=logo,
+            image_status=Software.IMAGE_PENDING if background else Software.IMAGE_CHECKED,
+        )
         software.save()
+        invalidate(Software)
+        if background:
+            enqueue('check_software_image', Software, ids=[software.id], image=software.image)
+        return software
 
 class EditSoftwareForm(forms.ModelForm):
     class Meta:
@@ -317,14 +322,33 @@ class EditSoftwareForm(forms.ModelForm):
             self.fields[field].disabled = True
         self.add_error(None, ValidationError(_('Not a valid id. Please edit a valid Software.')))
 
-    def save(self):
-        software = Software.objects.filter(id=self.instance.id)
-        if software.exists():
-            software.update(name = self.cleaned_data['name'], image=self.cleaned_data['image'])
+    # Only download the image again if it changed
+    def needs_logo(self):
+        return self.cleaned_data['image'] != self.initial.get('image') or not self.instance.logo
+
+    def save(self, logo=None):
+        background = logo is None and self.needs_logo() and background_jobs()
+        if background:
+            # The job checks the new image and downloads it
+            logo = ''
+        elif logo is None:
+            logo = self.instance.logo
+            if self.needs_logo():
+                logo = ingest_logo(self.cleaned_data['image'])
+        Software.objects.filter(id=self.instance.id).update(
+            name=self.cleaned_data['name'],
+            image=self.cleaned_data['image'],
+            logo=logo,
+            image_status=Software.IMAGE_PENDING if background else Software.IMAGE_CHECKED,
+        )
+        invalidate(Software)
+        if background:
+            enqueue('check_software_image', Software, ids=[self.instance.id], image=self.cleaned_data['image'])
 
 class NewCustomerSoftwareForm(forms.ModelForm):
-    customer = forms.ModelChoiceField(queryset=Customer.objects.all())
-    software = forms.ModelChoiceField(queryset=Software.objects.all())
+    # 'LookupSelect' only renders the selected object instead of every object
+    customer = forms.ModelChoiceField(queryset=Customer.objects.all(), widget=LookupSelect('lookupcustomers'))
+    software = forms.ModelChoiceField(queryset=Software.objects.all(), widget=LookupSelect('lookupsoftware'))
 
     class Meta:
         model = CustomerSoftware
@@ -337,42 +361,45 @@ class NewCustomerSoftwareForm(forms.ModelForm):
 
         c = cleaned_data.get('customer', -1)
         s = cleaned_data.get('software', -1)
-        cValid = True
-        sValid = True
-        
-        # Try to get objects selected by user
-        cQuery = Customer.objects.filter(id=c.id)
-        sQuery = Software.objects.filter(id=s.id)
+
+        # 'ModelChoiceField' loads the objects selected by the user, and only
+        # adds them to cleaned_data if they exist. They are not queried again.
 
         # Check if the 'customer' field is a 'Customer' object that exists
-        if not isinstance(c, Customer) or not cQuery.exists():
+        if not isinstance(c, Customer):
             # 'customer' is not a valid object, add error
             self.add_error('customer', ValidationError(_('Please choose a valid customer.')))
-            cValid = False
 
         # Check if the 'software' field is a 'Software' object that exists
-        if not isinstance(s, Software) or not sQuery.exists():
+        if not isinstance(s, Software):
             # 'software' is not a valid object, add error
             self.add_error('software', ValidationError(_('Please choose a valid software.')))
-            sValid = False
-        
-        # Ensure both objects are valid
-        if cValid and sValid:
-	    # Check if relation already exists
-            rel = CustomerSoftware.objects.filter(cid=c, sid=s)
-            if rel.exists():
-                # Relation already exists, add error
-                self.add_error(None, ValidationError(_('This relation already exists.')))
 
+        # Duplicate relations are not checked here. The database has a unique
+        # constraint on ('cid', 'sid'), which 'save' relies on instead.
         return cleaned_data
     
+    # 'save' creates a new 'CustomerSoftware' object, saves it to the db and
+    # returns it. It returns False and adds an error if the relation already exists.
     def save(self):
         customerSoftware = CustomerSoftware(cid=self.cleaned_data['customer'], sid=self.cleaned_data['software'])
-        customerSoftware.save()
+        counters = CounterUpdate()
+        counters.add([(customerSoftware.cid_id, customerSoftware.sid_id)])
+        try:
+            # Roll back only this save if the constraint fails
+            with transaction.atomic():
+                customerSoftware.save()
+                counters.save()
+        except IntegrityError:
+            # Relation already exists, add error
+            self.add_error(None, ValidationError(_('This relation already exists.')))
+            return False
+        invalidate(CustomerSoftware, *counters.models())
+        return customerSoftware
 
 class EditCustomerSoftwareForm(forms.ModelForm):
-    customer = forms.ModelChoiceField(queryset=Customer.objects.all())
-    software = forms.ModelChoiceField(queryset=Software.objects.all())
+    customer = forms.ModelChoiceField(queryset=Customer.objects.all(), widget=LookupSelect('lookupcustomers'))
+    software = forms.ModelChoiceField(queryset=Software.objects.all(), widget=LookupSelect('lookupsoftware'))
 
     class Meta:
         model = CustomerSoftware
@@ -388,25 +415,13 @@ class EditCustomerSoftwareForm(forms.ModelForm):
 
         c = cleaned_data.get('customer', -1)
         s = cleaned_data.get('software', -1)
-        cValid = True
-        sValid = True
-
-        cQuery = Customer.objects.filter(id=c.id)
-        sQuery = Software.objects.filter(id=s.id)
 
-        if not isinstance(c, Customer) or not cQuery.exists():
+        if not isinstance(c, Customer):
             self.add_error('customer', ValidationError(_('Please choose a valid customer.')))
-            cValid = False
 
-        if not isinstance(s, Software) or not sQuery.exists():
+        if not isinstance(s, Software):
             self.add_error('software', ValidationError(_('Please choose a valid software.')))
-            sValid = False
 
-        if cValid and sValid:
-            rel = CustomerSoftware.objects.filter(cid=c, sid=s)
-            if rel.exists():
-                self.add_error(None, ValidationError(_('This relation already exists.')))
-        
         return cleaned_data
 
     def no_instance(self):
@@ -416,6 +431,118 @@ class EditCustomerSoftwareForm(forms.ModelForm):
         self.add_error(None, ValidationError(_('Not a valid id. Please edit a valid CustomerSoftware.')))
 
     def save(self):
-        customerSoftware = CustomerSoftware.objects.filter(id=self.instance.id)
-        if customerSoftware.exists():
-            customerSoftware.update(cid=self.cleaned_data['customer'], sid=self.cleaned_data['software'])
+        counters = CounterUpdate()
+        try:
+            with transaction.atomic():
+                relations = CustomerSoftware.objects.select_for_update().filter(id=self.instance.id)
+                # The relation moves from its current customer and software
+                counters.remove(relation_pairs(relations))
+                if relations.update(cid=self.cleaned_data['customer'], sid=self.cleaned_data['software']):
+                    counters.add([(self.cleaned_data['customer'].id, self.cleaned_data['software'].id)])
+                counters.save()
+        except IntegrityError:
+            self.add_error(None, ValidationError(_('This relation already exists.')))
+            return False
+        invalidate(CustomerSoftware, *counters.models())
+        return True
+
+# 'ImportForm' is a 'Form'
+# 'ImportForm' is a form for uploading a CSV or JSON file of objects to import
+class ImportForm(forms.Form):
+    file = forms.FileField(required=True, label='File')
+    format = forms.ChoiceField(choices=(('csv', 'CSV'), ('json', 'JSON')), label='Format')
+
+# 'BatchEditCustomerForm' is a 'Form'
+# 'BatchEditCustomerForm' is a form for renaming several 'Customer' objects at once
+class BatchEditCustomerForm(forms.Form):
+    name = forms.CharField(max_length=255, label='Name')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        n = cleaned_data.get('name')
+        if n is not None and len(n) < 3:
+            self.add_error('name', ValidationError(_('Name must have at least 3 characters.')))
+        return cleaned_data
+
+    # 'save' updates the objects with the given ids in a single query and
+    # returns how many were updated
+    def save(self, ids):
+        count = Customer.objects.filter(id__in=ids).update(name=self.cleaned_data['name'])
+        invalidate(Customer)
+        return count
+
+# 'BatchEditSoftwareForm' is a 'Form'
+# 'BatchEditSoftwareForm' is a form for changing the name or image of several
+# 'Software' objects at once. Empty fields are left unchanged.
+class BatchEditSoftwareForm(forms.Form):
+    name = forms.CharField(max_length=255, required=False, label='Name')
+    image = forms.URLField(max_length=512, required=False, label='Image')
+
+    def clean(self):
+        cleaned_data = super().clean()
+
+        if not cleaned_data.get('name') and not cleaned_data.get('image'):
+            self.add_error(None, ValidationError(_('Please enter a name or an image.')))
+
+        i = cleaned_data.get('image')
+        if i:
+            cleaned_data = validate_image(self, i, cleaned_data)
+
+        return cleaned_data
+
+    def save(self, ids):
+        changes = {}
+        if self.cleaned_data['name']:
+            changes['name'] = self.cleaned_data['name']
+        background = bool(self.cleaned_data['image']) and background_jobs()
+        if self.cleaned_data['image']:
+            changes['image'] = self.cleaned_data['image']
+            # The image is downloaded once for every object, by a job if
+            # 'background_jobs' is set
+            changes['logo'] = '' if background else ingest_logo(self.cleaned_data['image'])
+            changes['image_status'] = Software.IMAGE_PENDING if background else Software.IMAGE_CHECKED
+        count = Software.objects.filter(id__in=ids).update(**changes)
+        invalidate(Software)
+        if background:
+            enqueue('check_software_image', Software, ids=list(ids), image=self.cleaned_data['image'])
+        return count
+
+# 'BatchEditCustomerSoftwareForm' is a 'Form'
+# 'BatchEditCustomerSoftwareForm' is a form for moving several 'CustomerSoftware'
+# objects to another customer or software. Empty fields are left unchanged.
+class BatchEditCustomerSoftwareForm(forms.Form):
+    customer = forms.ModelChoiceField(queryset=Customer.objects.all(), required=False, widget=LookupSelect('lookupcustomers'))
+    software = forms.ModelChoiceField(queryset=Software.objects.all(), required=False, widget=LookupSelect('lookupsoftware'))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('customer') is None and cleaned_data.get('software') is None:
+            self.add_error(None, ValidationError(_('Please choose a customer or a software.')))
+        return cleaned_data
+
+    # 'save' returns False and adds an error if a relation would exist twice.
+    # No object is updated in that case.
+    def save(self, ids):
+        changes = {}
+        if self.cleaned_data['customer'] is not None:
+            changes['cid'] = self.cleaned_data['customer']
+        if self.cleaned_data['software'] is not None:
+            changes['sid'] = self.cleaned_data['software']
+        counters = CounterUpdate()
+        try:
+            with transaction.atomic():
+                relations = CustomerSoftware.objects.select_for_update().filter(id__in=ids)
+                pairs = relation_pairs(relations)
+                count = relations.update(**changes)
+                # Every relation moves to the new customer or software
+                counters.remove(pairs)
+                counters.add([
+                    (changes['cid'].id if 'cid' in changes else cid, changes['sid'].id if 'sid' in changes else sid)
+                    for cid, sid in pairs
+                ])
+                counters.save()
+        except IntegrityError:
+            self.add_error(None, ValidationError(_('Some of these relations already exist.')))
+            return False
+        invalidate(CustomerSoftware, *counters.models())
+        return count
@@ -0,0 +1,69 @@
+# 'handlers' contains the ASGI handler used by 'asgi.py'.
+# Django 4.0 sends a streaming response by iterating over it on the event
+# loop, so a response reading from the database while it is sent, like the
+# exports of the table views, fails with 'SynchronousOnlyOperation' and would
+# block every other request if it did not. 'StreamingASGIHandler' reads the
+# parts of streaming responses in the thread used by the sync views instead,
+# a batch at a time, and sends them from the event loop.
+
+# 'islice' takes a batch of parts from a response
+from itertools import islice
+
+# 'django' is set up before the handler is created
+import django
+
+# 'sync_to_async' runs blocking code in a thread and waits for it
+from asgiref.sync import sync_to_async
+
+# 'ASGIHandler' is Django's ASGI handler
+from django.core.handlers.asgi import ASGIHandler
+
+
+# 'STREAMING_BATCH_SIZE' is the number of parts of a streaming response read
+# in one call to the thread
+STREAMING_BATCH_SIZE = 256
+
+
+# 'read_batch' returns the next parts of a streaming response
+def read_batch(parts):
+    return list(islice(parts, STREAMING_BATCH_SIZE))
+
+
+# 'StreamingASGIHandler' is an 'ASGIHandler' that reads streaming responses
+# off the event loop
+class StreamingASGIHandler(ASGIHandler):
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        # Send the status and headers like Django does
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+
+        # Access '__iter__' and not 'streaming_content' directly in case it
+        # has been overridden in a subclass, like Django does
+        parts = iter(response)
+        while True:
+            batch = await sync_to_async(read_batch)(parts)
+            if not batch:
+                break
+            for part in batch:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+# 'get_asgi_application' replaces Django's function of the same name
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return StreamingASGIHandler()
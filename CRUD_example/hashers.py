@@ -0,0 +1,133 @@
+# 'hashers' contains the password hashers, see 'settings.PASSWORD_HASHERS'.
+# Hashing a password is meant to be slow, which makes logging in and
+# registering the most CPU heavy requests of the site. The hashers here read
+# their cost from the settings, so it can be tuned to the servers with
+# 'python manage.py benchpasswords'.
+# 'settings.PASSWORD_HASHER_PROFILE' picks the hasher of new passwords. The
+# other hashers are still listed, so passwords hashed with another profile or
+# cost keep working. Django hashes them again with the current profile and
+# cost when their user logs in.
+#
+# Under ASGI, Django runs the sync code of every request in one thread, so a
+# few logins at once would hold up every other page. 'off_thread' runs the
+# hashing in a pool of its own instead, see 'asyncviews'. 'hashlib' releases
+# the GIL while hashing, so the pool uses every core.
+
+# 'base64' and 'hashlib' are used to hash with scrypt
+import base64
+import hashlib
+
+# 'os' is used to find the number of cores
+import os
+
+# 'ThreadPoolExecutor' runs the hashing
+from concurrent.futures import ThreadPoolExecutor
+
+# 'sync_to_async' runs blocking code in a thread and waits for it
+from asgiref.sync import sync_to_async
+
+# Import Django's hashers, which the hashers here extend
+from django.contrib.auth import hashers
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+# 'close_old_connections' closes the database connections of the pool threads
+from django.db import close_old_connections
+
+
+# 'PBKDF2PasswordHasher' is Django's default hasher with
+# 'settings.PASSWORD_PBKDF2_ITERATIONS' iterations
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
+
+
+# 'ScryptPasswordHasher' uses scrypt with the 'settings.PASSWORD_SCRYPT_*'
+# costs. Each hash needs 128 * work factor * block size bytes of memory, which
+# makes it expensive to guess passwords on GPUs at a lower CPU cost than PBKDF2.
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+
+    @property
+    def work_factor(self):
+        return getattr(settings, 'PASSWORD_SCRYPT_WORK_FACTOR', hashers.ScryptPasswordHasher.work_factor)
+
+    @property
+    def block_size(self):
+        return getattr(settings, 'PASSWORD_SCRYPT_BLOCK_SIZE', hashers.ScryptPasswordHasher.block_size)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, 'PASSWORD_SCRYPT_PARALLELISM', hashers.ScryptPasswordHasher.parallelism)
+
+    # Stored hashes may use other costs than the settings, so the memory
+    # allowed to OpenSSL, 32 MiB by default, follows the costs of each hash
+    def encode(self, password, salt, n=None, r=None, p=None):
+        self._check_encode_args(password, salt)
+        n = n or self.work_factor
+        r = r or self.block_size
+        p = p or self.parallelism
+        hash_ = hashlib.scrypt(
+            password.encode(),
+            salt=salt.encode(),
+            n=n,
+            r=r,
+            p=p,
+            maxmem=scrypt_memory(n, r, p),
+            dklen=64,
+        )
+        hash_ = base64.b64encode(hash_).decode('ascii').strip()
+        return '%s$%d$%s$%d$%d$%s' % (self.algorithm, n, salt, r, p, hash_)
+
+
+# 'scrypt_memory' returns the bytes of memory scrypt needs for its costs,
+# with some room for OpenSSL itself
+def scrypt_memory(n, r, p):
+    return 128 * r * (n + p) + 2 ** 20
+
+
+# 'Argon2PasswordHasher' uses Argon2 with the 'settings.PASSWORD_ARGON2_*'
+# costs. It needs the 'argon2-cffi' package, which is not in 'requirements.txt'.
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+
+    @property
+    def time_cost(self):
+        return getattr(settings, 'PASSWORD_ARGON2_TIME_COST', hashers.Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return getattr(settings, 'PASSWORD_ARGON2_MEMORY_COST', hashers.Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, 'PASSWORD_ARGON2_PARALLELISM', hashers.Argon2PasswordHasher.parallelism)
+
+
+# 'hashing_pool' is the pool running 'off_thread' calls, created when first used
+hashing_pool = None
+
+
+# 'get_hashing_pool' returns the pool, with 'settings.PASSWORD_HASHING_THREADS'
+# threads or one per core
+def get_hashing_pool():
+    global hashing_pool
+    if hashing_pool is None:
+        threads = getattr(settings, 'PASSWORD_HASHING_THREADS', None) or os.cpu_count() or 1
+        hashing_pool = ThreadPoolExecutor(threads, thread_name_prefix='hashing')
+    return hashing_pool
+
+
+# 'run_hashing' calls 'function' in a pool thread
+def run_hashing(function, *args):
+    try:
+        return function(*args)
+    finally:
+        # Pool threads are reused, close their connection like at the end of a request
+        close_old_connections()
+
+
+# 'off_thread' awaits 'function', which hashes passwords, run in the hashing pool
+async def off_thread(function, *args):
+    return await sync_to_async(run_hashing, thread_sensitive=False, executor=get_hashing_pool())(function, *args)
@@ -0,0 +1,385 @@
+# 'images' contains the service used to check that a url points to an image.
+# Checking a url means sending a 'HEAD' request to a third party server, which
+# can be slow. The service limits how long a request may take, reuses open
+# connections and remembers the results so the same url is only checked once.
+
+# 'asyncio' is used to send requests without blocking the event loop
+import asyncio
+
+# 'socket' is used to catch timeouts
+import socket
+
+# 'threading' is used to give every thread its own connections and to lock the cache
+import threading
+
+# 'time' is used to expire cached results
+import time
+
+# 'OrderedDict' remembers the order in which results were used
+# 'namedtuple' is used to create a simple result type
+from collections import OrderedDict, namedtuple
+
+# 'urljoin' and 'urlsplit' are used to read urls and follow redirects
+from urllib.parse import urljoin, urlsplit
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+# 'gettext' converts the error messages to other languages
+from django.utils.translation import gettext as _
+
+# 'iri_to_uri' quotes the characters of a url that can not be sent as-is
+from django.utils.encoding import iri_to_uri
+
+# 'httplib2' is an Http library used for making 'HEAD' requests and
+# determining the Mime-Type of a url
+import httplib2
+
+# 'measure' records the time spent waiting on image servers
+from CRUD_example.instrumentation import measure
+
+
+# 'ImageProbe' is the result of checking a url
+# 'status' is the status of the last response, or None if there was no response
+# 'content_type' is the Mime-Type of the last response
+# 'location' is the final url after following redirects
+# 'error' is None, 'not_found', 'redirect_limit', 'timeout' or 'invalid'
+ImageProbe = namedtuple('ImageProbe', ('status', 'content_type', 'location', 'error'))
+
+
+# 'DEFINITIVE_STATUSES' are the statuses of urls that do not exist, which
+# are not expected to change when the url is checked again
+DEFINITIVE_STATUSES = (404, 410)
+
+
+# 'is_definitive' tells whether a result is a lasting answer about a url: the
+# server said it is an image, something else, or that it does not exist.
+# Errors reaching the server and server errors may be gone a moment later.
+def is_definitive(probe):
+    return probe.error is None and (probe.status == 200 or probe.status in DEFINITIVE_STATUSES)
+
+
+# 'ProbeCache' is a cache of 'ImageProbe' results.
+# Definitive results expire after 'ttl' seconds, the others after
+# 'failure_ttl' seconds so a server that was down for a moment is checked
+# again soon. A 'failure_ttl' of 0 does not keep them at all. Once the cache
+# holds 'size' results the least recently used one is removed.
+class ProbeCache:
+
+    def __init__(self, size=1024, ttl=3600, failure_ttl=10):
+        self.size = size
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return None
+            expires, probe = entry
+            if expires < time.monotonic():
+                # Result is too old, forget it
+                del self.entries[url]
+                return None
+            # Mark as recently used
+            self.entries.move_to_end(url)
+            return probe
+
+    def set(self, url, probe):
+        ttl = self.ttl if is_definitive(probe) else self.failure_ttl
+        if ttl <= 0:
+            return
+        with self.lock:
+            self.entries[url] = (time.monotonic() + ttl, probe)
+            self.entries.move_to_end(url)
+            while len(self.entries) > self.size:
+                # Remove the least recently used result
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# 'ImageValidator' sends 'HEAD' requests to urls and caches the results.
+# 'httplib2.Http' keeps connections to servers open between requests, but it
+# can not be shared between threads, so every thread gets its own instance.
+class ImageValidator:
+
+    def __init__(self, timeout=5, max_redirects=10, cache=None):
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.cache = cache if cache is not None else ProbeCache()
+        self.local = threading.local()
+
+    # 'http' returns the 'httplib2.Http' instance of the current thread
+    def http(self):
+        h = getattr(self.local, 'http', None)
+        if h is None:
+            h = httplib2.Http(timeout=self.timeout)
+            self.local.http = h
+        return h
+
+    # 'probe' returns the 'ImageProbe' for a url, using the cache if possible
+    def probe(self, url):
+        probe = self.cache.get(url)
+        if probe is None:
+            with measure('http_ms'):
+                probe = self.request(url)
+            self.cache.set(url, probe)
+        return probe
+
+    # 'request' sends a 'HEAD' request to a url. It will follow redirects
+    # until it reaches 'max_redirects'.
+    def request(self, url):
+        try:
+            response, content = self.http().request(url, 'HEAD', redirections=self.max_redirects)
+        except httplib2.ServerNotFoundError:
+            return ImageProbe(None, None, None, 'not_found')
+        except httplib2.RedirectLimit:
+            return ImageProbe(None, None, None, 'redirect_limit')
+        except socket.timeout:
+            return ImageProbe(None, None, None, 'timeout')
+        except Exception:
+            # A catch-all for any other unexpected errors
+            return ImageProbe(None, None, None, 'invalid')
+        return ImageProbe(
+            response.status,
+            response.get('content-type', ''),
+            response.get('content-location', url),
+            None,
+        )
+
+
+# 'image_validator' is the shared 'ImageValidator', created on first use
+image_validator = None
+image_validator_lock = threading.Lock()
+
+
+# 'get_image_validator' returns the shared 'ImageValidator' configured from settings
+def get_image_validator():
+    global image_validator
+    with image_validator_lock:
+        if image_validator is None:
+            image_validator = ImageValidator(
+                timeout=getattr(settings, 'IMAGE_PROBE_TIMEOUT', 5),
+                max_redirects=getattr(settings, 'IMAGE_PROBE_MAX_REDIRECTS', 10),
+                cache=ProbeCache(
+                    size=getattr(settings, 'IMAGE_PROBE_CACHE_SIZE', 1024),
+                    ttl=getattr(settings, 'IMAGE_PROBE_CACHE_TTL', 3600),
+                    failure_ttl=getattr(settings, 'IMAGE_PROBE_FAILURE_TTL', 10),
+                ),
+            )
+        return image_validator
+
+
+# 'VALID_IMAGE_TYPES' is an array representing each valid image Mime-Type
+VALID_IMAGE_TYPES = [
+    'png',
+    'jpeg',
+    'jpg',
+]
+
+
+# 'check_image' checks that 'url' is an image of a type in 'VALID_IMAGE_TYPES'.
+# 'probe' is the result of checking the url, when it was already checked.
+# It returns an error message and the final url location of the image, the
+# message is None if the url is valid.
+# Forms call it while the user waits, background jobs call it afterwards.
+def check_image(url, probe=None):
+    validator = get_image_validator()
+    if probe is None:
+        # The result is cached, so checking the same url again does not send
+        # another request
+        probe = validator.probe(url)
+    if probe.error == 'redirect_limit':
+        # Max redirects has been reached
+        return _('URL exceeded max redirects (%d).') % validator.max_redirects, probe.location
+    if probe.error == 'timeout':
+        # Server took too long to respond
+        return _('URL took too long to respond.'), probe.location
+    if probe.error is not None or probe.status != 200:
+        # Server could not be reached or the response was not 'OK' (200)
+        return _('URL is not valid.'), probe.location
+    # Get the content type (Mime-Type) of the response
+    type = probe.content_type
+    # Split the content type at the slash, ignoring parameters such as charset
+    split_text = type.split(';')[0].strip().split('/')
+    # Check if the content type is an image
+    if split_text[0] != 'image' or len(split_text) != 2:
+        return _('URL is not an image. Expected \'image/(png, jpg, jpeg)\', got \''+type+'\' instead.'), probe.location
+    # Check if the image type is in 'VALID_IMAGE_TYPES'
+    if split_text[1] not in VALID_IMAGE_TYPES:
+        return _('Image is not of type PNG, JPG, or JPEG.'), probe.location
+    return None, probe.location
+
+
+# 'REDIRECT_STATUSES' are the statuses followed by 'AsyncImageValidator'
+REDIRECT_STATUSES = (300, 301, 302, 303, 307, 308)
+
+
+# 'RedirectLimit' is raised when a url redirects more than 'max_redirects' times
+class RedirectLimit(Exception):
+    pass
+
+
+# 'ResponseTooLarge' is raised when a response body is larger than allowed
+class ResponseTooLarge(Exception):
+    pass
+
+
+# 'AsyncImageValidator' checks urls like 'ImageValidator' from async code.
+# Requests are sent with asyncio streams, so an event loop can wait on many
+# slow servers at once instead of using a thread for each. Each request opens
+# a new connection. 'timeout' limits the whole request, redirects included.
+# It shares its cache with 'ImageValidator', so a url checked by one is not
+# checked again by the other.
+class AsyncImageValidator:
+
+    def __init__(self, timeout=5, max_redirects=10, cache=None):
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.cache = cache if cache is not None else ProbeCache()
+
+    # 'probe' returns the 'ImageProbe' for a url, using the cache if possible
+    async def probe(self, url):
+        probe = self.cache.get(url)
+        if probe is None:
+            with measure('http_ms'):
+                probe = await self.request(url)
+            self.cache.set(url, probe)
+        return probe
+
+    # 'request' sends a 'HEAD' request to a url and follows its redirects
+    async def request(self, url):
+        try:
+            status, headers, content, location = await asyncio.wait_for(
+                self.fetch(url, 'HEAD'),
+                self.timeout,
+            )
+        except socket.gaierror:
+            return ImageProbe(None, None, None, 'not_found')
+        except RedirectLimit:
+            return ImageProbe(None, None, None, 'redirect_limit')
+        except asyncio.TimeoutError:
+            return ImageProbe(None, None, None, 'timeout')
+        except Exception:
+            return ImageProbe(None, None, None, 'invalid')
+        return ImageProbe(
+            status,
+            headers.get('content-type', ''),
+            headers.get('content-location', location),
+            None,
+        )
+
+    # 'fetch' sends a request, follows redirects and returns the status,
+    # headers, body and final url of the last response. Bodies larger than
+    # 'max_bytes' raise 'ResponseTooLarge'.
+    async def fetch(self, url, method, max_bytes=None):
+        for i in range(self.max_redirects + 1):
+            status, headers, content = await self.send(url, method, max_bytes)
+            if status not in REDIRECT_STATUSES or 'location' not in headers:
+                return status, headers, content, url
+            url = urljoin(url, headers['location'])
+        raise RedirectLimit()
+
+    # 'send' sends a single HTTP/1.1 request and reads the response
+    async def send(self, url, method, max_bytes=None):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError('Not an http url: ' + url)
+        https = parts.scheme == 'https'
+        port = parts.port or (443 if https else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        host = parts.hostname if parts.port is None else parts.hostname + ':' + str(port)
+
+        reader, writer = await asyncio.open_connection(parts.hostname, port, ssl=https or None)
+        try:
+            writer.write((
+                '{} {} HTTP/1.1\r\n'
+                'Host: {}\r\n'
+                'Accept-Encoding: identity\r\n'
+                'Connection: close\r\n'
+                '\r\n'
+            ).format(method, iri_to_uri(path), host.encode('idna').decode()).encode('latin-1'))
+            await writer.drain()
+
+            # Status line, for example 'HTTP/1.1 200 OK'
+            status = int((await reader.readline()).split(None, 2)[1])
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            if method == 'HEAD' or status in (204, 304):
+                content = b''
+            else:
+                content = await read_body(reader, headers, max_bytes)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+        return status, headers, content
+
+
+# 'read_body' reads a response body of fixed length, in chunks, or until the
+# server closes the connection
+async def read_body(reader, headers, max_bytes=None):
+    if 'content-length' in headers:
+        length = int(headers['content-length'])
+        if max_bytes is not None and length > max_bytes:
+            raise ResponseTooLarge()
+        return await reader.readexactly(length)
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        content = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                break
+            content += await reader.readexactly(size)
+            if max_bytes is not None and len(content) > max_bytes:
+                raise ResponseTooLarge()
+            # Every chunk ends with a line break
+            await reader.readline()
+        # Skip trailers up to the final empty line
+        while (await reader.readline()).strip():
+            pass
+        return bytes(content)
+
+    content = bytearray()
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            return bytes(content)
+        content += data
+        if max_bytes is not None and len(content) > max_bytes:
+            raise ResponseTooLarge()
+
+
+# 'async_image_validator' is the shared 'AsyncImageValidator', created on first use
+async_image_validator = None
+
+
+# 'get_async_image_validator' returns the shared 'AsyncImageValidator'.
+# It uses the settings and the cache of 'get_image_validator'.
+def get_async_image_validator():
+    global async_image_validator
+    validator = get_image_validator()
+    with image_validator_lock:
+        if async_image_validator is None:
+            async_image_validator = AsyncImageValidator(
+                timeout=validator.timeout,
+                max_redirects=validator.max_redirects,
+                cache=validator.cache,
+            )
+        return async_image_validator
@@ -0,0 +1,348 @@
+# 'imports' contains the bulk import of customers, software and relations.
+# Rows are read from a CSV or JSON file one at a time, checked with the same
+# rules as the forms used to create objects, and saved in chunks with a single
+# insert per chunk. Rows with errors are reported and skipped, the rest of the
+# file is still imported.
+
+# 'csv' and 'json' are used to read the rows of a file
+import csv
+import json
+
+# 'io' is used to read uploaded files as text
+import io
+
+# 'islice' is used to split rows into chunks
+from itertools import islice
+
+# 'transaction' is used to save each chunk in a transaction
+# 'IntegrityError' is raised when a row can not be saved
+from django.db import IntegrityError, transaction
+
+# Import models to be imported
+from CRUD_example.models import (
+    Customer,
+    Software,
+    CustomerSoftware,
+)
+
+# Import forms used to validate rows
+from CRUD_example.forms import (
+    NewCustomerForm,
+    NewSoftwareForm,
+)
+
+# 'invalidate' replaces the cached tables once objects are imported
+from CRUD_example.tablecache import invalidate
+
+# 'CounterUpdate' counts the imported relations on their customer and software
+from CRUD_example.counters import CounterUpdate
+
+# 'enqueue' adds the jobs checking imported images when 'background_jobs' is set
+from CRUD_example.jobs import background_jobs, enqueue
+
+
+# 'IMPORT_FORMATS' are the supported file formats
+IMPORT_FORMATS = ('csv', 'json')
+
+# 'MAX_REPORTED_ERRORS' is the number of row errors kept for the report.
+# Every failed row is still counted.
+MAX_REPORTED_ERRORS = 1000
+
+
+# 'JSON_CHUNK_SIZE' is the number of characters of a JSON list read at once
+JSON_CHUNK_SIZE = 65536
+
+
+# 'read_rows' returns an iterator of dictionaries, one for each row of a file.
+# 'file' is a binary file. CSV files must have a header row. JSON files are
+# either a list of objects or one object per line (JSON Lines). Every format
+# is read one row at a time.
+def read_rows(file, format):
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    if format == 'csv':
+        return csv.DictReader(text)
+    if format == 'json':
+        return read_json_rows(text)
+    raise ValueError('Unsupported format: ' + format)
+
+
+def read_json_rows(text):
+    # Look at the first character to tell a list from JSON Lines
+    first = text.read(1)
+    while first.isspace():
+        first = text.read(1)
+    if first == '[':
+        yield from read_json_list(text)
+        return
+    # First line was partly read while looking at the first character
+    line = first + text.readline()
+    while line:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Invalid lines are reported as rows with errors
+                yield None
+        line = text.readline()
+
+
+# 'read_json_list' reads the items of a JSON list, whose '[' was already read,
+# one at a time. Only the item being read and one chunk of the file are kept
+# in memory. A file that is not valid JSON raises a 'ValueError'.
+def read_json_list(text):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    end = False
+    # 'item' tells whether an item or the end of the list comes next,
+    # otherwise a ',' or the end of the list does
+    item = True
+    first = True
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer and not end:
+            buffer = text.read(JSON_CHUNK_SIZE)
+            end = not buffer
+            continue
+        if buffer.startswith(']') and (first or not item):
+            rest = buffer[1:]
+            while not rest.strip():
+                rest = text.read(JSON_CHUNK_SIZE)
+                if not rest:
+                    return
+            raise ValueError('Data after the end of the list.')
+        if not item:
+            if not buffer.startswith(','):
+                raise ValueError('Expected "," or "]".')
+            buffer = buffer[1:]
+            item = True
+            continue
+        try:
+            row, position = decoder.raw_decode(buffer)
+            # A number may go on in the next chunk, or after a '.' or 'e'
+            complete = end or (position < len(buffer) and buffer[position] not in '0123456789.eE+-')
+        except ValueError:
+            if end:
+                raise
+            complete = False
+        if not complete:
+            more = text.read(JSON_CHUNK_SIZE)
+            end = not more
+            buffer += more
+            continue
+        yield row
+        buffer = buffer[position:]
+        item = False
+        first = False
+
+
+# 'form_errors' turns the errors of a form into a list of messages
+def form_errors(form):
+    messages = []
+    for field, errors in form.errors.items():
+        for error in errors:
+            if field == '__all__':
+                messages.append(error)
+            else:
+                messages.append(field + ': ' + error)
+    return messages
+
+
+# 'ImportResult' is the report of an import
+class ImportResult:
+
+    def __init__(self):
+        # Number of objects created
+        self.created = 0
+        # Number of rows with errors
+        self.failed = 0
+        # List of (row number, list of messages)
+        self.errors = []
+
+    def add_error(self, row, messages):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row, messages))
+
+
+# 'Importer' is the base class of the importers.
+# 'validate_row' checks a row and returns an unsaved object or a list of errors.
+# By default a row is checked with 'form_class', and the object is built from
+# the fields of the form.
+class Importer:
+    model = None
+    # 'form_class' is the form whose rules are used to check each row
+    form_class = None
+    # 'related_models' are the other models whose objects change on import
+    related_models = ()
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+
+    # 'run' imports every row and returns an 'ImportResult'
+    def run(self, rows):
+        result = ImportResult()
+        # Row numbers start at 1
+        rows = enumerate(rows, start=1)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            objects = self.validate_chunk(chunk, result)
+            self.save(objects, result)
+        if result.created:
+            invalidate(self.model, *self.related_models)
+        # Errors of a chunk are not always found in row order
+        result.errors.sort(key=lambda error: error[0])
+        return result
+
+    # 'validate_chunk' returns a list of (row number, object) for valid rows
+    # and adds errors for the others
+    def validate_chunk(self, chunk, result):
+        objects = []
+        for number, row in chunk:
+            if not isinstance(row, dict):
+                result.add_error(number, ['Row is not valid.'])
+                continue
+            value = self.validate_row(row)
+            if isinstance(value, list):
+                result.add_error(number, value)
+            else:
+                objects.append((number, value))
+        return objects
+
+    def validate_row(self, row):
+        form = self.form_class(data=row)
+        if not form.is_valid():
+            return form_errors(form)
+        return self.build(form.cleaned_data)
+
+    # 'build' creates an unsaved object from a row's cleaned data
+    def build(self, cleaned_data):
+        return self.model(**{name: cleaned_data[name] for name in self.form_class._meta.fields})
+
+    # 'save' inserts the objects of a chunk with a single query.
+    # If the chunk can not be saved (another request deleted a related object
+    # for example) the objects are saved one by one to find the failing rows.
+    def save(self, objects, result):
+        if not objects:
+            return
+        try:
+            with transaction.atomic():
+                self.model.objects.bulk_create([obj for number, obj in objects], batch_size=self.chunk_size)
+                self.saved([obj for number, obj in objects])
+            result.created += len(objects)
+        except IntegrityError:
+            for number, obj in objects:
+                try:
+                    with transaction.atomic():
+                        obj.save()
+                        self.saved([obj])
+                    result.created += 1
+                except IntegrityError:
+                    result.add_error(number, ['Row could not be saved.'])
+
+    # 'saved' is called with the objects of a chunk in the transaction that
+    # inserted them
+    def saved(self, objects):
+        pass
+
+
+# 'CustomerImporter' imports 'Customer' objects from rows with a 'name'
+class CustomerImporter(Importer):
+    model = Customer
+    form_class = NewCustomerForm
+
+
+# 'SoftwareImporter' imports 'Software' objects from rows with a 'name' and an 'image'.
+# Images are checked like in the form, but not downloaded. The tables show the
+# remote image until the software is edited.
+# When 'settings.BACKGROUND_JOBS' is set, the form does not check the images,
+# a job checks the images of each chunk instead.
+class SoftwareImporter(Importer):
+    model = Software
+    form_class = NewSoftwareForm
+
+    def build(self, cleaned_data):
+        software = super().build(cleaned_data)
+        if background_jobs():
+            software.image_status = Software.IMAGE_PENDING
+        return software
+
+    def saved(self, objects):
+        if not background_jobs():
+            return
+        ids = {}
+        for software in objects:
+            ids.setdefault(software.image, []).append(software.id)
+        for image, image_ids in ids.items():
+            enqueue('check_software_image', Software, ids=image_ids, image=image)
+
+
+# 'CustomerSoftwareImporter' imports 'CustomerSoftware' objects from rows with
+# a 'customer' id and a 'software' id.
+# Checking each row with 'NewCustomerSoftwareForm' would run three queries per
+# row, so the same checks are done with a few queries per chunk instead.
+class CustomerSoftwareImporter(Importer):
+    model = CustomerSoftware
+    # The counters of the customers and software change
+    related_models = (Customer, Software)
+
+    def __init__(self, chunk_size=1000):
+        super().__init__(chunk_size)
+        # Relations created by this import, to find duplicates within the file
+        self.seen = set()
+
+    def validate_chunk(self, chunk, result):
+        # Read the ids of each row
+        parsed = []
+        for number, row in chunk:
+            if not isinstance(row, dict):
+                result.add_error(number, ['Row is not valid.'])
+                continue
+            parsed.append((number, to_id(row.get('customer')), to_id(row.get('software'))))
+
+        # Load every customer, software and relation the chunk refers to
+        cids = {c for number, c, s in parsed if c is not None}
+        sids = {s for number, c, s in parsed if s is not None}
+        customers = set(Customer.objects.filter(id__in=cids).values_list('id', flat=True))
+        software = set(Software.objects.filter(id__in=sids).values_list('id', flat=True))
+        existing = set(
+            CustomerSoftware.objects.filter(cid__in=customers, sid__in=software).values_list('cid_id', 'sid_id')
+        )
+
+        objects = []
+        for number, c, s in parsed:
+            errors = []
+            if c not in customers:
+                errors.append('customer: Please choose a valid customer.')
+            if s not in software:
+                errors.append('software: Please choose a valid software.')
+            if not errors and ((c, s) in existing or (c, s) in self.seen):
+                errors.append('This relation already exists.')
+            if errors:
+                result.add_error(number, errors)
+            else:
+                self.seen.add((c, s))
+                objects.append((number, CustomerSoftware(cid_id=c, sid_id=s)))
+        return objects
+
+    def saved(self, objects):
+        counters = CounterUpdate()
+        counters.add([(obj.cid_id, obj.sid_id) for obj in objects])
+        counters.save()
+
+
+# 'to_id' converts a value from a file to an id, or None if it is not one
+def to_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# 'IMPORTERS' maps each importable table to its importer
+IMPORTERS = {
+    'customers': CustomerImporter,
+    'software': SoftwareImporter,
+    'customersoftware': CustomerSoftwareImporter,
+}
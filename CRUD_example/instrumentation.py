@@ -0,0 +1,305 @@
+# 'instrumentation' measures where the time of each request goes.
+# When 'settings.INSTRUMENTATION' is set, 'InstrumentationMiddleware' records
+# for every request the total time, the number of SQL queries and the time
+# they took, the time spent rendering templates and the time spent waiting on
+# image servers. Requests are grouped by the name of their url in 'urls'.
+# Requests rejected by 'ratelimit' are also counted.
+# The last 'settings.INSTRUMENTATION_SAMPLES' requests of each url are kept in
+# memory. Each process also saves them to 'settings.INSTRUMENTATION_DIR' every
+# 'settings.INSTRUMENTATION_SAVE_SECONDS', so 'python manage.py viewstats' and
+# the '/instrumentation' page can report on every process of the server.
+
+# 'json' and 'os' are used to save the samples of each process
+import json
+import os
+
+# 'math' is used to find percentiles
+import math
+
+# 'threading' is used to lock the samples
+import threading
+
+# 'time' is used to measure durations
+import time
+
+# 'deque' keeps the last samples of each url
+from collections import deque
+
+# 'contextmanager' creates 'measure'
+from contextlib import contextmanager
+
+# 'ContextVar' holds the measurements of the current request
+from contextvars import ContextVar
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+# 'MiddlewareNotUsed' turns the middleware off
+from django.core.exceptions import MiddlewareNotUsed
+
+
+# 'METRICS' are the values recorded for each request, in milliseconds except
+# for 'queries'
+METRICS = ('latency_ms', 'queries', 'query_ms', 'template_ms', 'http_ms')
+
+# 'PERCENTILES' are the percentiles reported for each metric
+PERCENTILES = (50, 90, 99)
+
+
+# 'RequestMetrics' holds the measurements of a request while it runs
+class RequestMetrics:
+
+    def __init__(self):
+        self.queries = 0
+        self.query_ms = 0.0
+        self.template_ms = 0.0
+        self.http_ms = 0.0
+        # Set by 'mark_rate_limited'
+        self.rate_limited = False
+        # Templates render other templates, only the outermost one is timed
+        self.template_depth = 0
+
+
+# 'request_metrics' is the 'RequestMetrics' of the current request, or None
+# outside of requests or when instrumentation is off
+request_metrics = ContextVar('request_metrics', default=None)
+
+
+# 'measure' adds the time spent in a block to a metric of the current request
+@contextmanager
+def measure(metric):
+    metrics = request_metrics.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(metrics, metric, getattr(metrics, metric) + (time.perf_counter() - start) * 1000)
+
+
+# 'mark_rate_limited' counts the current request as rejected by 'ratelimit'
+def mark_rate_limited():
+    metrics = request_metrics.get()
+    if metrics is not None:
+        metrics.rate_limited = True
+
+
+# 'record_query' is added to every database connection by 'apps'.
+# It counts the queries of the current request and how long they took.
+def record_query(execute, sql, params, many, context):
+    metrics = request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    metrics.queries += 1
+    with measure('query_ms'):
+        return execute(sql, params, many, context)
+
+
+# 'add_query_recorder' is connected to the 'connection_created' signal in 'apps'
+def add_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# 'time_templates' makes the Django template backend time its templates.
+# It is called once by 'apps'.
+def time_templates():
+    from django.template.backends.django import Template
+
+    render = Template.render
+
+    def timed_render(self, context=None, request=None):
+        metrics = request_metrics.get()
+        if metrics is None or metrics.template_depth:
+            return render(self, context, request)
+        metrics.template_depth += 1
+        try:
+            with measure('template_ms'):
+                return render(self, context, request)
+        finally:
+            metrics.template_depth -= 1
+
+    Template.render = timed_render
+
+
+# 'ViewSamples' are the last samples of a url
+class ViewSamples:
+
+    def __init__(self, size):
+        self.count = 0
+        self.rate_limited = 0
+        self.samples = {metric: deque(maxlen=size) for metric in METRICS}
+
+    def add(self, values, rate_limited=False):
+        self.count += 1
+        if rate_limited:
+            self.rate_limited += 1
+        for metric in METRICS:
+            self.samples[metric].append(values[metric])
+
+
+# 'Recorder' holds the samples of every url in this process
+class Recorder:
+
+    def __init__(self):
+        self.views = {}
+        self.lock = threading.Lock()
+        self.saved = time.monotonic()
+
+    def add(self, view, values, rate_limited=False):
+        size = getattr(settings, 'INSTRUMENTATION_SAMPLES', 1000)
+        with self.lock:
+            if view not in self.views:
+                self.views[view] = ViewSamples(size)
+            self.views[view].add(values, rate_limited)
+
+    # 'snapshot' returns the samples as JSON serializable data
+    def snapshot(self):
+        with self.lock:
+            return {
+                view: {
+                    'count': samples.count,
+                    'rate_limited': samples.rate_limited,
+                    'samples': {metric: list(values) for metric, values in samples.samples.items()},
+                }
+                for view, samples in self.views.items()
+            }
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+    # 'save' writes the samples to the file of this process, at most every
+    # 'settings.INSTRUMENTATION_SAVE_SECONDS' unless 'force' is set
+    def save(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.saved < getattr(settings, 'INSTRUMENTATION_SAVE_SECONDS', 10):
+            return
+        self.saved = now
+        directory = instrumentation_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, '{}.json'.format(os.getpid()))
+        # Write to a temporary file first so readers never see half a file
+        with open(path + '.tmp', 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(path + '.tmp', path)
+
+
+# 'recorder' is the 'Recorder' of this process
+recorder = Recorder()
+
+
+# 'instrumentation_dir' returns the folder holding the samples of each process
+def instrumentation_dir():
+    return str(getattr(settings, 'INSTRUMENTATION_DIR', settings.BASE_DIR / 'instrumentation'))
+
+
+# 'STALE_SAVES' is the number of save intervals after which the file of a
+# process is considered left behind by a process that stopped
+STALE_SAVES = 6
+
+
+# 'load_snapshots' returns the samples saved by every process. The samples of
+# this process are read from memory instead of its file.
+# Processes that stopped leave their file behind, and new processes get new
+# ids, so files not saved for 'STALE_SAVES' intervals are removed. A process
+# that was idle that long saves its samples again on its next request.
+def load_snapshots():
+    snapshots = [recorder.snapshot()]
+    directory = instrumentation_dir()
+    stale = time.time() - STALE_SAVES * getattr(settings, 'INSTRUMENTATION_SAVE_SECONDS', 10)
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if not name.endswith('.json') or name == '{}.json'.format(os.getpid()):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) < stale:
+                    os.remove(path)
+                    continue
+                with open(path) as file:
+                    snapshots.append(json.load(file))
+            except (OSError, ValueError):
+                # The process removed its file
+                continue
+    return snapshots
+
+
+# 'reset' removes the samples of this process and the saved samples
+def reset():
+    recorder.clear()
+    directory = instrumentation_dir()
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(directory, name))
+
+
+# 'percentile' returns the nearest-rank percentile of sorted values
+def percentile(values, p):
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+# 'report' combines the samples of every process and returns, for each url,
+# the number of requests, the number rejected by 'ratelimit' and the mean,
+# percentiles and maximum of each metric
+def report():
+    combined = {}
+    for snapshot in load_snapshots():
+        for view, data in snapshot.items():
+            entry = combined.setdefault(view, {'count': 0, 'rate_limited': 0, 'samples': {metric: [] for metric in METRICS}})
+            entry['count'] += data['count']
+            entry['rate_limited'] += data.get('rate_limited', 0)
+            for metric in METRICS:
+                entry['samples'][metric].extend(data['samples'].get(metric, []))
+
+    views = {}
+    for view, entry in combined.items():
+        views[view] = {'count': entry['count'], 'rate_limited': entry['rate_limited']}
+        for metric in METRICS:
+            values = sorted(entry['samples'][metric])
+            if not values:
+                continue
+            summary = {'mean': round(sum(values) / len(values), 2)}
+            for p in PERCENTILES:
+                summary['p{}'.format(p)] = round(percentile(values, p), 2)
+            summary['max'] = round(values[-1], 2)
+            views[view][metric] = summary
+    return views
+
+
+# 'InstrumentationMiddleware' measures every request.
+# It is the first middleware, so the time of the others is included.
+class InstrumentationMiddleware:
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTATION', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = request_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_metrics.reset(token)
+        latency = (time.perf_counter() - start) * 1000
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match is not None and match.url_name else '(unmatched)'
+        recorder.add(view, {
+            'latency_ms': latency,
+            'queries': metrics.queries,
+            'query_ms': metrics.query_ms,
+            'template_ms': metrics.template_ms,
+            'http_ms': metrics.http_ms,
+        }, metrics.rate_limited)
+        try:
+            recorder.save()
+        except OSError:
+            # The samples are still kept in memory
+            pass
+        return response
@@ -0,0 +1,224 @@
+# 'jobs' contains the queue of background jobs.
+# Some changes take long: checking and downloading a software image waits on a
+# third party server, and deleting a customer or software deletes all of its
+# relations too. When 'settings.BACKGROUND_JOBS' is set, the forms and views
+# save what they can, add a 'Job' to the queue and respond at once. The jobs
+# are run by 'python manage.py runjobs', which takes them from the 'Job' table
+# and runs several at once in worker processes, so no message broker is
+# needed. The table pages show the latest jobs of their table.
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+# 'apps' is used to find models by their label
+from django.apps import apps
+
+# 'close_old_connections' closes connections older than 'CONN_MAX_AGE'
+# 'transaction' is used to delete objects and their relations together
+from django.db import close_old_connections, transaction
+
+# 'F' counts the attempts of a job in the database, 'Q' finds lost jobs
+from django.db.models import F, Q
+
+# 'timedelta' is the length of a lease
+from datetime import timedelta
+
+# 'timezone' gives the time jobs start and finish
+from django.utils import timezone
+
+# 'check_image' checks that a url is an image of a valid type
+from CRUD_example.images import check_image
+
+# 'ingest_logo' stores a local copy of a software image
+from CRUD_example.logos import ingest_logo
+
+# Import the models changed by the jobs
+from CRUD_example.models import Job, Customer, Software, CustomerSoftware
+
+# 'invalidate' replaces the cached tables that show a changed model
+from CRUD_example.tablecache import invalidate
+
+# 'CounterUpdate' changes the relation counters of customers and software
+from CRUD_example.counters import CounterUpdate, relation_pairs
+
+
+# 'JOB_HANDLERS' maps the kind of each job to the function that runs it.
+# Each function is called with the model of the job and its payload, and
+# returns a message describing the result. Raising 'JobFailed' fails the job.
+JOB_HANDLERS = {}
+
+# 'OBJECT_NAMES' are the names used for each model in reports
+OBJECT_NAMES = {
+    Customer: 'customers',
+    Software: 'software',
+    CustomerSoftware: 'customer software relations',
+}
+
+# 'CASCADE_MODELS' are the models whose objects are deleted together with
+# their relations. Deleting them is done by a job.
+CASCADE_MODELS = (Customer, Software)
+
+# 'RELATION_FILTERS' finds the relations deleted with the objects of each model
+RELATION_FILTERS = {
+    Customer: 'cid__in',
+    Software: 'sid__in',
+    CustomerSoftware: 'id__in',
+}
+
+
+# 'JobFailed' is raised by a handler when its job can not be done.
+# The message is shown to the user.
+class JobFailed(Exception):
+    pass
+
+
+# 'job_handler' adds a function to 'JOB_HANDLERS'
+def job_handler(kind):
+    def register(function):
+        JOB_HANDLERS[kind] = function
+        return function
+    return register
+
+
+# 'background_jobs' tells whether slow work is left to the jobs
+def background_jobs():
+    return getattr(settings, 'BACKGROUND_JOBS', False)
+
+
+# 'enqueue' adds a job to the queue. 'payload' must be JSON serializable.
+def enqueue(kind, model, **payload):
+    if kind not in JOB_HANDLERS:
+        raise ValueError('Unknown job ' + kind + '.')
+    return Job.objects.create(kind=kind, model=model._meta.label, payload=payload)
+
+
+# 'lease_end' returns when the lease of a job claimed or renewed now ends
+def lease_end():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'JOB_LEASE_SECONDS', 60))
+
+
+# 'requeue_lost' puts the running jobs whose lease ended back in the queue.
+# Their 'runjobs' was killed or crashed before they finished. Jobs that were
+# already claimed 'settings.JOB_MAX_ATTEMPTS' times fail instead, in case
+# they are what stops 'runjobs'.
+def requeue_lost():
+    lost = Job.objects.filter(Q(lease_until__lt=timezone.now()) | Q(lease_until=None), status=Job.RUNNING)
+    # Look first, so the database is not locked for writing on every call
+    if not lost.exists():
+        return
+    lost.filter(attempts__gte=getattr(settings, 'JOB_MAX_ATTEMPTS', 3)).update(
+        status=Job.FAILED, message='Stopped before finishing too many times.', finished=timezone.now(),
+    )
+    lost.update(status=Job.QUEUED, lease_until=None)
+
+
+# 'claim_next' marks the oldest queued job as running and returns its id, or
+# None if the queue is empty.
+# The job is only claimed if it is still queued, so when several workers
+# read the same job only one of them runs it. The job is leased until
+# 'lease_end', see 'renew_leases'.
+def claim_next():
+    requeue_lost()
+    while True:
+        id = Job.objects.filter(status=Job.QUEUED).order_by('id').values_list('id', flat=True).first()
+        if id is None:
+            return None
+        claimed = Job.objects.filter(id=id, status=Job.QUEUED).update(
+            status=Job.RUNNING, started=timezone.now(), lease_until=lease_end(), attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return id
+
+
+# 'renew_leases' moves the leases of jobs that are still running forward
+def renew_leases(ids):
+    Job.objects.filter(id__in=ids, status=Job.RUNNING).update(lease_until=lease_end())
+
+
+# 'run_job' runs a claimed job and records its result.
+# It is called by the worker processes of 'runjobs'.
+def run_job(id):
+    close_old_connections()
+    job = Job.objects.get(id=id)
+    try:
+        message = JOB_HANDLERS[job.kind](apps.get_model(job.model), **job.payload)
+        status = Job.DONE
+    except JobFailed as error:
+        message = str(error)
+        status = Job.FAILED
+    except Exception as error:
+        message = 'Unexpected error: {!r}'.format(error)
+        status = Job.FAILED
+    Job.objects.filter(id=id).update(status=status, message=message, finished=timezone.now())
+    close_old_connections()
+    return status
+
+
+# 'delete_report' describes the result of 'QuerySet.delete'
+def delete_report(model, deleted):
+    report = 'Deleted {} {}.'.format(deleted.get(model._meta.label, 0), OBJECT_NAMES[model])
+    for label, number in deleted.items():
+        if label != model._meta.label and number:
+            report += ' Also deleted {} {}.'.format(number, OBJECT_NAMES[apps.get_model(label)])
+    return report
+
+
+# 'delete_objects' deletes the objects of 'model' with the given ids and their
+# relations in one transaction, and returns a report.
+# The deleted relations are no longer counted by the customers and software
+# that remain.
+@job_handler('delete_objects')
+def delete_objects(model, ids):
+    counters = CounterUpdate()
+    # Django deletes the related objects of every selected object with
+    # one query per model instead of one per object
+    with transaction.atomic():
+        relations = CustomerSoftware.objects.select_for_update().filter(**{RELATION_FILTERS[model]: ids})
+        counters.remove(relation_pairs(relations))
+        count, deleted = model.objects.filter(id__in=ids).delete()
+        # The counters of deleted objects match no rows and are skipped
+        counters.save()
+    # 'deleted' maps each model label to the number of deleted objects
+    invalidate(*[apps.get_model(label) for label, number in deleted.items() if number], *counters.models())
+    return delete_report(model, deleted)
+
+
+# 'delete_selected' deletes objects right away, or adds a job deleting them when
+# 'settings.BACKGROUND_JOBS' is set and they have relations.
+# It returns a message for the user.
+def delete_selected(model, ids):
+    if background_jobs() and model in CASCADE_MODELS:
+        enqueue('delete_objects', model, ids=list(ids))
+        return 'Deleting {} {} in the background.'.format(len(ids), OBJECT_NAMES[model])
+    return delete_objects(model, ids)
+
+
+# 'check_software_image' checks the image of software that was saved without
+# checking it, and stores a local copy. Software with an invalid image is
+# marked so the tables do not show it. Software whose image changed since the
+# job was added is left alone.
+@job_handler('check_software_image')
+def check_software_image(model, ids, image):
+    software = model.objects.filter(id__in=ids, image=image)
+    error, location = check_image(image)
+    if error is not None:
+        software.update(image_status=model.IMAGE_INVALID)
+        invalidate(model)
+        raise JobFailed('{} ({})'.format(error, image))
+    logo = ingest_logo(location)
+    count = software.update(image=location, logo=logo, image_status=model.IMAGE_CHECKED)
+    invalidate(model)
+    return 'Checked the image of {} {}.'.format(count, OBJECT_NAMES[model])
+
+
+# 'JOB_STATUS_COUNT' is the number of jobs shown on a table page
+JOB_STATUS_COUNT = 5
+
+
+# 'JobStatusMixin' is used with the table views.
+# The template shows the latest jobs of the view's model with 'view.get_jobs',
+# outside of the cached table.
+class JobStatusMixin:
+
+    def get_jobs(self):
+        return Job.objects.filter(model=self.model._meta.label).order_by('-id')[:JOB_STATUS_COUNT]
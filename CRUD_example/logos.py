@@ -0,0 +1,161 @@
+# 'logos' contains the pipeline that copies software logos to local storage.
+# Showing the remote image on every row of a table makes page load times depend
+# on third party servers. Instead, a logo is downloaded once when the software
+# is saved, stored under the hash of its content, and shrunk to a thumbnail
+# that the tables can serve from this site.
+
+# 'hashlib' is used to name files after their content
+import hashlib
+
+# 'BytesIO' lets Pillow read and write images in memory
+from io import BytesIO
+
+# 'asyncio' is used to limit how long an async download may take
+import asyncio
+
+# 'urlopen' downloads logos, reading only as many bytes as allowed
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+# 'sync_to_async' runs the blocking parts of the pipeline in a thread
+from asgiref.sync import sync_to_async
+
+# 'ContentFile' wraps bytes so they can be saved to a storage
+from django.core.files.base import ContentFile
+
+# 'default_storage' is the storage configured by 'MEDIA_ROOT'
+from django.core.files.storage import default_storage
+
+# 'Image' is used to read images and create thumbnails
+from PIL import Image
+
+# 'get_image_validator' returns the service used to check image urls.
+# Its timeout also limits the downloads.
+from CRUD_example.images import get_async_image_validator, get_image_validator
+
+# 'measure' records the time spent downloading logos
+from CRUD_example.instrumentation import measure
+
+
+# 'LOGO_FORMATS' maps each supported Pillow image format to a file extension.
+# These are the formats allowed by 'VALID_IMAGE_TYPES' in 'images'.
+LOGO_FORMATS = {
+    'PNG': 'png',
+    'JPEG': 'jpg',
+}
+
+
+# 'LogoError' is raised when a logo can not be downloaded or read
+class LogoError(Exception):
+    pass
+
+
+# 'original_path' returns the storage path of a downloaded logo
+def original_path(name):
+    return 'logos/original/' + name
+
+
+# 'thumbnail_path' returns the storage path of a logo's thumbnail
+def thumbnail_path(name):
+    return 'logos/thumbnail/' + name
+
+
+# 'download_logo' downloads an image and returns its content.
+# A logo announced as larger than 'settings.LOGO_MAX_BYTES' is not downloaded,
+# and at most one byte more is read from servers that do not announce it.
+def download_logo(url):
+    max_bytes = getattr(settings, 'LOGO_MAX_BYTES', 5 * 1024 * 1024)
+    if urlsplit(url).scheme not in ('http', 'https'):
+        raise LogoError('Logo could not be downloaded.')
+    try:
+        with measure('http_ms'):
+            # Statuses other than 2xx raise an error, redirects are followed
+            with urlopen(url, timeout=get_image_validator().timeout) as response:
+                length = response.headers.get('Content-Length')
+                if response.status != 200:
+                    raise LogoError('Logo could not be downloaded.')
+                if length is not None and length.isdigit() and int(length) > max_bytes:
+                    raise LogoError('Logo is too large.')
+                content = response.read(max_bytes + 1)
+    except LogoError:
+        raise
+    except Exception:
+        raise LogoError('Logo could not be downloaded.')
+    if len(content) > max_bytes:
+        raise LogoError('Logo is too large.')
+    return content
+
+
+# 'make_thumbnail' shrinks an image to fit in a square of 'size' pixels.
+# The image keeps its format and aspect ratio.
+def make_thumbnail(image, size):
+    thumbnail = image.copy()
+    thumbnail.thumbnail((size, size))
+    if image.format == 'JPEG' and thumbnail.mode not in ('RGB', 'L'):
+        thumbnail = thumbnail.convert('RGB')
+    output = BytesIO()
+    thumbnail.save(output, format=image.format)
+    return output.getvalue()
+
+
+# 'store_logo' stores an image and its thumbnail and returns the file name.
+# The name is the SHA-256 of the content, so the same image is only stored
+# once no matter how many software objects use it.
+def store_logo(content):
+    try:
+        image = Image.open(BytesIO(content))
+        image.load()
+    except Exception:
+        raise LogoError('Logo is not a valid image.')
+    if image.format not in LOGO_FORMATS:
+        raise LogoError('Logo is not of type PNG, JPG, or JPEG.')
+
+    name = hashlib.sha256(content).hexdigest() + '.' + LOGO_FORMATS[image.format]
+    if not default_storage.exists(original_path(name)):
+        default_storage.save(original_path(name), ContentFile(content))
+    if not default_storage.exists(thumbnail_path(name)):
+        size = getattr(settings, 'LOGO_THUMBNAIL_SIZE', 64)
+        default_storage.save(thumbnail_path(name), ContentFile(make_thumbnail(image, size)))
+    return name
+
+
+# 'ingest_logo' downloads and stores the logo at a url and returns its file
+# name, or an empty string if the logo could not be stored. The tables show
+# the remote url when there is no local logo.
+def ingest_logo(url):
+    try:
+        return store_logo(download_logo(url))
+    except LogoError:
+        return ''
+
+
+# 'download_logo_async' is the async version of 'download_logo'.
+# The whole download must finish within 'IMAGE_PROBE_TIMEOUT'.
+async def download_logo_async(url):
+    max_bytes = getattr(settings, 'LOGO_MAX_BYTES', 5 * 1024 * 1024)
+    validator = get_async_image_validator()
+    try:
+        with measure('http_ms'):
+            status, headers, content, location = await asyncio.wait_for(
+                validator.fetch(url, 'GET', max_bytes),
+                validator.timeout,
+            )
+    except Exception:
+        raise LogoError('Logo could not be downloaded.')
+    if status != 200:
+        raise LogoError('Logo could not be downloaded.')
+    return content
+
+
+# 'ingest_logo_async' is the async version of 'ingest_logo'.
+# The image is downloaded on the event loop. Reading it and writing the files
+# is done in a thread, it does not use the database.
+async def ingest_logo_async(url):
+    try:
+        content = await download_logo_async(url)
+        return await sync_to_async(store_logo, thread_sensitive=False)(content)
+    except LogoError:
+        return ''
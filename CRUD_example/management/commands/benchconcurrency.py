@@ -0,0 +1,112 @@
+# 'benchconcurrency' is a management command that measures how many requests
+# per second 'CustomersView' serves while another thread keeps writing.
+# It runs once with SQLite's defaults and once with 'settings.SQLITE_PRAGMAS'
+# and 'settings.SQLITE_JOURNAL_MODE', each time on a new temporary database,
+# so the project database is not used.
+# Example: python manage.py benchconcurrency --seconds 10 --readers 4
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test import Client
+
+from CRUD_example.db import set_journal_mode
+from CRUD_example.models import Customer, User
+
+
+class Command(BaseCommand):
+    help = 'Measures CustomersView read throughput during concurrent writes, with and without SQLITE_PRAGMAS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=5, help='Duration of each run.')
+        parser.add_argument('--readers', type=int, default=4, help='Number of reading threads.')
+        parser.add_argument('--rows', type=int, default=10000, help='Number of customers created before each run.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stderr.write('This benchmark only supports SQLite.')
+            return
+
+        original_name = connection.settings_dict['NAME']
+        original_pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+        profiles = (
+            ('sqlite defaults', {}, 'DELETE'),
+            ('SQLITE_PRAGMAS', original_pragmas, None),
+        )
+        self.stdout.write('{:<16} {:>10} {:>10} {:>8}'.format('profile', 'reads/s', 'writes/s', 'errors'))
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for index, (label, pragmas, journal_mode) in enumerate(profiles):
+                    settings.SQLITE_PRAGMAS = pragmas
+                    self.use_database(os.path.join(directory, 'bench{}.sqlite3'.format(index)))
+                    # Like the server, set the journal mode when starting
+                    set_journal_mode(connection, journal_mode)
+                    reads, writes, errors = self.run(options)
+                    seconds = options['seconds']
+                    self.stdout.write('{:<16} {:>10.1f} {:>10.1f} {:>8}'.format(
+                        label, reads / seconds, writes / seconds, errors,
+                    ))
+                connections.close_all()
+        finally:
+            settings.SQLITE_PRAGMAS = original_pragmas
+            self.use_database(original_name)
+
+    # 'use_database' points the default connection of every thread at 'name'
+    def use_database(self, name):
+        connections.close_all()
+        # The settings dictionary is shared by the connections of every thread
+        connection.settings_dict['NAME'] = name
+
+    def run(self, options):
+        call_command('migrate', verbosity=0)
+        Customer.objects.bulk_create(
+            [Customer(name='Customer {}'.format(i)) for i in range(options['rows'])],
+            batch_size=500,
+        )
+        user = User.objects.create_user(email='bench@example.com', password='benchmark')
+        login = Client(SERVER_NAME='localhost')
+        login.force_login(user)
+
+        stop = threading.Event()
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def count(name):
+            with lock:
+                counts[name] += 1
+
+        def reader():
+            client = Client(SERVER_NAME='localhost')
+            client.cookies = login.cookies
+            while not stop.is_set():
+                try:
+                    response = client.get('/customers/')
+                    count('reads' if response.status_code == 200 else 'errors')
+                except OperationalError:
+                    count('errors')
+            connection.close()
+
+        def writer():
+            while not stop.is_set():
+                try:
+                    customer = Customer.objects.create(name='Written')
+                    Customer.objects.filter(id=customer.id).update(name='Updated')
+                    count('writes')
+                except OperationalError:
+                    count('errors')
+            connection.close()
+
+        threads = [threading.Thread(target=reader) for i in range(options['readers'])]
+        threads.append(threading.Thread(target=writer))
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return counts['reads'], counts['writes'], counts['errors']
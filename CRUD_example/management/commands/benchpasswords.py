@@ -0,0 +1,66 @@
+# 'benchpasswords' is a management command that measures how many logins per
+# second each password hasher profile allows, see 'CRUD_example/hashers.py'.
+# A login checks one password, so one thread checking passwords gives the
+# logins per second of one core. With '--threads', several threads check
+# passwords at once, which shows how the profile scales over the cores.
+# The costs come from the 'PASSWORD_*' settings.
+# Example: python manage.py benchpasswords --threads 4
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+# 'PASSWORD' is the password checked, as long as a typical password
+PASSWORD = 'correct horse battery'
+
+
+class Command(BaseCommand):
+    help = 'Measures the logins per second per core of each password hasher profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=2, help='Seconds to check passwords with each profile.')
+        parser.add_argument('--threads', type=int, default=1, help='Threads checking passwords at once.')
+        parser.add_argument('--profile', action='append', help='Profile to measure, all profiles by default.')
+
+    def handle(self, *args, **options):
+        profiles = options['profile'] or list(settings.PASSWORD_HASHER_PROFILES)
+        threads = max(options['threads'], 1)
+        self.stdout.write('{:<8} {:<36} {:>10} {:>16} {:>16}'.format(
+            'profile', 'cost', 'ms/login', 'logins/s/core', 'logins/s ({} thr)'.format(threads),
+        ))
+        for profile in profiles:
+            hasher = import_string(settings.PASSWORD_HASHER_PROFILES[profile])()
+            try:
+                encoded = hasher.encode(PASSWORD, hasher.salt())
+            except ValueError as error:
+                # The library of the hasher is not installed
+                self.stdout.write('{:<8} {}'.format(profile, error))
+                continue
+            decoded = hasher.decode(encoded)
+            cost = ' '.join(
+                '{}={}'.format(key, value) for key, value in decoded.items() if key not in ('algorithm', 'salt', 'hash')
+            )
+            per_core = self.run(hasher, encoded, 1, options['seconds'])
+            total = per_core if threads == 1 else self.run(hasher, encoded, threads, options['seconds'])
+            self.stdout.write('{:<8} {:<36} {:>10.1f} {:>16.1f} {:>16.1f}'.format(
+                profile, cost, 1000 / per_core, per_core, total,
+            ))
+
+    # 'run' checks the password in 'threads' threads for 'seconds' and returns
+    # the passwords checked per second
+    def run(self, hasher, encoded, threads, seconds):
+        def check():
+            count = 0
+            end = time.perf_counter() + seconds
+            while count < 3 or time.perf_counter() < end:
+                if not hasher.verify(PASSWORD, encoded):
+                    raise AssertionError('The password was not accepted.')
+                count += 1
+            return count
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            counts = list(pool.map(lambda i: check(), range(threads)))
+        return sum(counts) / (time.perf_counter() - start)
@@ -0,0 +1,70 @@
+# 'benchsessions' is a management command that measures how many table pages a
+# logged in user can load per second with each session engine, and how many
+# queries each page runs, counting those on the session table separately.
+# It uses a temporary database, so the project database is not used.
+# Example: python manage.py benchsessions --requests 500
+import os
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from CRUD_example.models import Customer, User
+
+# 'ENGINES' are the session engines compared
+ENGINES = (
+    ('database', 'django.contrib.sessions.backends.db'),
+    ('cached', 'CRUD_example.sessions'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Measures logged in table page throughput with the database and cached session engines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Number of pages loaded with each engine.')
+        parser.add_argument('--url', default='/customers/', help='Page to load.')
+
+    def handle(self, *args, **options):
+        original_name = connection.settings_dict['NAME']
+        self.stdout.write('{:<10} {:>10} {:>10} {:>16}'.format('sessions', 'pages/s', 'queries', 'session queries'))
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                connections.close_all()
+                connection.settings_dict['NAME'] = os.path.join(directory, 'bench.sqlite3')
+                call_command('migrate', verbosity=0)
+                Customer.objects.bulk_create([Customer(name='Customer {}'.format(i)) for i in range(100)])
+                user = User.objects.create_user(email='bench@example.com', password='benchmark')
+                for label, engine in ENGINES:
+                    with override_settings(SESSION_ENGINE=engine):
+                        pages, queries, session_queries = self.run(user, options)
+                    self.stdout.write('{:<10} {:>10.1f} {:>10.2f} {:>16.2f}'.format(
+                        label, pages, queries, session_queries,
+                    ))
+                connections.close_all()
+        finally:
+            connection.settings_dict['NAME'] = original_name
+
+    # 'run' loads the page 'requests' times with a new logged in client and
+    # returns the pages per second and the queries per page
+    def run(self, user, options):
+        # The client reads 'SESSION_ENGINE' when it is created
+        client = Client(SERVER_NAME='localhost')
+        client.force_login(user)
+        # Load the page once so the table is cached
+        client.get(options['url'])
+
+        start = time.perf_counter()
+        for i in range(options['requests']):
+            client.get(options['url'])
+        seconds = time.perf_counter() - start
+
+        # Count the queries of one more page
+        with CaptureQueriesContext(connection) as context:
+            client.get(options['url'])
+        session_queries = sum('django_session' in query['sql'] for query in context.captured_queries)
+        return options['requests'] / seconds, len(context.captured_queries), session_queries
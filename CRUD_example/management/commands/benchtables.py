@@ -0,0 +1,112 @@
+# 'benchtables' is a management command that measures how long the tables take
+# to render a page of rows. Each table is rendered with the columns from
+# 'columns' and with the 'TemplateColumn's they replaced, and the two results
+# are compared so the html stays the same.
+# Rows are created in memory, so the database is not used.
+# Example: python manage.py benchtables --rows 1000 --repeat 5
+import time
+
+import django_tables2 as tables
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from CRUD_example.models import Customer, CustomerSoftware, Software
+from CRUD_example.tables import CustomerSoftwareTable, CustomerTable, SoftwareTable
+
+
+# Templates of the 'TemplateColumn's replaced by 'ButtonsColumn' and 'LogoColumn'
+def buttons_template(edit_url, delete_url):
+    return (
+        '<div class="tableButtonWrapper">\n'
+        '    <button class="tableEditButton" onclick="location.href = \'{% url \'' + edit_url + '\' record.id %}\'">Edit</button>\n'
+        '    <button class="tableDeleteButton" onclick="location.href = \'{% url \'' + delete_url + '\' record.id %}\'">Delete</button>\n'
+        '</div>'
+    )
+
+
+def logo_template(software):
+    return (
+        '<div class="softwareImageWrapper">\n'
+        '    <img class="softwareImage" src="{% if ' + software + '.logo %}{% url \'logo\' ' + software + '.logo %}'
+        '{% else %}{{ ' + software + '.image }}{% endif %}"/>\n'
+        '</div>'
+    )
+
+
+def template_column(code):
+    return tables.TemplateColumn(template_code=code, orderable=False, exclude_from_export=True)
+
+
+class TemplateCustomerTable(CustomerTable):
+    edit = template_column(buttons_template('editcustomer', 'delcustomer'))
+
+    class Meta(CustomerTable.Meta):
+        pass
+
+
+class TemplateSoftwareTable(SoftwareTable):
+    logo = template_column(logo_template('record'))
+    edit = template_column(buttons_template('editsoftware', 'delsoftware'))
+
+    class Meta(SoftwareTable.Meta):
+        pass
+
+
+class TemplateCustomerSoftwareTable(CustomerSoftwareTable):
+    logo = template_column(logo_template('record.sid'))
+    edit = template_column(buttons_template('editcustomersoftware', 'delcustomersoftware'))
+
+    class Meta(CustomerSoftwareTable.Meta):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Measures table render time with template-free columns and with TemplateColumn.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Number of rows on the page.')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of renders to average.')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        customers = [Customer(id=i, name='Customer {}'.format(i)) for i in range(1, rows + 1)]
+        # Half of the software has a local logo, the other half a remote image
+        software = [
+            Software(
+                id=i,
+                name='Software {}'.format(i),
+                image='https://example.com/logo{}.png?size=64&v=1'.format(i),
+                logo='{:064x}.png'.format(i) if i % 2 else '',
+            )
+            for i in range(1, rows + 1)
+        ]
+        relations = [
+            CustomerSoftware(id=i, cid=customer, sid=item)
+            for i, (customer, item) in enumerate(zip(customers, software), start=1)
+        ]
+        request = RequestFactory().get('/')
+
+        self.stdout.write('{:<22} {:>12} {:>12} {:>8}'.format('table', 'template ms', 'columns ms', 'speedup'))
+        benchmarks = (
+            ('CustomerTable', TemplateCustomerTable, CustomerTable, customers),
+            ('SoftwareTable', TemplateSoftwareTable, SoftwareTable, software),
+            ('CustomerSoftwareTable', TemplateCustomerSoftwareTable, CustomerSoftwareTable, relations),
+        )
+        for label, template_table, table, data in benchmarks:
+            template_html, template_time = self.render(template_table, data, request, options['repeat'])
+            html, columns_time = self.render(table, data, request, options['repeat'])
+            if html != template_html:
+                raise CommandError(label + ' renders different html than its templates.')
+            self.stdout.write('{:<22} {:>12.1f} {:>12.1f} {:>7.1f}x'.format(
+                label, template_time * 1000, columns_time * 1000, template_time / columns_time,
+            ))
+
+    # 'render' renders a table 'repeat' times and returns the html and the
+    # average time in seconds
+    def render(self, table_class, data, request, repeat):
+        # Render once first so templates are loaded and urls are reversed
+        html = table_class(data).as_html(request)
+        start = time.perf_counter()
+        for i in range(repeat):
+            table_class(data).as_html(request)
+        return html, (time.perf_counter() - start) / repeat
@@ -0,0 +1,48 @@
+# 'importdata' is a management command that imports a CSV or JSON file of
+# customers, software or customer - software relations.
+# Example: python manage.py importdata customers customers.csv
+from django.core.management.base import BaseCommand, CommandError
+
+# 'IMPORTERS' contains an importer for each table.
+# 'read_rows' reads the rows of a file one at a time.
+from CRUD_example.imports import IMPORTERS, IMPORT_FORMATS, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Imports customers, software or customer - software relations from a CSV or JSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format',
+            choices=IMPORT_FORMATS,
+            help='File format. Defaults to the file extension.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of rows saved per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if format not in IMPORT_FORMATS:
+            raise CommandError('Unknown file format, use --format.')
+
+        importer = IMPORTERS[options['table']](chunk_size=options['chunk_size'])
+        try:
+            with open(path, 'rb') as file:
+                result = importer.run(read_rows(file, format))
+        except OSError as e:
+            raise CommandError(str(e))
+        except ValueError as e:
+            raise CommandError('File could not be read: ' + str(e))
+
+        for row, messages in result.errors:
+            self.stderr.write('Row %d: %s' % (row, ' '.join(messages)))
+        if result.failed > len(result.errors):
+            self.stderr.write('%d more rows had errors.' % (result.failed - len(result.errors)))
+        self.stdout.write('Created %d, failed %d.' % (result.created, result.failed))
@@ -0,0 +1,124 @@
+# 'loadtestimages' is a management command that submits many software forms at
+# once to the regular and the async create view, the way the ASGI server runs
+# them, against a local image server that waits before every response.
+# The regular view checks and downloads images in the single thread Django
+# uses for sync views, so submissions wait on each other. The async view waits
+# on the image server with asyncio, so they overlap.
+# It uses a temporary database and media folder, so the project's are not used.
+# Example: python manage.py loadtestimages --requests 20 --delay 0.2
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import AsyncRequestFactory, override_settings
+from PIL import Image
+
+from CRUD_example.asyncviews import AsyncNewSoftwareView
+from CRUD_example.images import get_image_validator
+from CRUD_example.models import Software, User
+from CRUD_example.views import NewSoftwareView
+
+
+# 'StubServer' is the image server. It accepts every submission at once.
+class StubServer(ThreadingHTTPServer):
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+# 'stub_handler' returns a request handler for the image server that waits
+# 'delay' seconds and then serves 'image' as a PNG file
+def stub_handler(delay, image):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def send_image_headers(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(image)))
+            self.end_headers()
+
+        def do_HEAD(self):
+            self.send_image_headers()
+
+        def do_GET(self):
+            self.send_image_headers()
+            self.wfile.write(image)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class Command(BaseCommand):
+    help = 'Compares the regular and async software create views while the image server is slow.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Number of forms submitted at once.')
+        parser.add_argument('--delay', type=float, default=0.2, help='Seconds the image server waits before each response.')
+
+    def handle(self, *args, **options):
+        output = BytesIO()
+        Image.new('RGB', (128, 128), 'blue').save(output, format='PNG')
+        server = StubServer(('127.0.0.1', 0), stub_handler(options['delay'], output.getvalue()))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+
+        original_name = connection.settings_dict['NAME']
+        try:
+            with tempfile.TemporaryDirectory() as directory, override_settings(MEDIA_ROOT=directory):
+                connections.close_all()
+                connection.settings_dict['NAME'] = os.path.join(directory, 'loadtest.sqlite3')
+                call_command('migrate', verbosity=0)
+                user = User.objects.create_user(email='loadtest@example.com', password='loadtest')
+
+                self.stdout.write('{:<8} {:>9} {:>9} {:>10} {:>8}'.format('view', 'requests', 'created', 'seconds', 'req/s'))
+                views = (
+                    # Django runs sync views with 'sync_to_async' in a single thread
+                    ('sync', sync_to_async(NewSoftwareView.as_view())),
+                    ('async', AsyncNewSoftwareView.as_view()),
+                )
+                for label, view in views:
+                    get_image_validator().cache.clear()
+                    urls = ['{}{}/{}.png'.format(base_url, label, i) for i in range(options['requests'])]
+                    seconds = asyncio.run(self.submit(view, urls, user))
+                    created = Software.objects.filter(image__in=urls).count()
+                    self.stdout.write('{:<8} {:>9} {:>9} {:>10.2f} {:>8.1f}'.format(
+                        label, len(urls), created, seconds, len(urls) / seconds,
+                    ))
+                connections.close_all()
+        finally:
+            server.shutdown()
+            connection.settings_dict['NAME'] = original_name
+
+    # 'submit' posts one form for each url at the same time and returns how
+    # many seconds it took for all of them to finish
+    async def submit(self, view, urls, user):
+        factory = AsyncRequestFactory()
+
+        async def post(url):
+            request = factory.post(
+                '/software/create',
+                urlencode({'name': 'Load test', 'image': url}),
+                content_type='application/x-www-form-urlencoded',
+            )
+            request.user = user
+            await view(request)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(post(url) for url in urls))
+        seconds = time.perf_counter() - start
+        # Close the connection of the thread that ran the sync code
+        await sync_to_async(connections.close_all)()
+        return seconds
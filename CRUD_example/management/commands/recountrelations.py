@@ -0,0 +1,21 @@
+# 'recountrelations' is a management command that sets the relation counters
+# of every customer and software to the number of relations in the database.
+# The counters are kept up to date when relations change, see 'counters'. This
+# fixes them after relations were changed some other way, for example with SQL.
+# Example: python manage.py recountrelations
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from CRUD_example.counters import recount
+from CRUD_example.models import Customer, Software
+from CRUD_example.tablecache import invalidate
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the software count of every customer and the customer count of every software.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = recount()
+        invalidate(Customer, Software)
+        self.stdout.write('Fixed {} customers and {} software.'.format(fixed[Customer], fixed[Software]))
@@ -0,0 +1,106 @@
+# 'runjobs' is a management command that runs the background jobs added by the
+# forms and views when 'settings.BACKGROUND_JOBS' is set, see 'jobs'.
+# Jobs are claimed from the 'Job' table by this process and run by a pool of
+# worker processes, so a slow image server only holds up one worker. Several
+# 'runjobs' commands may run at once, each job is only run by one of them.
+# The jobs being run are leased, see 'jobs.claim_next'. If this command is
+# killed, another one runs them again once their lease ends. Ctrl+C and
+# SIGTERM stop it after the running jobs finish.
+# Example: python manage.py runjobs --processes 4
+import multiprocessing
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+
+# Worker processes import this module before Django is set up, so the models
+# and 'jobs' are only imported inside the functions.
+
+# 'setup_worker' prepares a new worker process for running jobs.
+# Workers ignore Ctrl+C and SIGTERM so the jobs they run finish, the main
+# process stops the pool.
+def setup_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    django.setup()
+
+
+# 'stop' handles SIGTERM like Ctrl+C
+def stop(signum, frame):
+    raise KeyboardInterrupt()
+
+
+# 'work' runs a job in a worker process
+def work(id):
+    from CRUD_example.jobs import run_job
+    return run_job(id)
+
+
+class Command(BaseCommand):
+    help = 'Runs the queued background jobs in a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='Number of worker processes.')
+        parser.add_argument('--poll', type=float, default=1, help='Seconds to wait before looking for new jobs.')
+        parser.add_argument('--once', action='store_true', help='Stop once the queue is empty.')
+
+    def handle(self, *args, **options):
+        from CRUD_example.jobs import claim_next, renew_leases
+        signal.signal(signal.SIGTERM, stop)
+        processes = max(options['processes'], 1)
+        # Leases are renewed a few times before they end
+        renew_seconds = getattr(settings, 'JOB_LEASE_SECONDS', 60) / 3
+        renewed = time.monotonic()
+        # Workers are started fresh instead of forked, so they do not share the
+        # database connections of this process
+        context = multiprocessing.get_context('spawn')
+        running = {}
+        with ProcessPoolExecutor(processes, mp_context=context, initializer=setup_worker) as pool:
+            try:
+                while True:
+                    # Claim jobs until every worker is busy
+                    while len(running) < processes:
+                        id = claim_next()
+                        if id is None:
+                            break
+                        running[pool.submit(work, id)] = id
+                    if not running:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll'])
+                        continue
+                    done, pending = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.report(running.pop(future), future)
+                    if running and time.monotonic() - renewed > renew_seconds:
+                        renew_leases(list(running.values()))
+                        renewed = time.monotonic()
+            except KeyboardInterrupt:
+                self.stdout.write('Waiting for {} running jobs.'.format(len(running)))
+                while running:
+                    done, pending = wait(running, timeout=renew_seconds)
+                    for future in done:
+                        self.report(running.pop(future), future)
+                    if running:
+                        renew_leases(list(running.values()))
+        connections.close_all()
+
+    # 'report' writes the result of a finished job
+    def report(self, id, future):
+        from CRUD_example.models import Job
+        try:
+            status = future.result()
+        except Exception as error:
+            # The worker process stopped while running the job
+            Job.objects.filter(id=id).update(
+                status=Job.FAILED, message='Worker stopped: {!r}'.format(error), finished=timezone.now(),
+            )
+            self.stderr.write('Job {} crashed: {!r}'.format(id, error))
+            return
+        self.stdout.write('Job {} {}.'.format(id, status))
@@ -0,0 +1,52 @@
+# 'viewstats' is a management command that shows the measurements recorded by
+# 'InstrumentationMiddleware' for every url, combined over all processes of the
+# server. Times are in milliseconds. 'limited' is the number of requests
+# rejected by 'ratelimit'. See 'instrumentation'.
+# Example: python manage.py viewstats --sort query_ms
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from CRUD_example.instrumentation import METRICS, report, reset
+
+
+class Command(BaseCommand):
+    help = 'Shows the latency, SQL queries, template and image server time of every url.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', default='latency_ms', help='Metric to sort by, its 90th percentile is used.')
+        parser.add_argument('--json', action='store_true', help='Write the full report as JSON.')
+        parser.add_argument('--reset', action='store_true', help='Remove every saved measurement.')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            reset()
+            self.stdout.write('Removed the saved measurements.')
+            return
+        if options['sort'] not in METRICS:
+            raise CommandError('--sort must be one of: ' + ', '.join(METRICS) + '.')
+        if not getattr(settings, 'INSTRUMENTATION', False):
+            self.stderr.write('INSTRUMENTATION is not set, no new requests are measured.')
+
+        views = report()
+        if options['json']:
+            self.stdout.write(json.dumps(views, indent=2, sort_keys=True))
+            return
+
+        sort = options['sort']
+        names = sorted(views, key=lambda name: views[name].get(sort, {}).get('p90', 0), reverse=True)
+        self.stdout.write('{:<28} {:>7} {:>7}  {}'.format('url', 'count', 'limited', '  '.join(
+            '{:>24}'.format(metric + ' p50/p90/p99') for metric in METRICS
+        )))
+        for name in names:
+            columns = []
+            for metric in METRICS:
+                summary = views[name].get(metric)
+                if summary is None:
+                    columns.append('{:>24}'.format('-'))
+                else:
+                    columns.append('{:>24}'.format('{:.1f}/{:.1f}/{:.1f}'.format(summary['p50'], summary['p90'], summary['p99'])))
+            self.stdout.write('{:<28} {:>7} {:>7}  {}'.format(
+                name, views[name]['count'], views[name]['rate_limited'], '  '.join(columns),
+            ))
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-17 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRUD_example', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='software',
+            name='logo',
+            field=models.CharField(blank=True, default='', max_length=80),
+        ),
+    ]
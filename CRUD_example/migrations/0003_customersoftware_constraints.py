@@ -0,0 +1,40 @@
+# Generated by Django 4.0.5 on 2026-10-17 12:55
+
+from django.db import migrations, models
+
+
+# 'remove_duplicate_relations' deletes repeated customer - software relations,
+# keeping the oldest one, so the unique constraint can be added.
+def remove_duplicate_relations(apps, schema_editor):
+    CustomerSoftware = apps.get_model('CRUD_example', 'CustomerSoftware')
+    keep = CustomerSoftware.objects.values('cid', 'sid').annotate(id=models.Min('id')).values('id')
+    CustomerSoftware.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRUD_example', '0002_software_logo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='software',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='customersoftware',
+            index=models.Index(fields=['date_obtained'], name='CRUD_exampl_date_ob_7c71b2_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_relations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customersoftware',
+            constraint=models.UniqueConstraint(fields=('cid', 'sid'), name='unique_customer_software'),
+        ),
+    ]
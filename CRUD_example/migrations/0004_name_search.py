@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+# The customer and software names are indexed in FTS5 tables using the trigram
+# tokenizer. 'content' makes the FTS5 table read names from the real table, so
+# only the index is stored. Triggers keep the index up to date.
+TABLES = ('CRUD_example_customer', 'CRUD_example_software')
+
+CREATE = [
+    "CREATE VIRTUAL TABLE {0}_fts USING fts5(name, content='{0}', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER {0}_fts_insert AFTER INSERT ON {0} BEGIN "
+    "INSERT INTO {0}_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER {0}_fts_delete AFTER DELETE ON {0} BEGIN "
+    "INSERT INTO {0}_fts({0}_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER {0}_fts_update AFTER UPDATE OF name ON {0} BEGIN "
+    "INSERT INTO {0}_fts({0}_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO {0}_fts(rowid, name) VALUES (new.id, new.name); END",
+    # Index the rows that already exist
+    "INSERT INTO {0}_fts({0}_fts) VALUES ('rebuild')",
+]
+
+DROP = [
+    "DROP TRIGGER IF EXISTS {0}_fts_insert",
+    "DROP TRIGGER IF EXISTS {0}_fts_delete",
+    "DROP TRIGGER IF EXISTS {0}_fts_update",
+    "DROP TABLE IF EXISTS {0}_fts",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # FTS5 is only available on SQLite. Other databases search with 'icontains'.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for table in TABLES:
+            for statement in statements:
+                schema_editor.execute(statement.format(table))
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRUD_example', '0003_customersoftware_constraints'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
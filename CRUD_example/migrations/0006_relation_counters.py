@@ -0,0 +1,63 @@
+# Generated by Django 4.0.5 on 2026-10-17 13:17
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# SQLite can not add a column to a table with 'ALTER TABLE' in Django 4.0, so
+# the customer and software tables are copied to new tables. Their triggers
+# keeping the name search index up to date are lost, see '0004_name_search'.
+name_search = import_module('CRUD_example.migrations.0004_name_search')
+TRIGGERS = [statement for statement in name_search.DROP + name_search.CREATE if 'TRIGGER' in statement]
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in name_search.TABLES:
+        for statement in TRIGGERS:
+            schema_editor.execute(statement.format(table))
+
+
+def count_relations(apps, schema_editor):
+    CustomerSoftware = apps.get_model('CRUD_example', 'CustomerSoftware')
+    for name, field, relation in (('Customer', 'software_count', 'cid'), ('Software', 'customer_count', 'sid')):
+        counts = (
+            CustomerSoftware.objects.filter(**{relation: OuterRef('pk')})
+            .order_by().values(relation).annotate(count=Count('id')).values('count')
+        )
+        apps.get_model('CRUD_example', name).objects.update(**{field: Coalesce(Subquery(counts), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRUD_example', '0005_job'),
+    ]
+
+    operations = [
+        # Removing the columns copies the tables again when unapplied
+        migrations.RunPython(migrations.RunPython.noop, create_triggers),
+        migrations.AddField(
+            model_name='customer',
+            name='software_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='software',
+            name='customer_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['software_count', 'id'], name='CRUD_exampl_softwar_fdc7ba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='software',
+            index=models.Index(fields=['customer_count', 'id'], name='CRUD_exampl_custome_4f6c8b_idx'),
+        ),
+        migrations.RunPython(create_triggers, migrations.RunPython.noop),
+        migrations.RunPython(count_relations, migrations.RunPython.noop),
+    ]
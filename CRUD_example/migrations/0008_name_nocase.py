@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+# The customer and software names are indexed with the NOCASE collation, so
+# the lookups find the names starting with some text, whatever its case, by
+# reading a range of the index in name order.
+TABLES = ('CRUD_example_customer', 'CRUD_example_software')
+
+CREATE = [
+    "CREATE INDEX {0}_name_nocase ON {0}(name COLLATE NOCASE, id)",
+]
+
+DROP = [
+    "DROP INDEX IF EXISTS {0}_name_nocase",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # NOCASE is only available on SQLite. Other databases use 'istartswith'.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for table in TABLES:
+            for statement in statements:
+                schema_editor.execute(statement.format(table))
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRUD_example', '0007_user_is_staff'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
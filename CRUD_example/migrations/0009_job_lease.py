@@ -0,0 +1,23 @@
+# Generated by Django 4.0.5 on 2026-10-17 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRUD_example', '0008_name_nocase'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='lease_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-17 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRUD_example', '0009_job_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='software',
+            name='image_status',
+            field=models.CharField(choices=[('checked', 'Checked'), ('pending', 'Checking image'), ('invalid', 'Invalid image')], default='checked', max_length=10),
+        ),
+    ]
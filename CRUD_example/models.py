@@ -47,6 +47,10 @@ class User(AbstractBaseUser):
     # Users must have unique emails
     email = models.EmailField(unique=True)
     is_active = models.BooleanField(default=True)
+    # Staff users may see the '/instrumentation' report.
+    # Both are set by 'python manage.py createsuperuser'.
+    is_staff = models.BooleanField(default=False)
+    is_superuser = models.BooleanField(default=False)
     date_created = models.DateTimeField(auto_now=True)
 
     # Define which field will be treated like the username. Must be unique.
@@ -72,8 +76,18 @@ class Login(models.Model):
 # 'Customer' is a 'Model'
 # The 'Customer' table holds all customer objects
 class Customer(models.Model):
-    name = models.CharField(max_length=255)
+    # 'db_index' adds an index so sorting the table by name is fast
+    name = models.CharField(max_length=255, db_index=True)
     date_created = models.DateTimeField(auto_now=True)
+    # 'software_count' is the number of 'CustomerSoftware' objects of the
+    # customer, kept up to date by 'counters'
+    software_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Sorting the table by the counter also sorts by 'id'
+            models.Index(fields=['software_count', 'id']),
+        ]
 
     def __str__(self):
         return self.name
@@ -81,9 +95,33 @@ class Customer(models.Model):
 # 'Software' is a 'Model'
 # The 'Software' table holds all software objects
 class Software(models.Model):
-    name = models.CharField(max_length=255)
+    IMAGE_CHECKED = 'checked'
+    IMAGE_PENDING = 'pending'
+    IMAGE_INVALID = 'invalid'
+    IMAGE_STATUS_CHOICES = (
+        (IMAGE_CHECKED, 'Checked'),
+        (IMAGE_PENDING, 'Checking image'),
+        (IMAGE_INVALID, 'Invalid image'),
+    )
+
+    name = models.CharField(max_length=255, db_index=True)
     image = models.URLField(max_length=512)
+    # 'image_status' tells whether 'image' was checked. When
+    # 'settings.BACKGROUND_JOBS' is set, images are saved before a job checks
+    # them. The tables only show checked images.
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, default=IMAGE_CHECKED)
+    # 'logo' is the file name of the local copy of 'image', see 'logos'.
+    # It is empty until the image has been downloaded.
+    logo = models.CharField(max_length=80, blank=True, default='')
     date_added = models.DateTimeField(auto_now=True)
+    # 'customer_count' is the number of 'CustomerSoftware' objects of the
+    # software, kept up to date by 'counters'
+    customer_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer_count', 'id']),
+        ]
 
     def __str__(self):
         return self.name
@@ -93,4 +131,64 @@ class Software(models.Model):
 class CustomerSoftware(models.Model):
     cid = models.ForeignKey("Customer", on_delete=models.CASCADE)
     sid = models.ForeignKey("Software", on_delete=models.CASCADE)
-    date_obtained = models.DateTimeField(auto_now=True)
\ No newline at end of file
+    date_obtained = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # A customer can only be related to a software once
+            models.UniqueConstraint(fields=['cid', 'sid'], name='unique_customer_software'),
+        ]
+        indexes = [
+            models.Index(fields=['date_obtained']),
+        ]
+
+# 'Job' is a 'Model'
+# The 'Job' table is the queue of background jobs, see 'jobs'.
+# Jobs are added by the views and forms, and run by 'python manage.py runjobs'.
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+    # Every kind has a function running it in 'JOB_HANDLERS'
+    KIND_CHOICES = (
+        ('delete_objects', 'Delete'),
+        ('check_software_image', 'Check image'),
+    )
+
+    # 'kind' is the key of the function that runs the job in 'JOB_HANDLERS'
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    # 'model' is the label of the model the job changes, used to show the
+    # jobs of a table on its page
+    model = models.CharField(max_length=100, blank=True, default='')
+    # 'payload' holds the arguments of the function
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # 'message' describes the result, or the error if the job failed
+    message = models.TextField(blank=True, default='')
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # 'lease_until' is when a running job is given up for lost because its
+    # 'runjobs' stopped, see 'claim_next'. 'runjobs' moves it forward while
+    # the job runs.
+    lease_until = models.DateTimeField(null=True, blank=True)
+    # 'attempts' is the number of times the job was claimed
+    attempts = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Workers look for the oldest queued job
+            models.Index(fields=['status', 'id']),
+            # Pages show the latest jobs of their table
+            models.Index(fields=['model', 'id']),
+        ]
+
+    def __str__(self):
+        return '{} #{} ({})'.format(self.kind, self.id, self.status)
@@ -0,0 +1,233 @@
+# 'pagination' contains the cursor (keyset) pagination used by the table views.
+# Offset pagination ('?page=N') makes the database walk and discard every row
+# before the requested page, and a 'COUNT(*)' runs on every page load.
+# Cursor pagination instead remembers the sort values of the last row shown and
+# asks the database for the rows that come after it, so every page costs the
+# same as the first one.
+
+# 'base64' and 'json' are used to encode the cursor into a url parameter
+import base64
+import json
+
+# 'datetime' is used to keep the microseconds of dates in cursors
+import datetime
+
+# 'settings' holds the project settings, used to choose the pagination mode
+from django.conf import settings
+
+# 'DjangoJSONEncoder' can encode dates and decimals as well as basic types
+from django.core.serializers.json import DjangoJSONEncoder
+
+# 'connections' gives access to the database a queryset is bound to
+from django.db import connections
+
+# 'Max' is used to estimate the size of a table from its primary key
+# 'Q' is used to build the conditions that select the rows after a cursor
+from django.db.models import Max, Q
+
+# 'LazyPaginator' is a paginator that does not run 'COUNT(*)'
+from django_tables2 import LazyPaginator, RequestConfig
+
+# 'TableListData' holds the rows of a table that is not built from a queryset
+from django_tables2.data import TableListData
+
+
+# 'CURSOR_FIELD' is the url parameter holding the cursor
+CURSOR_FIELD = 'cursor'
+
+# 'MAX_PER_PAGE' is the largest page size a user can request
+MAX_PER_PAGE = 100
+
+
+# 'approximate_count' returns an estimate of the number of rows in a queryset.
+# Filtered querysets are counted exactly since there is no cheap estimate.
+def approximate_count(queryset):
+    if queryset.query.where:
+        return queryset.count()
+
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        # Postgres keeps a row estimate for every table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is not None and row[0] >= 0:
+            return int(row[0])
+
+    # Primary keys are only ever incremented, so the largest one is an upper
+    # bound on the row count. It is read from the primary key index.
+    return queryset.model._base_manager.using(queryset.db).aggregate(
+        count=Max('pk'),
+    )['count'] or 0
+
+
+# 'SortedRows' holds rows the database already sorted, and is given to a table
+# as its data. Sorting the table only marks the sorted column in its header.
+class SortedRows(TableListData):
+
+    def order_by(self, aliases):
+        pass
+
+
+# 'sorted_table' returns a table without rows, sorted like the url of the
+# request asks, and the queryset ordering of that sort. The ordering uses the
+# 'order_by' of the sorted columns, like django_tables2 does for querysets.
+def sorted_table(table_class, request, **kwargs):
+    table = table_class(data=SortedRows([]), **kwargs)
+    RequestConfig(request, paginate=False).configure(table)
+    keys = [
+        accessor.for_queryset()
+        for alias in table.order_by or ()
+        for accessor in table.columns[alias.bare].order_by
+    ]
+    return table, keys
+
+
+# 'stable_order' makes sure a queryset's ordering ends in 'id' so rows with
+# equal sort values always come in the same order. Sort columns already end in
+# 'id', and 'id' alone is used when the table is not sorted.
+# 'keys' replace the ordering of the queryset when given.
+# The queryset and its ordering keys are returned.
+def stable_order(queryset, keys=()):
+    keys = list(keys) or list(queryset.query.order_by) or ['id']
+    if keys[-1].lstrip('-') not in ('id', 'pk'):
+        keys.append('-id' if keys[-1].startswith('-') else 'id')
+    return queryset.order_by(*keys), keys
+
+
+# 'encode_cursor' turns the sort order, the sort values of a row and
+# a direction ('next' or 'prev') into a url-safe string
+def encode_cursor(sort, values, direction):
+    # 'DjangoJSONEncoder' drops the microseconds of dates, so the last row
+    # would come after its own cursor
+    values = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in values]
+    data = json.dumps({'s': sort, 'v': values, 'd': direction}, cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+# 'decode_cursor' reverses 'encode_cursor'. 'None' is returned for cursors
+# that cannot be read.
+def decode_cursor(cursor):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return data['s'], data['v'], data['d']
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+# 'get_value' follows a queryset lookup such as 'cid__name' on a model instance
+def get_value(obj, key):
+    for attr in key.lstrip('-').split('__'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+# 'keyset_filter' builds the condition selecting every row that comes after
+# 'values' in the order given by 'keys'. For the keys ('name', 'id') this is:
+#   name > value OR (name = value AND id > value)
+# 'reverse' selects the rows before 'values' instead.
+def keyset_filter(keys, values, reverse=False):
+    condition = Q()
+    equal = {}
+    for key, value in zip(keys, values):
+        descending = key.startswith('-')
+        field = key.lstrip('-')
+        lookup = 'lt' if descending != reverse else 'gt'
+        condition |= Q(**equal, **{field + '__' + lookup: value})
+        equal[field] = value
+    return condition
+
+
+# 'CursorPaginationMixin' is used together with 'SingleTableView'.
+# Depending on 'settings.TABLE_PAGINATION' it either paginates the table with a
+# cursor ('cursor') or falls back to django_tables2's page numbers ('offset').
+# 'settings.TABLE_COUNT' chooses how the total number of rows is shown:
+# 'exact', 'approximate' or None to skip counting entirely.
+class CursorPaginationMixin:
+
+    def get_pagination_mode(self):
+        return getattr(settings, 'TABLE_PAGINATION', 'cursor')
+
+    def get_count_mode(self):
+        return getattr(settings, 'TABLE_COUNT', 'approximate')
+
+    def get_table_pagination(self, table):
+        # Offset mode without an exact count uses a paginator that only checks
+        # whether there is a next page instead of counting every row.
+        if self.get_pagination_mode() == 'offset' and self.get_count_mode() != 'exact':
+            return {'paginator_class': LazyPaginator}
+        return super().get_table_pagination(table)
+
+    def get_table(self, **kwargs):
+        if self.get_pagination_mode() != 'cursor':
+            return super().get_table(**kwargs)
+
+        table_class = self.get_table_class()
+        # Only the sort is read from the table, nothing is queried yet
+        sort_table, keys = sorted_table(table_class, self.request, **kwargs)
+        queryset, keys = stable_order(self.get_table_data(), keys)
+
+        sort = self.request.GET.get(sort_table.prefixed_order_by_field, '')
+        per_page = self.get_per_page(sort_table)
+
+        # Ignore cursors from another sort order, they would skip rows
+        cursor = decode_cursor(self.request.GET.get(CURSOR_FIELD, ''))
+        if cursor is not None and (cursor[0] != sort or not isinstance(cursor[1], list)
+                                   or len(cursor[1]) != len(keys)):
+            cursor = None
+
+        if self.get_count_mode() == 'exact':
+            self.total_count = queryset.count()
+        elif self.get_count_mode() == 'approximate':
+            self.total_count = approximate_count(queryset)
+        else:
+            self.total_count = None
+
+        direction = 'next' if cursor is None else cursor[2]
+        if direction == 'prev':
+            # Walk backwards from the cursor and flip the rows afterwards
+            rows = list(queryset.filter(keyset_filter(keys, cursor[1], reverse=True))
+                        .reverse()[:per_page + 1])
+            has_prev = len(rows) > per_page
+            rows = rows[:per_page][::-1]
+            has_next = True
+        else:
+            if cursor is not None:
+                queryset = queryset.filter(keyset_filter(keys, cursor[1]))
+            rows = list(queryset[:per_page + 1])
+            has_next = len(rows) > per_page
+            rows = rows[:per_page]
+            has_prev = cursor is not None
+
+        self.next_cursor = None
+        self.prev_cursor = None
+        if rows and has_next:
+            self.next_cursor = encode_cursor(sort, [get_value(rows[-1], key) for key in keys], 'next')
+        if rows and has_prev:
+            self.prev_cursor = encode_cursor(sort, [get_value(rows[0], key) for key in keys], 'prev')
+
+        # The table only renders the rows of this page
+        table = table_class(data=SortedRows(rows), **kwargs)
+        RequestConfig(self.request, paginate=False).configure(table)
+        return table
+
+    # 'get_per_page' returns the page size, which can be set with '?per_page='
+    def get_per_page(self, table):
+        per_page = getattr(self, 'paginate_by', None) or table._meta.per_page
+        try:
+            per_page = int(self.request.GET[table.prefixed_per_page_field])
+        except (KeyError, ValueError):
+            pass
+        return max(1, min(per_page, MAX_PER_PAGE))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.get_pagination_mode() == 'cursor':
+            context['next_cursor'] = self.next_cursor
+            context['prev_cursor'] = self.prev_cursor
+            context['total_count'] = self.total_count
+            context['approximate_count'] = self.get_count_mode() == 'approximate'
+        return context
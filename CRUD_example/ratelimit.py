@@ -0,0 +1,176 @@
+# 'ratelimit' limits how often the login and register forms may be posted, see
+# 'settings.RATE_LIMITS'. Each post counts against the client ip and against
+# the email it was made for. A post over a limit is rejected before the form
+# is validated, so it costs no database query and no password hashing, and the
+# client is told when to try again.
+# The limiter is set by 'settings.RATE_LIMITER':
+# - 'MemoryRateLimiter' keeps the posts of each key in the memory of the
+#   process. With several processes, each one allows the full limit.
+# - 'CacheRateLimiter' counts posts in the 'settings.RATE_LIMIT_CACHE' cache,
+#   which every process shares when it is Memcached or Redis.
+# Other limiters only need a 'hit' method like these.
+
+# 'hashlib' turns keys into valid cache keys
+import hashlib
+
+# 'math' is used to round up the seconds to wait
+import math
+
+# 'threading' is used to lock the posts of 'MemoryRateLimiter'
+import threading
+
+# 'time' is used to find the posts within a window
+import time
+
+# 'OrderedDict' remembers the order in which keys were used, and 'deque' holds
+# the times of the posts of a key
+from collections import OrderedDict, deque
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+# 'caches' holds the cache used by 'CacheRateLimiter'
+from django.core.cache import caches
+
+# 'ErrorList' shows the rejection like a form error
+from django.forms.utils import ErrorList
+
+# 'render' is used to show the form again
+from django.shortcuts import render
+
+# 'import_string' loads 'settings.RATE_LIMITER'
+from django.utils.module_loading import import_string
+
+# 'gettext_lazy' is used to translate the rejection
+from django.utils.translation import gettext_lazy as _
+
+# 'mark_rate_limited' counts the rejection in the measurements, see 'instrumentation'
+from CRUD_example.instrumentation import mark_rate_limited
+
+
+# 'MemoryRateLimiter' remembers the time of every post within the window of
+# each key, so the limit holds over any 'seconds' long window. Once it holds
+# 'settings.RATE_LIMIT_KEYS' keys, the least recently used one is removed.
+class MemoryRateLimiter:
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    # 'hit' records a post for 'key' and returns 0, or the seconds to wait if
+    # 'limit' posts were already made in the last 'seconds'
+    def hit(self, key, limit, seconds):
+        size = getattr(settings, 'RATE_LIMIT_KEYS', 100000)
+        now = time.monotonic()
+        with self.lock:
+            hits = self.entries.get(key)
+            if hits is None:
+                hits = self.entries[key] = deque()
+            self.entries.move_to_end(key)
+            while hits and hits[0] <= now - seconds:
+                hits.popleft()
+            if len(hits) >= limit:
+                return hits[0] + seconds - now
+            hits.append(now)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+        return 0
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# 'CacheRateLimiter' counts the posts of each key in fixed windows of
+# 'seconds'. The count of the previous window is weighted by how much of it is
+# still within the last 'seconds', which approximates a sliding window with
+# two cache keys per key.
+class CacheRateLimiter:
+
+    def hit(self, key, limit, seconds):
+        cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+        now = time.time()
+        window = int(now // seconds)
+        # Emails may contain characters that are not valid in cache keys
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        current_key = 'ratelimit:{}:{}:{}'.format(digest, seconds, window)
+        previous_key = 'ratelimit:{}:{}:{}'.format(digest, seconds, window - 1)
+        counts = cache.get_many([current_key, previous_key])
+        remaining = 1 - (now - window * seconds) / seconds
+        if counts.get(previous_key, 0) * remaining + counts.get(current_key, 0) >= limit:
+            # The count falls once the current window ends
+            return remaining * seconds
+        # 'add' and 'incr' are atomic in shared caches
+        cache.add(current_key, 0, 2 * seconds)
+        try:
+            cache.incr(current_key)
+        except ValueError:
+            # The key expired between 'add' and 'incr'
+            cache.set(current_key, 1, 2 * seconds)
+        return 0
+
+
+# 'rate_limiter' is the limiter of this process, created when first used
+rate_limiter = None
+
+
+# 'get_rate_limiter' returns the limiter set by 'settings.RATE_LIMITER'
+def get_rate_limiter():
+    global rate_limiter
+    if rate_limiter is None:
+        rate_limiter = import_string(getattr(settings, 'RATE_LIMITER', 'CRUD_example.ratelimit.MemoryRateLimiter'))()
+    return rate_limiter
+
+
+# 'client_ip' returns the address of the client, read from the request header
+# 'settings.RATE_LIMIT_IP'. Behind a proxy this is the header the proxy sets,
+# of which the last address is the one the proxy saw.
+def client_ip(request):
+    value = request.META.get(getattr(settings, 'RATE_LIMIT_IP', 'REMOTE_ADDR'), '')
+    return value.split(',')[-1].strip()
+
+
+# 'check_rate_limit' records a post of 'request' to the form named 'name' and
+# returns 0, or the seconds to wait if the post is over one of its limits
+def check_rate_limit(name, request):
+    limits = getattr(settings, 'RATE_LIMITS', {}).get(name)
+    if not limits:
+        return 0
+    keys = {
+        'ip': client_ip(request),
+        'email': request.POST.get('email', '').strip().lower(),
+    }
+    limiter = get_rate_limiter()
+    wait = 0
+    for kind, (limit, seconds) in limits.items():
+        if keys.get(kind):
+            wait = max(wait, limiter.hit('{}:{}:{}'.format(name, kind, keys[kind]), limit, seconds))
+    return wait
+
+
+# 'RateLimitMixin' is used with the login and register views. Posts over
+# the limits of 'rate_limit' in 'settings.RATE_LIMITS' get the form back
+# with an error and a 429 status.
+class RateLimitMixin:
+    # The key of the view's limits in 'settings.RATE_LIMITS'
+    rate_limit = None
+
+    def post(self, request, *args, **kwargs):
+        wait = self.check_rate_limit()
+        if wait:
+            return self.rate_limited(wait)
+        return super().post(request, *args, **kwargs)
+
+    def check_rate_limit(self):
+        return check_rate_limit(self.rate_limit, self.request)
+
+    # 'rate_limited' returns the rejection of a post. The posted data is not
+    # validated, only the email is shown again.
+    def rate_limited(self, wait):
+        mark_rate_limited()
+        wait = math.ceil(wait)
+        form = self.form_class(initial={'email': self.request.POST.get('email', '')})
+        error = ErrorList([_('Too many attempts. Please try again in %(seconds)d seconds.') % {'seconds': wait}], error_class='nonfield')
+        response = render(self.request, self.template_name, {'form': form, 'rate_limited': error}, status=429)
+        response['Retry-After'] = str(wait)
+        return response
@@ -0,0 +1,107 @@
+# 'replicas' contains the routing of database queries to read replicas.
+# The table views only read, so their queries can be sent to copies of the
+# database ('settings.DATABASE_REPLICAS') while every write goes to 'default'.
+# Replicas may lag behind the primary, so after a user writes something their
+# reads stay on the primary for 'settings.REPLICA_PIN_SECONDS'. That way a
+# user always sees their own changes on the next page.
+
+# 'random' is used to spread reads over the replicas
+import random
+
+# 'ContextVar' holds the state of the current request
+from contextvars import ContextVar
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+# 'DEFAULT_DB_ALIAS' is the name of the primary database
+from django.db import DEFAULT_DB_ALIAS
+
+
+# 'PIN_COOKIE' is the cookie set after a write to keep reads on the primary
+PIN_COOKIE = 'use_primary'
+
+
+# 'RequestState' remembers whether the current request must read from the
+# primary and whether it wrote to the database
+class RequestState:
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# 'request_state' is the 'RequestState' of the current request, or None
+# outside of requests (management commands for example)
+request_state = ContextVar('request_state', default=None)
+
+
+# 'get_read_database' returns the alias the current request should read from
+def get_read_database():
+    replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+    state = request_state.get()
+    if not replicas or state is None or state.pinned or state.wrote:
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+
+# 'ReplicaRouter' is listed in 'settings.DATABASE_ROUTERS'.
+# Reads are left to Django, which uses 'default' unless a queryset is bound to
+# a replica with 'using'. Objects loaded from a replica would be saved back to
+# it, so every write is sent to the primary here.
+class ReplicaRouter:
+
+    def db_for_write(self, model, **hints):
+        state = request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    # Replicas hold the same data as the primary, so objects loaded from
+    # either may be related to each other
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = [DEFAULT_DB_ALIAS] + list(getattr(settings, 'DATABASE_REPLICAS', []))
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+# 'ReplicaMiddleware' tracks the 'RequestState' of every request and sets
+# 'PIN_COOKIE' when a request writes to the database
+class ReplicaMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request_state.set(RequestState(PIN_COOKIE in request.COOKIES))
+        try:
+            response = self.get_response(request)
+            if request_state.get().wrote:
+                response.set_cookie(
+                    PIN_COOKIE,
+                    '1',
+                    max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                    httponly=True,
+                    samesite='Lax',
+                )
+            return response
+        finally:
+            request_state.reset(token)
+
+
+# 'ReplicaReadMixin' is used together with 'SingleTableView'.
+# It binds the table's queryset to the database chosen by 'get_read_database'.
+# The queryset is bound rather than routed because exports are read after the
+# view has returned.
+class ReplicaReadMixin:
+
+    # 'get_read_database' chooses the database of the request once, so the
+    # cached page and the rows come from the same database
+    def get_read_database(self):
+        if not hasattr(self, 'read_database'):
+            self.read_database = get_read_database()
+        return self.read_database
+
+    def get_table_data(self):
+        return super().get_table_data().using(self.get_read_database())
@@ -0,0 +1,80 @@
+# 'search' contains the name search of the customer and software tables.
+# On SQLite, names are indexed in FTS5 tables (see migration 0004) using the
+# trigram tokenizer, which finds any part of a name with an index lookup
+# instead of reading every row. The FTS5 tables are kept up to date by
+# database triggers, so every way of saving a row updates the index.
+
+# 'connections' gives access to the database a queryset is bound to
+from django.db import connections
+
+# 'Collate' compares names with the NOCASE collation
+from django.db.models.functions import Collate
+
+# 'RawSQL' is used to select the ids of matching rows from the FTS5 table
+from django.db.models.expressions import RawSQL
+
+
+# 'SEARCH_FIELD' is the url parameter holding the search text
+SEARCH_FIELD = 'q'
+
+# 'TRIGRAM_LENGTH' is the shortest text the trigram index can find
+TRIGRAM_LENGTH = 3
+
+
+# 'fts_table' returns the name of the FTS5 table that indexes a model
+def fts_table(model):
+    return model._meta.db_table + '_fts'
+
+
+# 'fts_query' quotes text so FTS5 searches for it as-is
+def fts_query(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+# 'search' returns the objects of a queryset whose name contains 'text'.
+# Text shorter than three characters, and databases other than SQLite, use a
+# regular 'icontains' filter.
+def search(queryset, text):
+    if not text:
+        return queryset
+    if connections[queryset.db].vendor != 'sqlite' or len(text) < TRIGRAM_LENGTH:
+        return queryset.filter(name__icontains=text)
+    table = fts_table(queryset.model)
+    return queryset.filter(id__in=RawSQL(
+        'SELECT rowid FROM {0} WHERE {0} MATCH %s'.format(table),
+        [fts_query(text)],
+    ))
+
+
+# 'prefix_search' returns the objects of a queryset whose name starts with
+# 'text', ignoring case, sorted by name. On SQLite the names are compared with
+# the NOCASE collation, which is indexed (see migration 0008), so the matches
+# are read from a range of the index instead of checking every name.
+def prefix_search(queryset, text):
+    if connections[queryset.db].vendor != 'sqlite':
+        if text:
+            queryset = queryset.filter(name__istartswith=text)
+        return queryset.order_by('name', 'id')
+
+    queryset = queryset.alias(name_nocase=Collate('name', 'NOCASE')).order_by('name_nocase', 'id')
+    if not text:
+        return queryset
+    # NOCASE only ignores the case of ASCII letters, like 'istartswith' on
+    # SQLite. 'istartswith' also removes the few names of the range, such as
+    # the ones after 'a@' up to 'a`' when searching 'a@', that do not match.
+    queryset = queryset.filter(name_nocase__gte=text, name__istartswith=text)
+    if ord(text[-1]) < 0x10ffff:
+        queryset = queryset.filter(name_nocase__lt=text[:-1] + chr(ord(text[-1]) + 1))
+    return queryset
+
+
+# 'SearchMixin' is used together with 'SingleTableView'.
+# It filters the table with the text in '?q='. The text is kept in the url
+# so it stays applied when the table is sorted or paginated.
+class SearchMixin:
+
+    def get_search(self):
+        return self.request.GET.get(SEARCH_FIELD, '').strip()
+
+    def get_table_data(self):
+        return search(super().get_table_data(), self.get_search())
@@ -0,0 +1,51 @@
+# 'sessions' is a session engine keeping sessions in a cache, see
+# 'settings.SESSION_ENGINE'.
+# With the default database engine, every request of a logged in user reads
+# its session from the 'django_session' table. This engine reads sessions from
+# the 'settings.SESSION_CACHE_ALIAS' cache and only uses the database when a
+# session is not cached. Changes are written to the database and the cache
+# together, so sessions survive a cache restart.
+# A session is only written when its data really changed. Django saves a
+# session whenever one of its values is set, even to the value it already had.
+#
+# Every process of the server must use the same cache, such as Memcached or
+# Redis. With the local-memory cache, a process could keep using a session
+# that another process changed or deleted on logout.
+
+# 'cached_db' is Django's cached session engine, which this engine extends
+from django.contrib.sessions.backends import cached_db
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+
+class SessionStore(cached_db.SessionStore):
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # 'saved_state' is the serialized data of the session as it is stored,
+        # or None if it is not known
+        self.saved_state = None
+
+    # 'serialize' returns the data in a form that can be compared
+    def serialize(self, data):
+        return self.serializer().dumps(data)
+
+    def load(self):
+        data = super().load()
+        self.saved_state = self.serialize(data) if data else None
+        return data
+
+    def save(self, must_create=False):
+        if not must_create and self.saved_state is not None and not settings.SESSION_SAVE_EVERY_REQUEST:
+            if self.serialize(self._get_session()) == self.saved_state:
+                # Nothing changed, the stored session is still up to date
+                return
+        super().save(must_create)
+        self.saved_state = self.serialize(self._get_session())
+
+    def delete(self, session_key=None):
+        # 'cycle_key' deletes the previous key of the session
+        if session_key is None or session_key == self.session_key:
+            self.saved_state = None
+        super().delete(session_key)
@@ -42,17 +42,24 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Only used when 'INSTRUMENTATION' is set
+    'CRUD_example.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'CRUD_example.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'CRUD_example.urls'
 
+# The JSON API answers requests failing the CSRF check with JSON, see
+# 'CRUD_example/views.py'.
+CSRF_FAILURE_VIEW = 'CRUD_example.views.csrf_failure'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -79,9 +86,36 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests for this many seconds
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# PRAGMA statements run on every new SQLite connection, see 'CRUD_example/db.py'.
+# Set to {} to use SQLite's defaults.
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+}
+# Journal mode of the SQLite databases, None keeps SQLite's default. It is
+# stored in the database file, so it is set once when 'wsgi.py' or 'asgi.py'
+# starts rather than by every command.
+SQLITE_JOURNAL_MODE = 'WAL'
+
+# Read replicas, see 'CRUD_example/replicas.py'.
+# Every write goes to 'default', which is the primary.
+DATABASE_ROUTERS = ['CRUD_example.replicas.ReplicaRouter']
+# Aliases in 'DATABASES' that the table views read from. To try it locally,
+# add a copy of the database to 'DATABASES':
+#   'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db-replica.sqlite3'}
+# and list 'replica' here.
+DATABASE_REPLICAS = []
+# Seconds a user keeps reading from the primary after writing, so they see
+# their own changes while the replicas catch up.
+REPLICA_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -125,6 +159,150 @@ STATICFILES_DIRS = (
 
 AUTH_USER_MODEL = 'CRUD_example.User'
 
+# 'CachedModelBackend' keeps logged in users in memory, see
+# 'CRUD_example/backends.py'. 'ModelBackend' still loads the users of
+# sessions started before it was added.
+AUTHENTICATION_BACKENDS = [
+    'CRUD_example.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+# Seconds a user is kept in memory, 0 turns the cache off. A change made by
+# another process is seen after at most this long.
+USER_CACHE_TTL = 30
+# Number of users kept in memory by each process.
+USER_CACHE_SIZE = 1024
+
+# Password hashing, see 'CRUD_example/hashers.py'.
+# 'PASSWORD_HASHER_PROFILE' is the hasher of new passwords: 'scrypt', 'pbkdf2'
+# or 'argon2', which needs the 'argon2-cffi' package. Passwords hashed with
+# another profile or cost are hashed again when their user logs in.
+# 'python manage.py benchpasswords' measures the logins per second of each.
+PASSWORD_HASHER_PROFILE = 'scrypt'
+PASSWORD_HASHER_PROFILES = {
+    'scrypt': 'CRUD_example.hashers.ScryptPasswordHasher',
+    'pbkdf2': 'CRUD_example.hashers.PBKDF2PasswordHasher',
+    'argon2': 'CRUD_example.hashers.Argon2PasswordHasher',
+}
+# The first hasher hashes new passwords, the others check older ones. A
+# settings file changing the profile must build this list again.
+PASSWORD_HASHERS = [PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]] + [
+    hasher for profile, hasher in PASSWORD_HASHER_PROFILES.items() if profile != PASSWORD_HASHER_PROFILE
+]
+# scrypt needs 128 * work factor * block size bytes for each password, 16 MiB
+# with these values.
+PASSWORD_SCRYPT_WORK_FACTOR = 2 ** 14
+PASSWORD_SCRYPT_BLOCK_SIZE = 8
+PASSWORD_SCRYPT_PARALLELISM = 1
+# Django's default number of PBKDF2 iterations.
+PASSWORD_PBKDF2_ITERATIONS = 320000
+# Argon2 passes, memory in KiB and lanes.
+PASSWORD_ARGON2_TIME_COST = 2
+PASSWORD_ARGON2_MEMORY_COST = 102400
+PASSWORD_ARGON2_PARALLELISM = 8
+# Threads hashing passwords for the async login and register views, None uses
+# one per core.
+PASSWORD_HASHING_THREADS = None
+
+# Rate limiting of the login and register forms, see 'CRUD_example/ratelimit.py'.
+# 'MemoryRateLimiter' counts the posts of each process, 'CacheRateLimiter'
+# counts them in the 'RATE_LIMIT_CACHE' cache shared by every process.
+RATE_LIMITER = 'CRUD_example.ratelimit.MemoryRateLimiter'
+# For each form, the most posts allowed per client ip and per email, and in
+# how many seconds. Users behind one office or NAT address share the ip
+# limit. Set to {} to turn rate limiting off.
+RATE_LIMITS = {
+    'login': {'ip': (100, 60), 'email': (10, 300)},
+    'register': {'ip': (20, 3600), 'email': (5, 3600)},
+}
+# Request header holding the client ip. Behind a proxy, use the header it
+# sets, such as 'HTTP_X_FORWARDED_FOR'.
+RATE_LIMIT_IP = 'REMOTE_ADDR'
+# Number of ips and emails 'MemoryRateLimiter' keeps.
+RATE_LIMIT_KEYS = 100000
+# Cache used by 'CacheRateLimiter'.
+RATE_LIMIT_CACHE = 'default'
+
+# Caches, see https://docs.djangoproject.com/en/4.0/topics/cache/
+# The local-memory cache is private to each process. Use a shared backend
+# such as Memcached or Redis when running several processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Sessions get their own cache so table pages do not push them out
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+    },
+}
+# Sessions are stored in the database. Use 'CRUD_example.sessions' to read
+# them from the 'SESSION_CACHE_ALIAS' cache instead, see
+# 'CRUD_example/sessions.py'. It needs a cache shared by every process.
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+SESSION_CACHE_ALIAS = 'sessions'
+# Cache holding the rendered table pages, see 'CRUD_example/tablecache.py'.
+TABLE_CACHE = 'default'
+# Seconds a rendered table page is kept.
+TABLE_CACHE_TIMEOUT = 300
+
+# Pagination of the table views.
+# 'cursor' pages through rows with a cursor so deep pages are as fast as the
+# first one. 'offset' uses numbered pages.
+TABLE_PAGINATION = 'cursor'
+# How the total number of rows is shown: 'exact' counts every row,
+# 'approximate' uses a cheap estimate and None does not count at all.
+TABLE_COUNT = 'approximate'
+
+# Number of objects in a page of the JSON API, see 'CRUD_example/api.py'.
+# '?per_page=' can ask for up to 100.
+API_PER_PAGE = 50
+
+# Checking software image urls.
+# Seconds to wait for the image server before giving up.
+IMAGE_PROBE_TIMEOUT = 5
+# Number of redirects to follow before giving up.
+IMAGE_PROBE_MAX_REDIRECTS = 10
+# Number of checked urls to remember, and for how many seconds.
+IMAGE_PROBE_CACHE_SIZE = 1024
+IMAGE_PROBE_CACHE_TTL = 3600
+# Seconds to remember urls whose server could not be reached, timed out or
+# answered with an error, 0 to check them again every time.
+IMAGE_PROBE_FAILURE_TTL = 10
+
+# Serve the table, create, edit, login and register pages with the async views
+# from 'CRUD_example/asyncviews.py'. Only useful when running under 'asgi.py'.
+ASYNC_VIEWS = False
+
+# Check software images and delete customers and software in background jobs,
+# see 'CRUD_example/jobs.py'. The jobs are run by 'python manage.py runjobs'.
+# 'runjobs' is a separate process, so 'TABLE_CACHE' must be a cache shared by
+# every process for the tables to show the changes made by the jobs. The
+# local-memory cache is refused by 'CRUD_example/checks.py'.
+BACKGROUND_JOBS = False
+# Seconds a running job is kept by its 'runjobs' without news before another
+# 'runjobs' takes it over. 'runjobs' renews the lease of its jobs while they
+# run, so this only matters when it was killed or crashed.
+JOB_LEASE_SECONDS = 60
+# Number of times a job is started before it is failed instead of retried.
+JOB_MAX_ATTEMPTS = 3
+
+# Measure the latency, SQL queries, template rendering and image server
+# requests of every url, see 'CRUD_example/instrumentation.py'. The results
+# are shown by 'python manage.py viewstats' and, for staff, at '/instrumentation'.
+INSTRUMENTATION = False
+# Number of requests of each url kept to compute the percentiles.
+INSTRUMENTATION_SAMPLES = 1000
+# Each process saves its samples to this folder, at most every few seconds.
+INSTRUMENTATION_DIR = BASE_DIR / 'instrumentation'
+INSTRUMENTATION_SAVE_SECONDS = 10
+
+# Local copies of software logos are stored here.
+MEDIA_ROOT = BASE_DIR / 'media'
+# Size in pixels of the logo thumbnails shown in the tables.
+LOGO_THUMBNAIL_SIZE = 64
+# Largest logo in bytes that will be downloaded.
+LOGO_MAX_BYTES = 5 * 1024 * 1024
+
 LOGIN_URL = '/login'
 LOGIN_REDIRECT_URL = '/'
 
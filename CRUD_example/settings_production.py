@@ -0,0 +1,29 @@
+"""
+Production settings for CRUD_example project.
+
+Use with DJANGO_SETTINGS_MODULE=CRUD_example.settings_production.
+Every setting not changed here comes from 'settings'.
+"""
+import os
+
+from CRUD_example.settings import *
+
+# The secret key and host names are set by the server's environment
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',')
+
+# Read templates from disk and parse them once per process instead of on
+# every request. 'APP_DIRS' can not be used together with 'loaders'.
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# Compile every template when the server starts, see 'CRUD_example/warmup.py'
+TEMPLATE_WARMUP = True
@@ -0,0 +1,9 @@
+// 'batch.js' makes the checkbox in the header of a table select or clear
+// every row. The row checkboxes belong to the '#batchForm' form.
+document.querySelectorAll('th input[type=checkbox]').forEach(function(all){
+    all.addEventListener('change', function(){
+        document.querySelectorAll('input[form=batchForm]').forEach(function(box){
+            box.checked = all.checked;
+        });
+    });
+});
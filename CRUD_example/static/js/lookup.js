@@ -0,0 +1,74 @@
+// 'lookup.js' fills the dropdown of a 'LookupSelect' widget with the objects
+// matching the text typed in its search box. The last option loads the next
+// page of results when there are more.
+document.querySelectorAll('.lookupSearch').forEach(function(search){
+    var select = document.getElementById(search.dataset.select);
+    var timer = null;
+    // The option chosen before 'Load more results...' was picked
+    var previous = select.value;
+
+    // 'load' loads the first page of results for 'q', or the page after
+    // 'cursor' which is added to the current options
+    function load(q, cursor){
+        var url = search.dataset.lookupUrl + '?q=' + encodeURIComponent(q);
+        if(cursor){
+            url += '&cursor=' + encodeURIComponent(cursor);
+        }
+        fetch(url, {credentials: 'same-origin'}).then(function(response){
+            return response.json();
+        }).then(function(data){
+            var selected = select.querySelector('option[value="' + CSS.escape(previous) + '"]');
+            if(cursor){
+                // Replace the 'Load more results...' option with the results
+                var more = select.querySelector('option[data-cursor]');
+                if(more){
+                    select.removeChild(more);
+                }
+            }else{
+                // Keep the selected option, replace the others with the results
+                select.innerHTML = '';
+                if(selected && selected.value !== ''){
+                    select.appendChild(selected);
+                }
+            }
+            data.results.forEach(function(result){
+                if(selected && String(result.id) === selected.value){
+                    return;
+                }
+                select.appendChild(new Option(result.text, result.id));
+            });
+            if(cursor){
+                select.value = previous;
+            }else{
+                previous = select.value;
+            }
+            if(data.next){
+                var more = new Option('Load more results...', '');
+                more.dataset.cursor = data.next;
+                more.dataset.q = q;
+                select.appendChild(more);
+            }
+        });
+    }
+
+    // Wait until the user stops typing before loading results
+    search.oninput = function(){
+        clearTimeout(timer);
+        timer = setTimeout(function(){
+            load(search.value);
+        }, 250);
+    };
+    search.onfocus = function(){
+        if(select.options.length <= 1){
+            load(search.value);
+        }
+    };
+    select.onchange = function(){
+        var option = select.options[select.selectedIndex];
+        if(option && option.dataset.cursor){
+            load(option.dataset.q, option.dataset.cursor);
+        }else{
+            previous = select.value;
+        }
+    };
+});
@@ -0,0 +1,121 @@
+# 'tablecache' contains the cache of rendered tables.
+# Rendering a table page runs its queries and renders a template for every
+# row. The html of each page is cached instead, under a key made of the table,
+# the url parameters (page, sort, search, page size), the database the rows
+# are read from and a version number for every model the table shows. Saving
+# or deleting an object increments the version of its model, so every cached
+# page that could show it is replaced. A replica may not have received a write
+# when the version changes, so its pages are kept apart from the primary's.
+# Old pages are never looked up again and expire on their own.
+#
+# The cache is 'settings.TABLE_CACHE', an alias in 'settings.CACHES'. The
+# default local-memory cache is not shared between processes, so a server
+# running several processes needs a shared backend such as Memcached or Redis
+# for invalidation to reach all of them.
+
+# 'time' is used to start new version numbers
+import time
+
+# 'hashlib' and 'urlencode' turn the url parameters into a short key
+import hashlib
+from urllib.parse import urlencode
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+# 'DEFAULT_DB_ALIAS' is the database of tables not read from replicas
+from django.db import DEFAULT_DB_ALIAS
+
+# 'caches' gives access to the cache backends
+from django.core.cache import caches
+
+# 'render_to_string' renders the table template to html
+from django.template.loader import render_to_string
+
+# 'mark_safe' marks html read from the cache as safe to output
+from django.utils.safestring import mark_safe
+
+
+# 'get_table_cache' returns the cache backend used for tables
+def get_table_cache():
+    return caches[getattr(settings, 'TABLE_CACHE', 'default')]
+
+
+# 'version_key' returns the cache key holding the version of a model
+def version_key(model):
+    return 'table-version:' + model._meta.label_lower
+
+
+# 'get_versions' returns the versions of a list of models.
+# A missing version, either never set or removed from the cache, starts at the
+# current time so it can not match a version used before.
+def get_versions(models):
+    cache = get_table_cache()
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+# 'invalidate' increments the versions of models after their objects changed.
+# It is called from every place that saves or deletes objects.
+def invalidate(*models):
+    cache = get_table_cache()
+    for model in models:
+        try:
+            cache.incr(version_key(model))
+        except ValueError:
+            # No version yet, so nothing was cached for this model
+            pass
+
+
+# 'TableCacheMixin' is used together with 'SingleTableView'.
+# The template shows 'table_html' in place of the table and its pager. When
+# the page is cached, the view renders the template without building the
+# table, so neither the database nor the row templates are used.
+# 'cache_models' lists every model shown in the table.
+class TableCacheMixin:
+    cache_models = ()
+    # 'table_template_name' renders the table and its pager
+    table_template_name = 'table.html'
+
+    def get_table_cache_key(self):
+        params = urlencode(sorted(self.request.GET.items()))
+        versions = get_versions(self.cache_models)
+        # 'get_read_database' is defined by 'ReplicaReadMixin'
+        get_read_database = getattr(self, 'get_read_database', None)
+        database = get_read_database() if get_read_database else DEFAULT_DB_ALIAS
+        return 'table:{}:{}:{}:{}'.format(
+            type(self).__name__,
+            database,
+            '.'.join(str(version) for version in versions),
+            hashlib.md5(params.encode()).hexdigest(),
+        )
+
+    def get(self, request, *args, **kwargs):
+        self.table_cache_key = self.get_table_cache_key()
+        html = get_table_cache().get(self.table_cache_key)
+        if html is None:
+            return super().get(request, *args, **kwargs)
+        # 'render_to_response' would look up the template names of the
+        # table's model, which needs the queryset
+        return self.response_class(
+            request=request,
+            template=[self.template_name],
+            context={'view': self, 'table_html': mark_safe(html)},
+            using=self.template_engine,
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        html = render_to_string(self.table_template_name, context, self.request)
+        get_table_cache().set(
+            self.table_cache_key,
+            html,
+            getattr(settings, 'TABLE_CACHE_TIMEOUT', 300),
+        )
+        context['table_html'] = html
+        return context
@@ -2,6 +2,9 @@
 # 'tables' contains all of the table types and table columns to be used
 import django_tables2 as tables
 
+# 'ButtonsColumn' and 'LogoColumn' render their cells without templates
+from CRUD_example.columns import ButtonsColumn, LogoColumn
+
 # Import all models to be used in the tables
 from CRUD_example.models import(
     Customer,
@@ -9,16 +12,33 @@ from CRUD_example.models import(
     CustomerSoftware,
 )
 
+# 'select' columns hold a checkbox for each row. The checkboxes belong to the
+# '#batchForm' form on the table pages, which deletes or edits the selected rows.
+def select_column():
+    return tables.CheckBoxColumn(
+        accessor='pk',
+        attrs={'input': {'form': 'batchForm'}},
+        orderable=False,
+        exclude_from_export=True,
+    )
+
+
 # 'CustomerTable' is a 'Table'
 # 'CustomerTable' displays 'Customer' objects as a table
 class CustomerTable(tables.Table):
-    # Define a 'TemplateColumn' to create a column that uses a template for its cell
+    # Sortable columns also sort by 'id' so rows with equal values keep a stable
+    # order. Cursor pagination relies on this to never skip or repeat a row.
+    select = select_column()
+    name = tables.Column(order_by=('name', 'id'))
+    # The number of software of each customer is stored on the customer, see 'counters'
+    software_count = tables.Column(verbose_name='Software', order_by=('software_count', 'id'))
+
+    # Define a 'ButtonsColumn' to create a column of edit and delete buttons
     # 'edit' is a column for editing or deleting each entry
-    edit = tables.TemplateColumn(
-        # 'template_name' defines the template to be displayed in this column
-        template_name = "customers/customerButtons.html",
-        # 'orderable' defines whether this column can be sorted
-        orderable = False,
+    edit = ButtonsColumn(
+        # 'edit_url' and 'delete_url' are the names of the views the buttons open
+        edit_url = 'editcustomer',
+        delete_url = 'delcustomer',
         )
 
     # The 'Meta' class is used to define the data the table will display
@@ -28,34 +48,41 @@ class CustomerTable(tables.Table):
         # 'template_name' is the template to use for the table
         template_name = 'django_tables2/bootstrap.html'
         # 'fields' are the columns to be displayed
-        fields = ('name', 'edit')
+        fields = ('name', 'software_count', 'edit')
+        sequence = ('select', 'name', 'software_count', 'edit')
 
 # 'SoftwareTable' is a 'Table'
 # 'SoftwareTable' displays 'Software' objects as a table
 class SoftwareTable(tables.Table):
+    select = select_column()
+    name = tables.Column(order_by=('name', 'id'))
+    image = tables.Column(order_by=('image', 'id'))
+    customer_count = tables.Column(verbose_name='Customers', order_by=('customer_count', 'id'))
     # An additional column is needed to display the 'Software' object's corresponding logo
-    logo = tables.TemplateColumn(template_name = 'software/softwareLogo.html', orderable = False)
-    edit = tables.TemplateColumn(template_name = 'software/softwareButtons.html', orderable = False)
+    logo = LogoColumn()
+    edit = ButtonsColumn(edit_url = 'editsoftware', delete_url = 'delsoftware')
 
     class Meta:
         model = Software
         template_name = 'django_tables2/bootstrap.html'
-        fields = ('name', 'image')
+        fields = ('name', 'image', 'customer_count')
         # 'sequence' is used to define the order in which columns appear
-        sequence = ('logo', 'name', 'image', 'edit')
+        sequence = ('select', 'logo', 'name', 'image', 'customer_count', 'edit')
 
 class CustomerSoftwareTable(tables.Table):
     # A regular column with an accessor allows for displaying properties of objects
     # In this case, we are displaying ForiegnKey variables
-    customer_ID = tables.Column(accessor='cid.id', verbose_name='Customer ID')
-    customer_Name = tables.Column(accessor='cid.name', verbose_name='Customer Name')
-    software_ID= tables.Column(accessor='sid.id', verbose_name='Software ID')
-    logo = tables.TemplateColumn(template_name = 'customersoftware/softwareLogo.html', orderable = False)
-    software_Name = tables.Column(accessor='sid.name', verbose_name='Software Name')
-    edit = tables.TemplateColumn(template_name = 'customersoftware/customersoftwareButtons.html', orderable = False)
+    select = select_column()
+    customer_ID = tables.Column(accessor='cid.id', verbose_name='Customer ID', order_by=('cid.id', 'id'))
+    customer_Name = tables.Column(accessor='cid.name', verbose_name='Customer Name', order_by=('cid.name', 'id'))
+    software_ID= tables.Column(accessor='sid.id', verbose_name='Software ID', order_by=('sid.id', 'id'))
+    # 'software' is the attribute holding the 'Software' object of each row
+    logo = LogoColumn(software = 'sid')
+    software_Name = tables.Column(accessor='sid.name', verbose_name='Software Name', order_by=('sid.name', 'id'))
+    edit = ButtonsColumn(edit_url = 'editcustomersoftware', delete_url = 'delcustomersoftware')
 
     class Meta:
         model = CustomerSoftware
         template_name = 'django_tables2/bootstrap.html'
         fields = ('customer_ID', 'customer_Name', 'software_ID', 'logo', 'software_Name', 'edit')
-        sequence = ('customer_ID', 'customer_Name', 'software_ID', 'logo', 'software_Name', 'edit')
\ No newline at end of file
+        sequence = ('select', 'customer_ID', 'customer_Name', 'software_ID', 'logo', 'software_Name', 'edit')
\ No newline at end of file
@@ -0,0 +1,1146 @@
+# 'tests' contains the tests of the app, run with 'python manage.py test'.
+# The tests pin the number of queries of the pages and check the behaviour of
+# the modules that are hard to see by clicking through the site.
+
+# 'asyncio' runs the async image checks
+import asyncio
+
+# 'json' reads the exports
+import json
+
+# 'os' and 'tempfile' create the database files of the tests
+import os
+import tempfile
+
+# 'io' holds the uploaded files in memory
+import io
+
+# 're' finds the links in the rendered pages
+import re
+
+# 'mock' is used to read JSON files in small chunks
+from unittest import mock
+
+# 'threading' runs the stub image server next to the tests
+import threading
+
+# 'time' is used to check when cached results expire
+import time
+
+# 'timedelta' moves the leases of jobs
+from datetime import timedelta
+
+# 'http.server' is used to write the stub image server
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 'async_to_sync' calls the ASGI handler from the tests
+from asgiref.sync import async_to_sync
+
+# 'SynchronousOnlyOperation' is raised by queries made on the event loop
+from django.core.exceptions import SynchronousOnlyOperation
+
+# 'connection' is used to read the query plans, 'connections' to add a replica
+from django.db import connection, connections
+
+# 'CaptureQueriesContext' counts the queries of a request
+from django.test.utils import CaptureQueriesContext
+
+# 'call_command' creates the tables of the replica and runs 'recountrelations'
+from django.core.management import call_command
+
+# 'AnonymousUser' is the user of requests that are not logged in
+from django.contrib.auth.models import AnonymousUser
+
+# 'timezone' gives the current time
+from django.utils import timezone
+
+# 'DatabaseWrapper' opens SQLite databases other than the test database
+from django.db.backends.sqlite3.base import DatabaseWrapper
+
+# 'Client' checks CSRF when asked, 'TestCase' runs each test in a transaction
+# that is rolled back afterwards
+from django.test import Client, RequestFactory, TestCase, override_settings
+
+# 'get_table_cache' is cleared so every test renders the tables
+from CRUD_example.tablecache import get_table_cache
+
+# Import the models used in the tests
+from CRUD_example.models import User, Customer, Software, CustomerSoftware, Job
+
+# Import the queue of background jobs
+from CRUD_example.jobs import claim_next, enqueue, renew_leases, run_job
+
+# Import the bulk importers
+from CRUD_example import imports
+
+# 'recount' fixes the relation counters that are wrong
+from CRUD_example.counters import recount
+
+# 'user_cache' holds the users loaded for the requests
+from CRUD_example.backends import user_cache
+
+# 'get_rate_limiter' returns the limiter counting the logins
+from CRUD_example.ratelimit import get_rate_limiter
+
+# Import the password hashers
+from CRUD_example.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+
+# 'ASGIHandler' is the handler of Django, 'StreamingASGIHandler' the one of 'asgi.py'
+from django.core.handlers.asgi import ASGIHandler
+from CRUD_example.handlers import StreamingASGIHandler
+
+# Import the views that are called without the middleware, and the most rows
+# changed at once by the batch views
+from CRUD_example.views import (
+    EditCustomerView,
+    EditSoftwareView,
+    EditCustomerSoftwareView,
+    LookupView,
+    MAX_BATCH_SIZE,
+)
+
+# 'set_journal_mode' switches SQLite databases to WAL
+from CRUD_example.db import set_journal_mode
+
+# 'PIN_COOKIE' keeps the reads of a user on the primary after a write
+from CRUD_example.replicas import PIN_COOKIE
+
+# 'instrumentation' records the measurements of each process
+from CRUD_example import instrumentation
+
+# 'check_table_cache' is the system check of the table cache
+from CRUD_example.checks import check_table_cache
+
+# 'AsyncCustomersView' is the async customers table
+from CRUD_example.asyncviews import AsyncCustomersView
+
+# 'search' filters the tables, 'prefix_search' finds the objects of the lookups
+from CRUD_example.search import prefix_search, search
+
+# Import the image url checks
+from CRUD_example.images import AsyncImageValidator, ImageValidator, ProbeCache, check_image
+
+# 'Image' creates the logos served in the tests
+from PIL import Image
+
+# Import the logo downloads and storage
+from CRUD_example.logos import LogoError, download_logo, store_logo
+
+
+# 'create_objects' creates 'count' customers and software, each customer
+# related to the software with the same number
+def create_objects(count):
+    customers = Customer.objects.bulk_create([Customer(name='Customer {}'.format(i)) for i in range(count)])
+    software = Software.objects.bulk_create([
+        Software(name='Software {}'.format(i), image='https://example.com/{}.png'.format(i)) for i in range(count)
+    ])
+    CustomerSoftware.objects.bulk_create([
+        CustomerSoftware(cid=customer, sid=soft) for customer, soft in zip(customers, software)
+    ])
+    return customers, software
+
+
+# 'PNG' is the content of a 1x1 pixel PNG image
+PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360f8cfc0000003010100c9fe92ef'
+    '0000000049454e44ae426082'
+)
+
+
+# 'StubImageServer' is an HTTP server on a free local port used in place of
+# the image servers. 'routes' maps each path to the status, headers and body
+# of its response, and 'requests' counts the requests made to each path.
+# A 'Content-Length' header set to None is not sent.
+class StubImageServer:
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def respond(self, body):
+                server.requests[self.path] = server.requests.get(self.path, 0) + 1
+                status, headers, content = server.routes.get(self.path, (404, {}, b''))
+                headers = dict(headers)
+                headers.setdefault('Content-Length', str(len(content)))
+                self.send_response(status)
+                for name, value in headers.items():
+                    if value is not None:
+                        self.send_header(name, value)
+                self.end_headers()
+                if body:
+                    self.wfile.write(content)
+
+            def do_HEAD(self):
+                self.respond(False)
+
+            def do_GET(self):
+                self.respond(True)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # 'url' returns the url of a path on the server
+    def url(self, path):
+        return 'http://127.0.0.1:{}{}'.format(self.httpd.server_port, path)
+
+
+# 'ImageValidatorTests' checks the image url checks against 'StubImageServer'
+class ImageValidatorTests(TestCase):
+
+    def setUp(self):
+        self.server = StubImageServer({
+            '/logo.png': (200, {'Content-Type': 'image/png'}, PNG),
+            '/page': (200, {'Content-Type': 'text/html'}, b'<html></html>'),
+            '/moved.png': (301, {'Location': '/logo.png'}, b''),
+            '/gone.png': (410, {}, b''),
+            '/broken.png': (500, {}, b''),
+        })
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__)
+
+    # 'validators' returns a sync and an async validator sharing a cache that
+    # does not keep failures
+    def validators(self):
+        cache = ProbeCache(ttl=3600, failure_ttl=0)
+        return ImageValidator(timeout=5, cache=cache), AsyncImageValidator(timeout=5, cache=cache)
+
+    # 'probe' checks a url with either validator
+    def probe(self, validator, path):
+        if isinstance(validator, AsyncImageValidator):
+            return asyncio.run(validator.probe(self.server.url(path)))
+        return validator.probe(self.server.url(path))
+
+    def test_images_and_redirects(self):
+        for validator in self.validators():
+            probe = self.probe(validator, '/moved.png')
+            self.assertEqual((probe.status, probe.error), (200, None))
+            self.assertTrue(probe.content_type.startswith('image/png'))
+            error, location = check_image(self.server.url('/logo.png'), self.probe(validator, '/logo.png'))
+            self.assertIsNone(error)
+
+    def test_other_content_is_rejected(self):
+        for validator in self.validators():
+            error, location = check_image(self.server.url('/page'), self.probe(validator, '/page'))
+            self.assertIn('not an image', error)
+
+    # Definitive answers are remembered, the url is only requested once
+    def test_definitive_results_are_cached(self):
+        sync, async_ = self.validators()
+        for path in ('/logo.png', '/page', '/gone.png'):
+            self.probe(sync, path)
+            self.probe(sync, path)
+            self.probe(async_, path)
+            self.assertEqual(self.server.requests[path], 1, path)
+
+    # A server error may be gone a moment later, so the url is checked again
+    def test_server_errors_are_not_cached(self):
+        # Each validator gets its own cache, the other one remembers the image
+        for validator in (self.validators()[0], self.validators()[1]):
+            probe = self.probe(validator, '/broken.png')
+            self.assertEqual(probe.status, 500)
+            self.server.routes['/broken.png'] = (200, {'Content-Type': 'image/png'}, PNG)
+            self.assertEqual(self.probe(validator, '/broken.png').status, 200)
+            self.server.routes['/broken.png'] = (500, {}, b'')
+
+    # A server that can not be reached is checked again, and failures are
+    # kept for 'failure_ttl' only
+    def test_connection_errors_are_not_cached_long(self):
+        self.server.__exit__()
+        url = self.server.url('/logo.png')
+        for validator in self.validators():
+            probe = validator.probe(url) if isinstance(validator, ImageValidator) else asyncio.run(validator.probe(url))
+            self.assertIsNotNone(probe.error)
+            self.assertIsNone(validator.cache.get(url))
+        cache = ProbeCache(ttl=3600, failure_ttl=10)
+        ImageValidator(timeout=5, cache=cache).probe(url)
+        expires, probe = cache.entries[url]
+        self.assertLess(expires - time.monotonic(), 11)
+
+
+# 'LogoViewTests' checks the logos served to browsers
+class LogoViewTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(MEDIA_ROOT=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_etag(self):
+        content = io.BytesIO()
+        Image.new('RGB', (4, 4)).save(content, 'PNG')
+        name = store_logo(content.getvalue())
+        response = self.client.get('/logos/' + name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        etag = response['ETag']
+        response.close()
+
+        response = self.client.get('/logos/' + name, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get('/logos/' + name, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+        self.assertEqual(self.client.get('/logos/' + '0' * 64 + '.png').status_code, 404)
+
+
+# 'DownloadLogoTests' checks that logos larger than 'LOGO_MAX_BYTES' are not
+# read whole
+@override_settings(LOGO_MAX_BYTES=1000)
+class DownloadLogoTests(TestCase):
+
+    def setUp(self):
+        self.server = StubImageServer({
+            '/logo.png': (200, {'Content-Type': 'image/png'}, PNG),
+            # Announces a size far beyond what it sends
+            '/announced.png': (200, {'Content-Type': 'image/png', 'Content-Length': str(10 ** 12)}, PNG),
+            # Does not announce its size
+            '/unannounced.png': (200, {'Content-Type': 'image/png', 'Content-Length': None}, bytes(10 ** 6)),
+            '/broken.png': (500, {}, b''),
+        })
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__)
+
+    def test_download(self):
+        self.assertEqual(download_logo(self.server.url('/logo.png')), PNG)
+
+    def test_too_large(self):
+        for path in ('/announced.png', '/unannounced.png'):
+            with self.assertRaisesMessage(LogoError, 'too large'):
+                download_logo(self.server.url(path))
+
+    def test_errors(self):
+        for url in (self.server.url('/broken.png'), self.server.url('/missing.png'), 'file:///etc/passwd'):
+            with self.assertRaisesMessage(LogoError, 'could not be downloaded'):
+                download_logo(url)
+
+
+# 'LoggedInTestCase' is the base of the tests of pages that need a user
+class LoggedInTestCase(TestCase):
+
+    def setUp(self):
+        get_table_cache().clear()
+        self.user = User.objects.create_user(email='tester@example.com', password='password123')
+        self.client.force_login(self.user)
+
+
+# 'CursorPaginationTests' checks the pages of the tables in cursor mode
+class CursorPaginationTests(LoggedInTestCase):
+
+    # 'names' returns the customer names shown in a table page
+    def names(self, response):
+        return re.findall(r'<td >(Customer \d+)</td>', response.content.decode())
+
+    # Following the 'Next' links of a sorted table shows every row once, in
+    # the order of the sort
+    def test_next_pages_show_every_row_once(self):
+        create_objects(23)
+        url = '/customers/?sort=-name&per_page=5'
+        shown = []
+        while url:
+            response = self.client.get(url)
+            shown += self.names(response)
+            match = re.search(r'<li class="next"><a href="([^"]+)"', response.content.decode())
+            url = '/customers/' + match.group(1).replace('&amp;', '&') if match else None
+        self.assertEqual(shown, sorted(('Customer {}'.format(i) for i in range(23)), reverse=True))
+
+
+# 'CustomerSoftwareViewTests' checks the relations table
+class CustomerSoftwareViewTests(LoggedInTestCase):
+
+    # The customer and software of every row are joined in the query of the
+    # rows, so the number of queries does not grow with the rows shown
+    def test_queries_do_not_depend_on_rows(self):
+        counts = []
+        for rows in (5, 50):
+            Customer.objects.all().delete()
+            Software.objects.all().delete()
+            create_objects(rows)
+            get_table_cache().clear()
+            user_cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/customersoftware/')
+            self.assertContains(response, 'Customer 4')
+            self.assertContains(response, 'Software 4')
+            counts.append(len(queries))
+        # The session, the user, the estimated row count and the rows
+        self.assertEqual(counts, [4, 4])
+
+    # A relation that already exists is shown as a form error
+    def test_duplicate_relation(self):
+        customers, software = create_objects(2)
+        relations = list(CustomerSoftware.objects.order_by('id'))
+        pair = {'customer': customers[0].id, 'software': software[0].id}
+        for url, data, error in (
+            ('/customersoftware/create', pair, 'This relation already exists.'),
+            ('/customersoftware/edit/{}'.format(relations[1].id), pair, 'This relation already exists.'),
+            (
+                '/customersoftware/batch/edit',
+                dict(pair, select=[relation.id for relation in relations], apply='1'),
+                'Some of these relations already exist.',
+            ),
+        ):
+            response = self.client.post(url, data)
+            self.assertContains(response, error)
+        self.assertEqual(
+            list(CustomerSoftware.objects.order_by('id').values_list('cid', 'sid')),
+            [(customers[0].id, software[0].id), (customers[1].id, software[1].id)],
+        )
+
+
+# 'ExportTests' checks the exports of the tables
+class ExportTests(LoggedInTestCase):
+
+    # 'asgi_get' requests 'path' from an ASGI handler and returns the status
+    # and body of the response
+    def asgi_get(self, handler, path, query):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'cookie', 'sessionid={}'.format(self.client.cookies['sessionid'].value).encode()),
+            ],
+            'client': ('127.0.0.1', 1234),
+            'server': ('testserver', 80),
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        async_to_sync(handler)(scope, receive, send)
+        return messages[0]['status'], b''.join(message.get('body', b'') for message in messages[1:])
+
+    def test_csv(self):
+        create_objects(3)
+        response = self.client.get('/customers/?export=csv&sort=-name')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], ['Customer 2', 'Customer 1', 'Customer 0'])
+
+    # Under ASGI the rows are read off the event loop, where Django's handler
+    # fails to read them
+    def test_asgi(self):
+        create_objects(600)
+        status, body = self.asgi_get(StreamingASGIHandler(), '/customers/', 'export=json&sort=name')
+        self.assertEqual(status, 200)
+        self.assertEqual(len(json.loads(body)), 600)
+        with self.assertRaises(SynchronousOnlyOperation):
+            self.asgi_get(ASGIHandler(), '/customers/', 'export=json')
+
+
+# 'SQLiteSettingsTests' checks the tuning of new SQLite connections
+class SQLiteSettingsTests(TestCase):
+
+    # New connections get the PRAGMA statements but keep the journal mode of
+    # the file, which is only changed when the server starts
+    def test_journal_mode(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = DatabaseWrapper(dict(connection.settings_dict, NAME=os.path.join(directory, 'db.sqlite3')))
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertEqual(cursor.fetchone()[0], 5000)
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'delete')
+                set_journal_mode(wrapper)
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+            finally:
+                wrapper.close()
+
+
+# 'ReplicaTests' checks that the tables read from a replica while writes go
+# to the primary. The replica is a separate database holding other rows, so
+# the rows shown tell which database was read. It is added once the test
+# database is set up, and its rows are not rolled back.
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaTests(LoggedInTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = dict(
+            connections.settings['default'],
+            NAME=os.path.join(cls.directory.name, 'replica.sqlite3'),
+        )
+        call_command('migrate', database='replica', verbosity=0)
+        Customer.objects.using('replica').create(name='Replica customer')
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        Customer.objects.using('default').create(name='Primary customer')
+
+    def test_reads_and_writes(self):
+        response = self.client.get('/customers/')
+        self.assertContains(response, 'Replica customer')
+        self.assertNotContains(response, 'Primary customer')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        # The new customer is saved to the primary
+        response = self.client.post('/customers/create', {'name': 'New customer'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Customer.objects.using('default').filter(name='New customer').exists())
+        self.assertFalse(Customer.objects.using('replica').filter(name='New customer').exists())
+
+        # The next page is read from the primary, so the user sees the new customer
+        self.assertIn(PIN_COOKIE, response.cookies)
+        response = self.client.get('/customers/')
+        self.assertContains(response, 'Primary customer')
+        self.assertContains(response, 'New customer')
+
+        # Once the cookie expires, pages are read from the replica again
+        del self.client.cookies[PIN_COOKIE]
+        response = self.client.get('/customers/')
+        self.assertContains(response, 'Replica customer')
+
+    # A page read from the replica, which has not received the write yet, is
+    # not shown to the writer reading from the primary
+    def test_cached_pages_of_the_replica(self):
+        self.client.post('/customers/create', {'name': 'New customer'})
+        other = Client()
+        other.force_login(User.objects.create_user(email='other@example.com', password='password123'))
+        response = other.get('/customers/')
+        self.assertNotContains(response, 'New customer')
+        response = self.client.get('/customers/')
+        self.assertContains(response, 'New customer')
+
+
+# 'AsyncViewTests' checks that the async views are awaited by Django
+class AsyncViewTests(LoggedInTestCase):
+
+    def test_customers(self):
+        view = AsyncCustomersView.as_view()
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        self.assertIs(view.view_class, AsyncCustomersView)
+        create_objects(3)
+
+        request = RequestFactory().get('/customers/')
+        request.user = self.user
+        response = async_to_sync(view)(request)
+        self.assertContains(response.render(), 'Customer 2')
+
+        # Users who are not logged in are sent to the login page
+        request.user = AnonymousUser()
+        response = async_to_sync(view)(request)
+        self.assertEqual(response.status_code, 302)
+
+
+# 'BatchViewTests' checks the changes of the rows selected in the tables
+class BatchViewTests(LoggedInTestCase):
+
+    def test_delete(self):
+        customers, software = create_objects(3)
+        response = self.client.post('/customers/batch/delete', {'select': [customers[0].id, customers[1].id]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(Customer.objects.values_list('name', flat=True)), ['Customer 2'])
+
+    # A batch larger than 'MAX_BATCH_SIZE' is rejected, not cut short
+    def test_too_many_rows(self):
+        customers, software = create_objects(MAX_BATCH_SIZE + 1)
+        ids = [customer.id for customer in customers]
+        for url, data in (
+            ('/customers/batch/delete', {'select': ids}),
+            ('/customers/batch/edit', {'select': ids, 'apply': '1', 'name': 'Renamed'}),
+        ):
+            response = self.client.post(url, data, follow=True)
+            self.assertContains(response, 'Select at most {} rows at once.'.format(MAX_BATCH_SIZE))
+        self.assertEqual(Customer.objects.count(), MAX_BATCH_SIZE + 1)
+        self.assertFalse(Customer.objects.filter(name='Renamed').exists())
+
+
+# 'UserCacheTests' checks that changes of a user reach the next request
+class UserCacheTests(LoggedInTestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        super().setUp()
+
+    # 'assertLoggedIn' requests a table and checks whether the user may see it
+    def assertLoggedIn(self, logged_in):
+        response = self.client.get('/customers/')
+        self.assertEqual(response.status_code, 200 if logged_in else 302)
+
+    def test_cached_user(self):
+        self.assertLoggedIn(True)
+        self.assertIsNotNone(user_cache.get(self.user.id))
+        # The session and the table, the user comes from the cache
+        with self.assertNumQueries(2):
+            self.assertLoggedIn(True)
+
+    # Changing the password ends the sessions of the user
+    def test_password_change(self):
+        self.assertLoggedIn(True)
+        user = User.objects.get(id=self.user.id)
+        user.set_password('newpassword123')
+        user.save()
+        self.assertIsNone(user_cache.get(self.user.id))
+        self.assertLoggedIn(False)
+
+    def test_deactivation(self):
+        self.assertLoggedIn(True)
+        user = User.objects.get(id=self.user.id)
+        user.is_active = False
+        user.save()
+        self.assertIsNone(user_cache.get(self.user.id))
+        self.assertLoggedIn(False)
+
+
+# 'SearchTests' checks the name search of the tables
+class SearchTests(TestCase):
+
+    def setUp(self):
+        for name in ('Acme Corporation', 'Globex', 'ACME Labs'):
+            Customer.objects.create(name=name)
+
+    # 'names' returns the names found for 'text', and whether the FTS5 index
+    # was used to find them
+    def names(self, text):
+        queryset = search(Customer.objects.order_by('name'), text)
+        return list(queryset.values_list('name', flat=True)), '_fts' in str(queryset.query)
+
+    def test_match(self):
+        self.assertEqual(self.names('cme'), (['ACME Labs', 'Acme Corporation'], True))
+        self.assertEqual(self.names('corp'), (['Acme Corporation'], True))
+        # Quotes are searched as text, not read as FTS5 syntax
+        self.assertEqual(self.names('"ex'), ([], True))
+
+    # Text shorter than a trigram is searched without the index
+    def test_short_text(self):
+        self.assertEqual(self.names('lo'), (['Globex'], False))
+        self.assertEqual(self.names('AC'), (['ACME Labs', 'Acme Corporation'], False))
+
+    # The triggers keep the index up to date with every way of saving a row
+    def test_changes(self):
+        customer = Customer.objects.get(name='Globex')
+        customer.name = 'Initech'
+        customer.save()
+        self.assertEqual(self.names('globex'), ([], True))
+        self.assertEqual(self.names('itech'), (['Initech'], True))
+        Customer.objects.filter(name='Initech').update(name='Umbrella')
+        self.assertEqual(self.names('itech'), ([], True))
+        self.assertEqual(self.names('brell'), (['Umbrella'], True))
+        Customer.objects.filter(name__startswith='A').delete()
+        self.assertEqual(self.names('cme'), ([], True))
+        Customer.objects.bulk_create([Customer(name='Acme Again')])
+        self.assertEqual(self.names('cme'), (['Acme Again'], True))
+
+
+# 'PasswordHasherTests' checks that passwords hashed another way are hashed
+# again with the current hasher and costs when their user logs in
+class PasswordHasherTests(TestCase):
+
+    def test_rehash_on_login(self):
+        old_hashes = (
+            PBKDF2PasswordHasher().encode('password123', 'salt', iterations=1000),
+            ScryptPasswordHasher().encode('password123', 'salt', n=2 ** 10),
+        )
+        for password in old_hashes:
+            user = User.objects.create(email='tester@example.com', password=password)
+            response = self.client.post('/login/', {'email': 'tester@example.com', 'password': 'password123'})
+            self.assertEqual(response.status_code, 302)
+            user.refresh_from_db()
+            self.assertTrue(user.password.startswith('scrypt$16384$'))
+            self.assertTrue(user.check_password('password123'))
+            self.client.logout()
+            user.delete()
+
+
+# 'RateLimitTests' checks that logins over the limit are rejected before the
+# database is used or the password is hashed
+@override_settings(RATE_LIMITER='CRUD_example.ratelimit.MemoryRateLimiter', RATE_LIMITS={'login': {'email': (2, 300)}})
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(email='tester@example.com', password='password123')
+        get_rate_limiter().clear()
+        self.addCleanup(get_rate_limiter().clear)
+
+    def test_login(self):
+        data = {'email': 'tester@example.com', 'password': 'wrongpassword'}
+        for attempt in range(2):
+            self.assertEqual(self.client.post('/login/', data).status_code, 200)
+        with mock.patch.object(ScryptPasswordHasher, 'verify') as verify, self.assertNumQueries(0):
+            response = self.client.post('/login/', data)
+        self.assertEqual(response.status_code, 429)
+        self.assertContains(response, 'Too many attempts', status_code=429)
+        self.assertIn('Retry-After', response)
+        verify.assert_not_called()
+
+
+# 'CounterTests' checks that the relation counters follow every change of the
+# relations, so 'recountrelations' has nothing to fix
+class CounterTests(LoggedInTestCase):
+
+    # 'counts' returns the software count of each customer and the customer
+    # count of each software
+    def counts(self):
+        return (
+            list(Customer.objects.order_by('id').values_list('software_count', flat=True)),
+            list(Software.objects.order_by('id').values_list('customer_count', flat=True)),
+        )
+
+    # 'relation' returns the relation between a customer and a software
+    def relation(self, customer, software):
+        return CustomerSoftware.objects.get(cid=customer, sid=software)
+
+    def test_counters(self):
+        c = [Customer.objects.create(name='Customer {}'.format(i)) for i in range(3)]
+        s = [Software.objects.create(name='Software {}'.format(i), image='https://example.com/{}.png'.format(i)) for i in range(3)]
+
+        for customer, software in ((c[0], s[0]), (c[0], s[1]), (c[1], s[1])):
+            self.client.post('/customersoftware/create', {'customer': customer.id, 'software': software.id})
+        self.assertEqual(self.counts(), ([2, 1, 0], [1, 2, 0]))
+
+        # Move a relation to another software
+        self.client.post('/customersoftware/edit/{}'.format(self.relation(c[1], s[1]).id), {'customer': c[1].id, 'software': s[2].id})
+        self.assertEqual(self.counts(), ([2, 1, 0], [1, 1, 1]))
+
+        # Move two relations to another customer
+        ids = [self.relation(c[0], s[0]).id, self.relation(c[0], s[1]).id]
+        self.client.post('/customersoftware/batch/edit', {'select': ids, 'apply': '1', 'customer': c[2].id})
+        self.assertEqual(self.counts(), ([0, 1, 2], [1, 1, 1]))
+
+        # Deleting a software deletes its relations
+        self.client.get('/software/delete/{}'.format(s[1].id))
+        self.assertEqual(self.counts(), ([0, 1, 1], [1, 1]))
+
+        rows = imports.read_rows(io.BytesIO('customer,software\n{},{}\n{},{}\n'.format(
+            c[0].id, s[0].id, c[0].id, s[2].id,
+        ).encode()), 'csv')
+        self.assertEqual(imports.CustomerSoftwareImporter().run(rows).created, 2)
+        self.assertEqual(self.counts(), ([2, 1, 1], [2, 2]))
+
+        self.assertEqual(recount(), {Customer: 0, Software: 0})
+        output = io.StringIO()
+        call_command('recountrelations', stdout=output)
+        self.assertEqual(output.getvalue(), 'Fixed 0 customers and 0 software.\n')
+
+
+# 'JobLeaseTests' checks that jobs lost by a stopped 'runjobs' are run again
+@override_settings(JOB_LEASE_SECONDS=60, JOB_MAX_ATTEMPTS=2)
+class JobLeaseTests(TestCase):
+
+    def setUp(self):
+        customers, software = create_objects(1)
+        self.job = enqueue('delete_objects', Customer, ids=[customers[0].id])
+
+    # 'expire' ends the lease of the job
+    def expire(self):
+        Job.objects.filter(id=self.job.id).update(lease_until=timezone.now() - timedelta(seconds=1))
+
+    def test_lost_jobs_are_claimed_again(self):
+        self.assertEqual(claim_next(), self.job.id)
+        job = Job.objects.get(id=self.job.id)
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 1))
+        self.assertGreater(job.lease_until, timezone.now() + timedelta(seconds=50))
+
+        # The job is not claimed again while its lease lasts
+        self.assertIsNone(claim_next())
+        renew_leases([self.job.id])
+        self.assertIsNone(claim_next())
+
+        self.expire()
+        self.assertEqual(claim_next(), self.job.id)
+        self.assertEqual(Job.objects.get(id=self.job.id).attempts, 2)
+
+        # After 'JOB_MAX_ATTEMPTS' the job fails instead
+        self.expire()
+        self.assertIsNone(claim_next())
+        job = Job.objects.get(id=self.job.id)
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.message, 'Stopped before finishing too many times.')
+
+    def test_finished_jobs_are_not_claimed_again(self):
+        self.assertEqual(claim_next(), self.job.id)
+        self.assertEqual(run_job(self.job.id), Job.DONE)
+        self.expire()
+        self.assertIsNone(claim_next())
+        self.assertEqual(Customer.objects.count(), 0)
+
+
+# 'BackgroundImageTests' checks the software saved while 'BACKGROUND_JOBS'
+# is set, whose images are checked by a job
+@override_settings(BACKGROUND_JOBS=True)
+class BackgroundImageTests(LoggedInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.server = StubImageServer({
+            '/logo.png': (200, {'Content-Type': 'image/png'}, PNG),
+            '/missing.png': (404, {'Content-Type': 'text/html'}, b'Not found'),
+        })
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__)
+
+    # 'run_jobs' runs the queued jobs like 'runjobs' does
+    def run_jobs(self):
+        while True:
+            id = claim_next()
+            if id is None:
+                return
+            run_job(id)
+
+    def test_images_are_only_shown_once_checked(self):
+        for name, path in (('Valid', '/logo.png'), ('Invalid', '/missing.png')):
+            self.client.post('/software/create', {'name': name, 'image': self.server.url(path)})
+        self.assertEqual(Software.objects.filter(image_status=Software.IMAGE_PENDING).count(), 2)
+        response = self.client.get('/software/')
+        self.assertContains(response, 'Checking image', count=2)
+        self.assertNotContains(response, 'src="' + self.server.url('/missing.png'))
+
+        with mock.patch('CRUD_example.jobs.ingest_logo', return_value='logo.png'):
+            self.run_jobs()
+        self.assertEqual(Software.objects.get(name='Valid').image_status, Software.IMAGE_CHECKED)
+        self.assertEqual(Software.objects.get(name='Invalid').image_status, Software.IMAGE_INVALID)
+        self.assertEqual(Job.objects.filter(status=Job.FAILED).count(), 1)
+        response = self.client.get('/software/')
+        self.assertContains(response, 'Invalid image', count=1)
+        self.assertNotContains(response, 'Checking image')
+        self.assertNotContains(response, 'src="' + self.server.url('/missing.png'))
+
+    def test_batch_edited_images_are_checked(self):
+        customers, software = create_objects(2)
+        ids = [item.id for item in software]
+        self.client.post('/software/batch/edit', {'select': ids, 'apply': '1', 'image': self.server.url('/missing.png')})
+        self.assertEqual(Software.objects.filter(image_status=Software.IMAGE_PENDING).count(), 2)
+        self.run_jobs()
+        self.assertEqual(Software.objects.filter(image_status=Software.IMAGE_INVALID).count(), 2)
+
+        # Without 'BACKGROUND_JOBS' the image is checked before it is saved
+        with override_settings(BACKGROUND_JOBS=False), mock.patch('CRUD_example.forms.ingest_logo', return_value='logo.png'):
+            self.client.post('/software/batch/edit', {'select': ids, 'apply': '1', 'image': self.server.url('/logo.png')})
+        self.assertEqual(Software.objects.filter(image_status=Software.IMAGE_CHECKED).count(), 2)
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), 0)
+
+    def test_imported_images_are_checked(self):
+        rows = imports.read_rows(io.BytesIO('name,image\nFirst,{}\nSecond,{}\n'.format(
+            self.server.url('/missing.png'), self.server.url('/missing.png'),
+        ).encode()), 'csv')
+        result = imports.SoftwareImporter().run(rows)
+        self.assertEqual(result.created, 2)
+        self.assertEqual(Job.objects.count(), 1)
+        self.run_jobs()
+        self.assertEqual(Software.objects.filter(image_status=Software.IMAGE_INVALID).count(), 2)
+
+
+# 'TableCacheCheckTests' checks that the jobs need a shared table cache
+class TableCacheCheckTests(TestCase):
+
+    def test_check(self):
+        self.assertEqual(check_table_cache(None), [])
+        with override_settings(BACKGROUND_JOBS=True):
+            self.assertEqual([error.id for error in check_table_cache(None)], ['CRUD_example.E001'])
+        with override_settings(BACKGROUND_JOBS=True, TABLE_CACHE='shared', CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        }):
+            self.assertEqual(check_table_cache(None), [])
+
+
+# 'InstrumentationTests' checks the samples saved by the processes
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        override = override_settings(INSTRUMENTATION_DIR=self.directory, INSTRUMENTATION_SAVE_SECONDS=10)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    # 'write' saves samples as if they came from the process 'pid', 'age'
+    # seconds ago
+    def write(self, pid, age):
+        path = os.path.join(self.directory, '{}.json'.format(pid))
+        with open(path, 'w') as file:
+            json.dump({'customers': {'count': 1, 'samples': {}}}, file)
+        saved = time.time() - age
+        os.utime(path, (saved, saved))
+        return path
+
+    def test_files_of_stopped_processes_are_removed(self):
+        recent = self.write(1000001, 5)
+        stale = self.write(1000002, 10 * instrumentation.STALE_SAVES + 5)
+        snapshots = instrumentation.load_snapshots()
+        self.assertEqual(sum(1 for snapshot in snapshots if 'customers' in snapshot), 1)
+        self.assertTrue(os.path.exists(recent))
+        self.assertFalse(os.path.exists(stale))
+
+
+# 'ApiTests' checks the JSON API
+class ApiTests(LoggedInTestCase):
+
+    def test_list_and_cursor(self):
+        create_objects(5)
+        url = '/api/customers/?ordering=-name&per_page=2'
+        names = []
+        while url:
+            data = self.client.get(url).json()
+            names += [row['name'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(names, ['Customer {}'.format(i) for i in range(4, -1, -1)])
+
+        response = self.client.get('/api/customers/', {'cursor': 'not a cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_fields(self):
+        customers, software = create_objects(1)
+        response = self.client.get('/api/software/{}'.format(software[0].id), {'fields': 'name,id'})
+        self.assertEqual(response.json(), {'id': software[0].id, 'name': 'Software 0'})
+        response = self.client.get('/api/software/', {'fields': 'name,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['detail'])
+
+    # The ETag is a hash of the body, so it changes with any change of the
+    # data, even one made by another process
+    def test_not_modified(self):
+        customers, software = create_objects(2)
+        response = self.client.get('/api/customers/')
+        etag = response['ETag']
+        response = self.client.get('/api/customers/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        # A change that does not go through the forms, like 'runjobs' makes
+        Customer.objects.filter(id=customers[0].id).update(name='Changed')
+        response = self.client.get('/api/customers/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Changed')
+
+    def test_validation(self):
+        response = self.client.post('/api/customers/', {'name': 'ab'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.json()['errors'])
+        response = self.client.post('/api/customers/', 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/customers/', {'name': 'Created'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        id = response.json()['id']
+        response = self.client.patch('/api/customers/{}'.format(id), {'name': ''}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch('/api/customers/{}'.format(id), {'name': 'Renamed'}, content_type='application/json')
+        self.assertEqual(response.json()['name'], 'Renamed')
+
+    def test_authentication_and_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.get('/api/customers/')
+        self.assertEqual(response.status_code, 401)
+
+        client.force_login(self.user)
+        response = client.get('/api/customers/')
+        token = response.cookies['csrftoken'].value
+        response = client.post('/api/customers/', {'name': 'Created'}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('X-CSRFToken', response.json()['detail'])
+
+        response = client.post(
+            '/api/customers/', {'name': 'Created'}, content_type='application/json', HTTP_X_CSRFTOKEN=token,
+        )
+        self.assertEqual(response.status_code, 201)
+
+        # The pages still get Django's page
+        response = client.post('/customers/create', {'name': 'Created'})
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+
+# 'LookupViewTests' checks the search of the relation form dropdowns
+class LookupViewTests(LoggedInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Customer.objects.bulk_create([
+            Customer(name=name) for name in ('alpha', 'Alpha 2', 'ALPS', 'a[b', 'beta', 'Älpha')
+        ])
+
+    # 'lookup' returns the names found for 'q' and whether there are more
+    def lookup(self, q, per_page=20):
+        with mock.patch.object(LookupView, 'per_page', per_page):
+            data = self.client.get('/customers/lookup', {'q': q}).json()
+        return [result['text'] for result in data['results']], data['more']
+
+    # 'pages' returns the names of every page found for 'q'
+    def pages(self, q, per_page):
+        pages = []
+        params = {'q': q}
+        with mock.patch.object(LookupView, 'per_page', per_page):
+            while True:
+                data = self.client.get('/customers/lookup', params).json()
+                pages.append([result['text'] for result in data['results']])
+                if data['next'] is None:
+                    return pages
+                params['cursor'] = data['next']
+
+    # Names are found by their start whatever the case of ASCII letters,
+    # sorted without case
+    def test_prefix(self):
+        self.assertEqual(self.lookup('alp'), (['alpha', 'Alpha 2', 'ALPS'], False))
+        self.assertEqual(self.lookup('ALPHA'), (['alpha', 'Alpha 2'], False))
+        self.assertEqual(self.lookup('a@'), ([], False))
+        self.assertEqual(self.lookup('a['), (['a[b'], False))
+        self.assertEqual(self.lookup('Ä'), (['Älpha'], False))
+        self.assertEqual(self.lookup('a', per_page=2), (['a[b', 'alpha'], True))
+        self.assertEqual(self.lookup('', per_page=5)[1], True)
+
+    # The cursor continues after the last name, names differing only by case
+    # are told apart by their id
+    def test_pages(self):
+        Customer.objects.create(name='ALPHA')
+        self.assertEqual(self.pages('alp', per_page=2), [['alpha', 'ALPHA'], ['Alpha 2', 'ALPS']])
+        self.assertEqual(self.pages('', per_page=4), [['a[b', 'alpha', 'ALPHA', 'Alpha 2'], ['ALPS', 'beta', 'Älpha']])
+        # A cursor of another search is ignored
+        with mock.patch.object(LookupView, 'per_page', 1):
+            cursor = self.client.get('/customers/lookup', {'q': 'alp'}).json()['next']
+            data = self.client.get('/customers/lookup', {'q': 'b', 'cursor': cursor}).json()
+        self.assertEqual([result['text'] for result in data['results']], ['beta'])
+
+    # The names are read from a range of the NOCASE index
+    def test_index(self):
+        queryset = prefix_search(Customer.objects.all(), 'alp').values_list('id', 'name')
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING COVERING INDEX CRUD_example_customer_name_nocase (name>? AND name<?)', plan)
+
+
+# 'EditViewTests' checks that the edit pages load the edited object once.
+# The views are called without the middleware, so the session and the user
+# are not queried.
+class EditViewTests(TestCase):
+
+    def setUp(self):
+        get_table_cache().clear()
+        self.customers, self.software = create_objects(3)
+        self.relation = CustomerSoftware.objects.order_by('id').first()
+        self.user = User.objects.create_user(email='tester@example.com', password='password123')
+        self.factory = RequestFactory()
+
+    # 'call' runs a view with a request from the logged in user
+    def call(self, view, method, id, data=None):
+        request = getattr(self.factory, method)('/', data or {})
+        request.user = self.user
+        response = view.as_view()(request, id=id)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def test_edit_customer(self):
+        customer = self.customers[0]
+        # The customer
+        with self.assertNumQueries(1):
+            self.assertContains(self.call(EditCustomerView, 'get', customer.id), customer.name)
+        # The customer and its update
+        with self.assertNumQueries(2):
+            self.assertEqual(self.call(EditCustomerView, 'post', customer.id, {'name': 'Renamed'}).status_code, 302)
+        self.assertEqual(Customer.objects.get(id=customer.id).name, 'Renamed')
+
+    # The image did not change, so it is not downloaded again
+    def test_edit_software(self):
+        software = self.software[0]
+        with StubImageServer({'/logo.png': (200, {'Content-Type': 'image/png'}, PNG)}) as server:
+            image = server.url('/logo.png')
+            Software.objects.filter(id=software.id).update(image=image, logo='logo.png')
+            with self.assertNumQueries(1):
+                self.assertContains(self.call(EditSoftwareView, 'get', software.id), software.name)
+            with self.assertNumQueries(2):
+                response = self.call(EditSoftwareView, 'post', software.id, {'name': 'Renamed', 'image': image})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Software.objects.get(id=software.id).name, 'Renamed')
+
+    def test_edit_relation(self):
+        # The relation, and the customer and software shown in the dropdowns
+        with self.assertNumQueries(3):
+            self.call(EditCustomerSoftwareView, 'get', self.relation.id)
+        # The relation, the chosen customer and software, then in one
+        # transaction the relation to move and its update, and the counters
+        # of the old and new customer and software. The transaction is a
+        # savepoint in tests, which counts as two queries.
+        with self.assertNumQueries(11):
+            response = self.call(EditCustomerSoftwareView, 'post', self.relation.id, {
+                'customer': self.customers[1].id,
+                'software': self.software[2].id,
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CustomerSoftware.objects.filter(cid=self.customers[1], sid=self.software[2]).count(), 1)
+
+    def test_missing_object(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.call(EditCustomerView, 'post', 0, {'name': 'Renamed'}).status_code, 302)
+
+
+# 'ImportTests' checks the bulk import of customers
+class ImportTests(TestCase):
+
+    # 'run_import' imports the rows of a file with 'format'
+    def run_import(self, content, format):
+        rows = imports.read_rows(io.BytesIO(content.encode()), format)
+        return imports.CustomerImporter(chunk_size=2).run(rows)
+
+    # A JSON list is read in chunks, items that are split between chunks
+    # are read whole
+    @mock.patch.object(imports, 'JSON_CHUNK_SIZE', 3)
+    def test_json_list(self):
+        result = self.run_import('[{"name": "First"}, {"name": "x"}, 12.5e1, {"name": "Third"}]\n', 'json')
+        self.assertEqual((result.created, result.failed), (2, 2))
+        self.assertEqual([row for row, messages in result.errors], [2, 3])
+        self.assertEqual(sorted(Customer.objects.values_list('name', flat=True)), ['First', 'Third'])
+
+    @mock.patch.object(imports, 'JSON_CHUNK_SIZE', 3)
+    def test_invalid_json_list(self):
+        for content in ('[{"name": "First"},]', '[{"name": "First"}', '[] []'):
+            with self.assertRaises(ValueError):
+                self.run_import(content, 'json')
+
+    def test_json_lines_and_csv(self):
+        result = self.run_import('{"name": "First"}\nnot json\n{"name": "Second"}\n', 'json')
+        self.assertEqual((result.created, result.failed), (2, 1))
+        result = self.run_import('name\nThird\nFourth\n', 'csv')
+        self.assertEqual((result.created, result.failed), (2, 0))
+        self.assertEqual(Customer.objects.count(), 4)
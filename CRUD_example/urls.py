@@ -4,6 +4,9 @@
 #path is used to route the web app
 from django.urls import path
 
+#settings is used to choose between the regular and async views
+from django.conf import settings
+
 # Import the views the app will use.
 # I did not use 'import *' so that I can see which views I have implemented.
 # This helps me stay organized while working.
@@ -20,12 +23,30 @@ from CRUD_example.views import (
     NewSoftwareView,
     EditSoftwareView,
     DelSoftwareView,
+    LogoView,
     CustomerSoftwareView,
     NewCustomerSoftwareView,
     EditCustomerSoftwareView,
     DelCustomerSoftwareView,
+    ImportView,
+    LookupView,
+    BatchDeleteView,
+    BatchEditView,
+    InstrumentationView,
+    ApiListView,
+    ApiDetailView,
+)
+
+# Import the forms used by the batch edit views.
+from CRUD_example.forms import (
+    BatchEditCustomerForm,
+    BatchEditSoftwareForm,
+    BatchEditCustomerSoftwareForm,
 )
 
+# Import the models searched by the lookup views and changed by the batch views.
+from CRUD_example.models import Customer, Software, CustomerSoftware
+
 urlpatterns = [
     #home/index page
     path('', IndexView.as_view(), name='index'),
@@ -49,6 +70,14 @@ urlpatterns = [
     path('customers/edit/<int:id>', EditCustomerView.as_view(), name='editcustomer'),
     #delete customer view
     path('customers/delete/<int:id>', DelCustomerView.as_view(), name='delcustomer'),
+    #import customers page
+    path('customers/import', ImportView.as_view(importer='customers', title='Import Customers', columns=('name',), success_url='/customers'), name='importcustomers'),
+    #customer search used by the customer dropdown
+    path('customers/lookup', LookupView.as_view(model=Customer), name='lookupcustomers'),
+    #delete the selected customers
+    path('customers/batch/delete', BatchDeleteView.as_view(model=Customer, success_url='/customers'), name='batchdelcustomers'),
+    #edit the selected customers
+    path('customers/batch/edit', BatchEditView.as_view(model=Customer, form_class=BatchEditCustomerForm, title='Edit Customers', success_url='/customers'), name='batcheditcustomers'),
 
     #software model pages
 
@@ -60,6 +89,16 @@ urlpatterns = [
     path('software/edit/<int:id>', EditSoftwareView.as_view(), name='editsoftware'),
     #delete software view
     path('software/delete/<int:id>', DelSoftwareView.as_view(), name='delsoftware'),
+    #import software page
+    path('software/import', ImportView.as_view(importer='software', title='Import Software', columns=('name', 'image'), success_url='/software'), name='importsoftware'),
+    #software search used by the software dropdown
+    path('software/lookup', LookupView.as_view(model=Software), name='lookupsoftware'),
+    #delete the selected software
+    path('software/batch/delete', BatchDeleteView.as_view(model=Software, success_url='/software'), name='batchdelsoftware'),
+    #edit the selected software
+    path('software/batch/edit', BatchEditView.as_view(model=Software, form_class=BatchEditSoftwareForm, title='Edit Software', success_url='/software'), name='batcheditsoftware'),
+    #software logo thumbnail
+    path('logos/<str:name>', LogoView.as_view(), name='logo'),
 
     #customer - software relation model pages
 
@@ -71,4 +110,37 @@ urlpatterns = [
     path('customersoftware/edit/<int:id>', EditCustomerSoftwareView.as_view(), name='editcustomersoftware'),
     #delete customer - software relation view
     path('customersoftware/delete/<int:id>', DelCustomerSoftwareView.as_view(), name='delcustomersoftware'),
+    #delete the selected customer - software relations
+    path('customersoftware/batch/delete', BatchDeleteView.as_view(model=CustomerSoftware, success_url='/customersoftware'), name='batchdelcustomersoftware'),
+    #edit the selected customer - software relations
+    path('customersoftware/batch/edit', BatchEditView.as_view(model=CustomerSoftware, form_class=BatchEditCustomerSoftwareForm, title='Edit Customer Software Relations', success_url='/customersoftware'), name='batcheditcustomersoftware'),
+    #import customer - software relations page
+    path('customersoftware/import', ImportView.as_view(importer='customersoftware', title='Import Customer Software Relations', columns=('customer', 'software'), success_url='/customersoftware'), name='importcustomersoftware'),
+
+    #latency and query measurements of every url, for staff
+    path('instrumentation', InstrumentationView.as_view(), name='instrumentation'),
+
+    #JSON API, see 'CRUD_example/api.py'
+
+    #list and create customers
+    path('api/customers/', ApiListView.as_view(resource='customers'), name='apicustomers'),
+    #read, update and delete a customer
+    path('api/customers/<int:id>', ApiDetailView.as_view(resource='customers'), name='apicustomerdetail'),
+    #list and create software
+    path('api/software/', ApiListView.as_view(resource='software'), name='apisoftware'),
+    #read, update and delete a software
+    path('api/software/<int:id>', ApiDetailView.as_view(resource='software'), name='apisoftwaredetail'),
+    #list and create customer - software relations
+    path('api/customersoftware/', ApiListView.as_view(resource='customersoftware'), name='apicustomersoftware'),
+    #read, update and delete a customer - software relation
+    path('api/customersoftware/<int:id>', ApiDetailView.as_view(resource='customersoftware'), name='apicustomersoftwaredetail'),
 ]
+
+#under ASGI the table, create and edit pages can use async views instead
+if getattr(settings, 'ASYNC_VIEWS', False):
+    from CRUD_example.asyncviews import ASYNC_VIEWS
+    urlpatterns = [
+        path(str(pattern.pattern), ASYNC_VIEWS[pattern.name].as_view(), name=pattern.name)
+        if pattern.name in ASYNC_VIEWS else pattern
+        for pattern in urlpatterns
+    ]
@@ -26,11 +26,58 @@ from django.utils.decorators import method_decorator
 # class-based views without having to define and decorate a method.
 from django.contrib.auth.decorators import login_required
 
+# 'csv' is used to catch errors in uploaded CSV files.
+import csv
+
+# 'messages' shows the result of a delete or batch operation on the next page.
+from django.contrib import messages
+
+# 'ValidationError' and 'gettext' are used to add errors to forms.
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext as _
+
 # 'redirect' is used to return a 'HttpResponseRedirect' to redirect the user 
 # to another view, relative url, or absolute url.
 # 'render' is used to preprocess templates and generate an 'HttpResonse'.
 from django.shortcuts import redirect, render
 
+# 'Http404' is raised to show the 'Not Found' page.
+# 'FileResponse' streams a file to the user.
+# 'JsonResponse' returns data as JSON.
+from django.http import FileResponse, Http404, JsonResponse
+
+# 'settings' holds the project settings.
+from django.conf import settings
+
+# 'PermissionDenied' shows the 'Forbidden' page to users who are not staff.
+from django.core.exceptions import PermissionDenied
+
+# 'instrumentation_report' combines the measurements of every process.
+from CRUD_example.instrumentation import report as instrumentation_report
+
+# 'patch_cache_control' adds caching instructions to a response.
+# 'get_conditional_response' answers requests whose ETag did not change.
+# 'set_response_etag' sets the ETag of a response to a hash of its body.
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
+
+# 'http_date' formats the 'Last-Modified' header.
+from django.utils.http import http_date
+
+# 'ensure_csrf_cookie' sends the CSRF cookie to API clients
+from django.views.decorators.csrf import ensure_csrf_cookie
+
+# 'django_csrf_failure' is Django's page for requests failing the CSRF check
+from django.views.csrf import csrf_failure as django_csrf_failure
+
+# 'RESOURCES' are the resources of the JSON API.
+from CRUD_example.api import RESOURCES, ApiError, read_json
+
+# 'default_storage' is where the local copies of software logos are stored.
+from django.core.files.storage import default_storage
+
+# 'logos' stores local copies and thumbnails of software logos.
+from CRUD_example.logos import LOGO_FORMATS, thumbnail_path
+
 # Import the models used in the views.
 from CRUD_example.models import (
     Customer,
@@ -40,7 +87,6 @@ from CRUD_example.models import (
 
 # Import the forms used in the views.
 from CRUD_example.forms import (
-    EditSoftwareForm,
     RegisterForm,
     LoginForm,
     NewCustomerForm,
@@ -49,8 +95,44 @@ from CRUD_example.forms import (
     EditSoftwareForm,
     NewCustomerSoftwareForm,
     EditCustomerSoftwareForm,
+    ImportForm,
 )
 
+# 'IMPORTERS' contains the bulk importers used by 'ImportView'.
+# 'read_rows' reads the rows of an uploaded file.
+from CRUD_example.imports import IMPORTERS, read_rows
+
+# 'CursorPaginationMixin' adds cursor pagination to the table views.
+# 'CURSOR_FIELD' is also used to page the JSON API, and the cursor functions
+# to page 'LookupView'.
+from CRUD_example.pagination import (
+    CURSOR_FIELD,
+    CursorPaginationMixin,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+)
+
+# 'ExportMixin' adds CSV and JSON downloads to the table views.
+from CRUD_example.exports import ExportMixin
+
+# 'SearchMixin' adds a name search to the table views, 'prefix_search' finds
+# the objects of 'LookupView'.
+from CRUD_example.search import SearchMixin, prefix_search
+
+# 'ReplicaReadMixin' reads the table views from a replica database.
+from CRUD_example.replicas import ReplicaReadMixin
+
+# 'TableCacheMixin' caches the rendered tables.
+from CRUD_example.tablecache import TableCacheMixin
+
+# 'delete_selected' deletes objects, or adds a job deleting them
+# 'JobStatusMixin' shows the latest jobs of a table
+from CRUD_example.jobs import OBJECT_NAMES, JobStatusMixin, delete_selected
+
+# 'RateLimitMixin' limits how often the login and register forms are posted
+from CRUD_example.ratelimit import RateLimitMixin
+
 # Import the tables used in the views.
 from CRUD_example.tables import(
     CustomerTable,
@@ -59,6 +141,69 @@ from CRUD_example.tables import(
 )
 
 
+# 'EditObjectMixin' is used with a 'FormView' that edits an existing object.
+# The object is loaded once per request and the same instance is used by the
+# form for validation and saving, instead of being looked up again at each step.
+class EditObjectMixin:
+    # Set the model of the object to be edited
+    model = None
+
+    # 'get_object' loads the object with the 'id' from the url path.
+    def get_object(self):
+        # Set 'id' variable from the url path. This is slightly different
+        # from how you obtain a url parameter from the path.
+        # url variables are added to 'kwargs', whereas url parameters are
+        # added to the request object.
+        # Safeguard against non-existing 'id' with a default value
+        self.id = self.kwargs.get('id', -1)
+        # 'first' returns None if no object has this id
+        self.object = self.model.objects.filter(id=self.id).first()
+        if self.object is None:
+            # Object does not exist, set id to be -1
+            self.id = -1
+        return self.object
+
+    # This view needs special functionality so the 'get' operator
+    # is overriden, much like the 'LoginView'
+    def get(self, request, *args, **kwargs):
+        # Check if object with this id exists
+        if self.get_object() is None:
+            # redirect to 'success_url'
+            return redirect(self.get_success_url())
+        # Continue normally by calling the parent class's 'get' function.
+        return super().get(request, *args, **kwargs)
+
+    # The 'post' operator is also overriden to load the object
+    def post(self, request, *args, **kwargs):
+        if self.get_object() is None:
+            return redirect(self.get_success_url())
+        # Continue normally by calling the parent class's 'post' function.
+        return super().post(request, *args, **kwargs)
+
+    # 'get_form' is the function that creates and returns the form
+    # to be used in the template.
+    def get_form(self, form_class=None):
+        # Check if the form_class exists
+        if form_class is None:
+            # Set the form class if it does not exist
+            # 'get_form_class' gets the form class from the class's 'form_class' variable.
+            # If 'form_class' is not set, a configuration error is thrown.
+            form_class = self.get_form_class()
+
+        # Check if the object was loaded
+        if self.object is not None:
+            # Return a form populated with the object through the 'instance' variable
+            return form_class(instance=self.object, **self.get_form_kwargs())
+
+        # Something didn't exist, create a form with an instance that has an invalid id. This ensures the template
+        # will still display the correct text, but nothing will be updated if form is somehow posted.
+        form = form_class(instance=self.model(id=-1), **self.get_form_kwargs())
+        # Add empty cleaned_data and ValidationError
+        form.no_instance()
+        # Return form with error
+        return form
+
+
 # 'IndexView' is a 'TemplateView'.
 # 'IndexView' displays the home/root page using a template.
 class IndexView(TemplateView):
@@ -68,11 +213,13 @@ class IndexView(TemplateView):
 # 'RegisterView' is a 'FormView'.
 # 'RegisterView' displays the registration page using a template
 # and a form.
-class RegisterView(FormView):
+class RegisterView(RateLimitMixin, FormView):
     # Set the template to be used
     template_name = 'register.html'
     # Set the form to be used with the template
     form_class = RegisterForm
+    # Limit the posts with 'settings.RATE_LIMITS['register']'
+    rate_limit = 'register'
     # The url to be navigated to when the form is successfully submitted
     # with no ValidationErrors.
     success_url = '/login'
@@ -88,10 +235,11 @@ class RegisterView(FormView):
 
 # 'LoginView' is a 'FormView'.
 # 'LoginView' displays the login page using a template and a form.
-class LoginView(FormView):
+class LoginView(RateLimitMixin, FormView):
     template_name = 'login.html'
     form_class = LoginForm
     success_url = '/'
+    rate_limit = 'login'
     
     # This view is slightly different from the previous, despite
     # them extending from the same class.
@@ -117,6 +265,12 @@ class LoginView(FormView):
         # The form info is valid, attempt to authenticate the user with
         # credentials provided by the form.
         user  = form.auth()
+        return self.auth_response(form, user)
+
+    # 'auth_response' logs in the user returned by 'form.auth', or shows the
+    # form again if there is none. The async variant of this view hashes the
+    # password in another thread, then calls it.
+    def auth_response(self, form, user):
         # Obtain the 'next' parameter from the url. Use the success url if
         # it is not present.
         next = self.request.POST.get('next', self.success_url)
@@ -162,13 +316,22 @@ class LogoutView(View):
 
 # 'CustomersView' is a 'SingleTableView'
 # 'CustomersView' displays a table of 'Customer' objects.
-class CustomersView(SingleTableView):
+class CustomersView(SearchMixin, ExportMixin, JobStatusMixin, TableCacheMixin, CursorPaginationMixin, ReplicaReadMixin, SingleTableView):
     # Set the model to be represented in the 'SingleTableView'
     model = Customer
     # Set the table that will display the model
     table_class = CustomerTable
     # Set the template that the table will be rendered in
     template_name = 'customers/customers.html'
+    # Set the name of exported files
+    export_name = 'customers'
+    # Set the models shown in the table, the cached table is replaced when they change
+    cache_models = (Customer,)
+
+    # 'get_queryset' returns the objects the table will display.
+    # They are ordered by 'id' so pages are stable when the table is not sorted.
+    def get_queryset(self):
+        return Customer.objects.order_by('id')
 
 @method_decorator(login_required, name='dispatch')
 # 'NewCustomerView' is a 'FormView'
@@ -187,72 +350,13 @@ class NewCustomerView(FormView):
 @method_decorator(login_required, name='dispatch')
 # 'EditCustomerView' is a 'FormView'
 # 'EditCustomerView' displays a form to edit a 'Customer' object.
-class EditCustomerView(FormView):
+class EditCustomerView(EditObjectMixin, FormView):
+    # Set the model of the object to be edited
+    model = Customer
     template_name = 'customers/editcustomer.html'
     form_class = EditCustomerForm
     success_url = '/customers'
 
-    # This view needs special functionality so the 'get' operator
-    # is overriden, much like the 'LoginView'
-    def get(self, request, *args, **kwargs):
-        # Set 'id' variable from the url path. This is slightly different
-        # from how you obtain a url parameter from the path.
-        # url variables are added to 'kwargs', whereas url parameters are
-        # added to the request object.
-        # Safeguard against non-existing 'id' with a default value
-        self.id = kwargs.get('id', -1)
-        # Check if object with this id exists
-        customer = Customer.objects.filter(id=self.id)
-        if not customer.exists():
-            # Customer does not exist, set id to be -1
-            self.id = -1
-            # redirect to 'success_url'
-            return redirect(self.get_success_url())
-        # Continue normally by calling the parent class's 'get' function.
-        return super(FormView, self).get(request, *args, **kwargs)
-
-    # The 'post' operator is also overriden to set the 'id' variable
-    def post(self, request, *args, **kwargs):
-        # Set 'id' variable from the url path.
-        self.id = kwargs.get('id', -1)
-        # Check if object with this id exists
-        customer = Customer.objects.filter(id=self.id)
-        if not customer.exists():
-            # Customer does not exist, set id to be -1
-            self.id = -1
-            # redirect to 'success_url'
-            return redirect(self.get_success_url())
-        # Continue normally by calling the parent class's 'post' function.
-        return super(FormView, self).post(request, *args, **kwargs)
-
-    # 'get_form' is the function that creates and returns the form
-    # to be used in the template.
-    def get_form(self, form_class=None):
-        # Check if the form_class exists
-        if form_class is None:
-            # Set the form class if it does not exist
-            # 'get_form_class' gets the form class from the class's 'form_class' variable.
-            # If 'form_class' is not set, a configuration error is thrown. 
-            form_class = self.get_form_class()
-        
-        # Check if the 'id' exists
-        if self.id != -1:
-            # 'id' was not -1, meaning it is usable
-            # Get the 'Customer' object with this id
-            customer = Customer.objects.filter(id=self.id)
-            # Check if a 'Customer' object with the given id exists
-            if customer.exists():
-                # 'Customer' object exists, return a form populated with the object through the 'instance' variable
-                return form_class(instance=customer.first(), **self.get_form_kwargs())
-
-        # Something didn't exist, create a form with an instance that has an invalid id. This ensures the template
-        # will still display the correct text, but nothing will be updated if form is somehow posted.
-        form = form_class(instance=Customer(id=-1), **self.get_form_kwargs())
-        # Add empty cleaned_data and ValidationError
-        form.no_instance()
-        # Return form with error
-        return form
-
     def form_valid(self, form):
         # Update 'Customer' object using data submitted in form
         form.save()
@@ -266,18 +370,23 @@ class DelCustomerView(View):
     def get(self, request, *args, **kwargs):
         self.id = kwargs.get('id', -1)
         if self.id != -1:
-            customer = Customer.objects.filter(id=self.id)
-            if customer.exists():
-                customer.delete()
+            # Relations of the customer are deleted with it, by a job if
+            # 'settings.BACKGROUND_JOBS' is set
+            messages.success(request, delete_selected(Customer, [self.id]))
         return redirect('customers')
 
 @method_decorator(login_required, name='dispatch')
 # 'SoftwareView' is a 'SingleTableView'
 # 'SoftwareView' displays a table of 'Software' objects.
-class SoftwareView(SingleTableView):
+class SoftwareView(SearchMixin, ExportMixin, JobStatusMixin, TableCacheMixin, CursorPaginationMixin, ReplicaReadMixin, SingleTableView):
     model = Software
     table_class = SoftwareTable
     template_name = 'software/software.html'
+    export_name = 'software'
+    cache_models = (Software,)
+
+    def get_queryset(self):
+        return Software.objects.order_by('id')
 
 @method_decorator(login_required, name='dispatch')
 # 'NewSoftwareView' is a 'FormView'
@@ -294,40 +403,12 @@ class NewSoftwareView(FormView):
 @method_decorator(login_required, name='dispatch')
 # 'EditSoftwareView' is a 'FormView'
 # 'EditSoftwareView' displays a form to edit a 'Software' object.
-class EditSoftwareView(FormView):
+class EditSoftwareView(EditObjectMixin, FormView):
+    model = Software
     template_name = 'software/editsoftware.html'
     form_class = EditSoftwareForm
     success_url = '/software'
 
-    def get(self, request, *args, **kwargs):
-        self.id = kwargs.get('id', -1)
-        software = Software.objects.filter(id=self.id)
-        if not software.exists():
-            self.id = -1
-            return redirect(self.get_success_url())
-        return super(FormView, self).get(request, *args, **kwargs)
-
-    def post(self, request, *args, **kwargs):
-        self.id = kwargs.get('id', -1)
-        software = Software.objects.filter(id=self.id)
-        if not software.exists():
-            self.id = -1
-            return redirect(self.get_success_url())
-        return super(FormView, self).post(request, *args, **kwargs)
-
-    def get_form(self, form_class=None):
-        if form_class is None:
-            form_class = self.get_form_class()
-        
-        software = Software.objects.filter(id=self.id)
-        if self.id != -1:
-            if software.exists():
-                return form_class(instance=software.first(), **self.get_form_kwargs())
-
-        form = form_class(instance=Software(id=-1), **self.get_form_kwargs())
-        form.no_instance()
-        return form
-
     def form_valid(self, form):
         form.save()
         return redirect(self.get_success_url())
@@ -340,18 +421,62 @@ class DelSoftwareView(View):
     def get(self, request, *args, **kwargs):
         self.id = kwargs.get('id', -1)
         if self.id != -1:
-            software = Software.objects.filter(id=self.id)
-            if software.exists():
-                software.delete()
+            messages.success(request, delete_selected(Software, [self.id]))
         return redirect('software')
 
+# 'LogoView' is a 'View'
+# 'LogoView' serves the thumbnail of a software logo.
+# Logos are stored under the hash of their content, so a logo url always shows
+# the same image and browsers may cache it for as long as they like.
+class LogoView(View):
+
+    def get(self, request, *args, **kwargs):
+        name = kwargs.get('name', '')
+        # Only serve names created by 'store_logo'
+        digest, _, extension = name.partition('.')
+        if len(digest) != 64 or extension not in LOGO_FORMATS.values():
+            raise Http404()
+        if not default_storage.exists(thumbnail_path(name)):
+            raise Http404()
+        etag = '"' + digest + '"'
+        # A browser revalidating its copy gets a 304 without the file
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = FileResponse(
+                default_storage.open(thumbnail_path(name)),
+                content_type='image/png' if extension == 'png' else 'image/jpeg',
+            )
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=31536000, immutable=True)
+        return response
+
 @method_decorator(login_required, name='dispatch')
-class CustomerSoftwareView(SingleTableView):
+class CustomerSoftwareView(ExportMixin, TableCacheMixin, CursorPaginationMixin, ReplicaReadMixin, SingleTableView):
     # 'CustomerSoftwareView' is a 'SingleTableView'
     # 'CustomerSoftwareView' displays a table of 'CustomerSoftware' objects.
     model = CustomerSoftware
     table_class = CustomerSoftwareTable
     template_name = 'customersoftware/customersoftware.html'
+    export_name = 'customersoftware'
+    # The table also shows customer and software names and logos
+    cache_models = (CustomerSoftware, Customer, Software)
+
+    # 'get_queryset' returns the objects the table will display.
+    # The table shows fields of the related 'Customer' and 'Software' objects,
+    # so they are joined in the same query ('select_related') instead of being
+    # loaded one row at a time. 'only' limits the selected columns to the ones
+    # the table actually renders.
+    def get_queryset(self):
+        return CustomerSoftware.objects.select_related('cid', 'sid').only(
+            'id',
+            'cid__id',
+            'cid__name',
+            'sid__id',
+            'sid__name',
+            'sid__image',
+            'sid__logo',
+            'sid__image_status',
+        ).order_by('id')
 
 @method_decorator(login_required, name='dispatch')
 # 'NewCustomerSoftwareView' is a 'FormView'
@@ -362,56 +487,34 @@ class NewCustomerSoftwareView(FormView):
     success_url = '/customersoftware'
 
     def form_valid(self, form):
-        form.save()
+        # 'save' returns False if the relation already exists. The form is
+        # displayed again with the error it added.
+        if not form.save():
+            return self.form_invalid(form)
         return redirect(self.get_success_url())
 
 @method_decorator(login_required, name='dispatch')
 # 'EditCustomerSoftwareView' is a 'FormView'
 # 'EditCustomerSoftwareView' displays a form to edit a 'CustomerSoftware' object.
-class EditCustomerSoftwareView(FormView):
+class EditCustomerSoftwareView(EditObjectMixin, FormView):
+    model = CustomerSoftware
     template_name = 'customersoftware/editcustomersoftware.html'
     form_class = EditCustomerSoftwareForm
     success_url = '/customersoftware'
 
-    def get(self, request, *args, **kwargs):
-        self.id = kwargs.get('id', -1)
-        customersoftware = CustomerSoftware.objects.filter(id=self.id)
-        if not customersoftware.exists():
-            self.id = -1
-            return redirect(self.get_success_url())
-        return super(FormView, self).get(request, *args, **kwargs)
-
-    def post(self, request, *args, **kwargs):
-        self.id = kwargs.get('id', -1)
-        customersoftware = CustomerSoftware.objects.filter(id=self.id)
-        if not customersoftware.exists():
-            self.id = -1
-            return redirect(self.get_success_url())
-        return super(FormView, self).post(request, *args, **kwargs)
-
     def get_form(self, form_class=None):
-        if form_class is None:
-            form_class = self.get_form_class()
-        
-        if self.id != -1:
-            customerSoftware = CustomerSoftware.objects.filter(id=self.id)
-            if customerSoftware.exists():
-                # Get the 'CustomerSoftware' object from QuerySet
-                customerSoftware = customerSoftware.first()
-                # Create the form with the 'CustomerSoftware' object
-                form = form_class(instance=customerSoftware, **self.get_form_kwargs())
-                # Set initial value for the 'customer' dropdown
-                form.fields['customer'].initial = customerSoftware.cid
-                # Set initial value for the 'software' dropdown
-                form.fields['software'].initial = customerSoftware.sid
-                # Return the form
-                return form
-        form = form_class(instance=CustomerSoftware(id=-1), **self.get_form_kwargs())
-        form.no_instance()
+        form = super().get_form(form_class)
+        if self.object is not None:
+            # Set initial value for the 'customer' dropdown.
+            # The id is enough, so the 'Customer' object is not loaded.
+            form.fields['customer'].initial = self.object.cid_id
+            # Set initial value for the 'software' dropdown
+            form.fields['software'].initial = self.object.sid_id
         return form
 
     def form_valid(self, form):
-        form.save()
+        if not form.save():
+            return self.form_invalid(form)
         return redirect(self.get_success_url())
 
 @method_decorator(login_required, name='dispatch')
@@ -422,7 +525,283 @@ class DelCustomerSoftwareView(View):
     def get(self, request, *args, **kwargs):
         self.id = kwargs.get('id', -1)
         if self.id != -1:
-            customerSoftware = CustomerSoftware.objects.filter(id=self.id)
-            if customerSoftware.exists():
-                customerSoftware.delete()
-        return redirect('customersoftware')
\ No newline at end of file
+            # The relation is no longer counted by its customer and software
+            messages.success(request, delete_selected(CustomerSoftware, [self.id]))
+        return redirect('customersoftware')
+
+@method_decorator(login_required, name='dispatch')
+# 'LookupView' is a 'View'
+# 'LookupView' returns the objects whose name starts with the '?q=' parameter
+# as JSON. It is used by the 'LookupSelect' dropdowns so they do not have to
+# load every object. Results are sorted by name and paginated with a cursor:
+# 'more' tells whether there are others, and 'next' is the cursor of the page
+# after this one.
+# The model to search is given by 'model', which is set in 'urls'.
+class LookupView(View):
+    model = None
+    # Number of results per page
+    per_page = 20
+
+    def get(self, request, *args, **kwargs):
+        q = request.GET.get('q', '').strip()
+        queryset = prefix_search(self.model.objects.all(), q)
+        # The name, compared like 'prefix_search' sorts it, and the id
+        keys = list(queryset.query.order_by)
+
+        # Continue after the last result of the previous page.
+        # The search text is stored in the cursor so it is not used for another search.
+        cursor = decode_cursor(request.GET.get(CURSOR_FIELD, ''))
+        if cursor is not None and cursor[0] == q and isinstance(cursor[1], list) and len(cursor[1]) == 2:
+            queryset = queryset.filter(keyset_filter(keys, cursor[1]))
+
+        # Load one extra row to know if there is a next page
+        rows = list(queryset.values_list('id', 'name')[:self.per_page + 1])
+        next = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next = encode_cursor(q, [rows[-1][1], rows[-1][0]], 'next')
+
+        return JsonResponse({
+            'results': [{'id': id, 'text': name} for id, name in rows],
+            'more': next is not None,
+            'next': next,
+        })
+
+@method_decorator(login_required, name='dispatch')
+# 'ImportView' is a 'FormView'
+# 'ImportView' imports a CSV or JSON file of objects and displays a report of
+# the rows that were created or had errors.
+# The kind of objects to import is given by 'importer', which is set in 'urls'.
+class ImportView(FormView):
+    template_name = 'import.html'
+    form_class = ImportForm
+    # Key of 'IMPORTERS'
+    importer = None
+    # Title shown on the page
+    title = ''
+    # Columns expected in the file
+    columns = ()
+    success_url = '/'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['title'] = self.title
+        context['columns'] = self.columns
+        context['cancel_url'] = self.get_success_url()
+        return context
+
+    def form_valid(self, form):
+        importer = IMPORTERS[self.importer]()
+        try:
+            # Rows are read from the uploaded file while they are imported
+            result = importer.run(read_rows(form.cleaned_data['file'].file, form.cleaned_data['format']))
+        except (ValueError, csv.Error):
+            # The file is not valid CSV or JSON (or not UTF-8).
+            # Chunks imported before the error are kept.
+            form.add_error('file', ValidationError(_('File could not be read.')))
+            return self.form_invalid(form)
+        # Display the form again with the report
+        return self.render_to_response(self.get_context_data(form=form, result=result))
+
+
+# 'BATCH_FIELD' is the name of the table checkboxes holding the selected ids
+BATCH_FIELD = 'select'
+
+# 'MAX_BATCH_SIZE' is the largest number of objects changed at once. It is
+# below Django's 'DATA_UPLOAD_MAX_NUMBER_FIELDS', so larger batches get the
+# message of 'get_batch_ids' rather than an error page.
+MAX_BATCH_SIZE = 500
+
+
+# 'get_batch_ids' returns the ids selected with the table checkboxes.
+# If more than 'MAX_BATCH_SIZE' objects are selected, nothing is changed: an
+# error message is shown and no ids are returned.
+def get_batch_ids(request):
+    ids = set()
+    for value in request.POST.getlist(BATCH_FIELD):
+        try:
+            ids.add(int(value))
+        except ValueError:
+            pass
+    if len(ids) > MAX_BATCH_SIZE:
+        messages.error(request, 'Select at most {} rows at once.'.format(MAX_BATCH_SIZE))
+        return []
+    return sorted(ids)
+
+
+@method_decorator(login_required, name='dispatch')
+# 'BatchDeleteView' is a 'View'
+# 'BatchDeleteView' deletes every object selected in a table in one transaction
+# and reports how many objects were deleted, including the relations deleted
+# with them. The model is given by 'model', which is set in 'urls'.
+# Customers and software are deleted by a job if 'settings.BACKGROUND_JOBS' is set.
+class BatchDeleteView(View):
+    model = None
+    success_url = '/'
+
+    def post(self, request, *args, **kwargs):
+        ids = get_batch_ids(request)
+        if ids:
+            messages.success(request, delete_selected(self.model, ids))
+        return redirect(self.success_url)
+
+
+@method_decorator(login_required, name='dispatch')
+# 'BatchEditView' is a 'FormView'
+# 'BatchEditView' changes every object selected in a table with a single update.
+# The selected ids are posted from the table, which displays the form. Posting
+# the form applies it to the same ids.
+# The model and form are given by 'model' and 'form_class', set in 'urls'.
+class BatchEditView(FormView):
+    template_name = 'batchedit.html'
+    model = None
+    title = ''
+    success_url = '/'
+
+    def post(self, request, *args, **kwargs):
+        self.ids = get_batch_ids(request)
+        if not self.ids:
+            return redirect(self.get_success_url())
+        if 'apply' not in request.POST:
+            # Posted from the table, display an empty form
+            return self.render_to_response(self.get_context_data())
+        return super().post(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        # Only reachable from the table
+        return redirect(self.get_success_url())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['title'] = self.title
+        context['ids'] = self.ids
+        context['batch_field'] = BATCH_FIELD
+        context['cancel_url'] = self.get_success_url()
+        return context
+
+    def form_valid(self, form):
+        count = form.save(self.ids)
+        if count is False:
+            return self.form_invalid(form)
+        messages.success(self.request, 'Updated {} {}.'.format(count, OBJECT_NAMES[self.model]))
+        return redirect(self.get_success_url())
+
+@method_decorator(login_required, name='dispatch')
+# 'InstrumentationView' is a 'View'
+# 'InstrumentationView' returns the measurements of every url as JSON, see
+# 'instrumentation'. Only staff users may see it.
+class InstrumentationView(View):
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            raise PermissionDenied()
+        return JsonResponse({
+            'enabled': getattr(settings, 'INSTRUMENTATION', False),
+            'views': instrumentation_report(),
+        })
+
+
+@method_decorator(ensure_csrf_cookie, name='dispatch')
+# 'ApiView' is a 'View'
+# 'ApiView' is the base of the JSON API views, see 'api'. Users log in with
+# the login page, unauthenticated requests get a 401 response instead of the
+# login page. The resource is given by 'resource', which is set in 'urls'.
+# Requests other than GET are checked for CSRF like the forms: every response
+# sets the 'csrftoken' cookie, which must be sent back in the 'X-CSRFToken'
+# header. Requests failing the check get a JSON 403, see 'csrf_failure'.
+class ApiView(View):
+    # Key of 'RESOURCES'
+    resource = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication required.'}, status=401)
+        self.api = RESOURCES[self.resource]()
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as error:
+            return error.response()
+
+    # 'json_response' returns 'data' with the ETag and date of a GET response,
+    # or a 304 response if the request has the same ETag
+    def json_response(self, data, last_modified):
+        response = JsonResponse(data)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        # Clients must check the ETag before using their copy
+        patch_cache_control(response, private=True, no_cache=True)
+        set_response_etag(response)
+        return get_conditional_response(self.request, etag=response['ETag'], response=response)
+
+    # 'get_object' loads the object with the 'id' from the url path
+    def get_object(self):
+        obj = self.api.model.objects.filter(id=self.kwargs['id']).first()
+        if obj is None:
+            raise ApiError(404, 'Not found.')
+        return obj
+
+    # 'object_response' returns an object after it was saved
+    def object_response(self, request, id, status=200):
+        row, last_modified = self.api.retrieve(request, id)
+        if row is None:
+            # The object was deleted in the meantime
+            raise ApiError(404, 'Not found.')
+        return JsonResponse(row, status=status)
+
+
+# 'ApiListView' is an 'ApiView'
+# 'ApiListView' lists the objects of a resource and creates new ones.
+# Lists are paged with the cursor in 'next', and can be sorted with
+# '?ordering=' and restricted to some fields with '?fields='.
+class ApiListView(ApiView):
+
+    def get(self, request, *args, **kwargs):
+        rows, cursor, last_modified = self.api.list(request)
+        next = None
+        if cursor is not None:
+            params = request.GET.copy()
+            params[CURSOR_FIELD] = cursor
+            next = request.build_absolute_uri('?' + params.urlencode())
+        return self.json_response({'results': rows, 'next': next}, last_modified)
+
+    def post(self, request, *args, **kwargs):
+        id = self.api.create(read_json(request))
+        response = self.object_response(request, id, status=201)
+        response['Location'] = request.build_absolute_uri(request.path + str(id))
+        return response
+
+
+# 'ApiDetailView' is an 'ApiView'
+# 'ApiDetailView' returns, updates and deletes an object of a resource.
+# 'PUT' needs every writable field, 'PATCH' only the fields that change.
+class ApiDetailView(ApiView):
+
+    def get(self, request, *args, **kwargs):
+        row, last_modified = self.api.retrieve(request, kwargs['id'])
+        if row is None:
+            raise ApiError(404, 'Not found.')
+        return self.json_response(row, last_modified)
+
+    def put(self, request, *args, **kwargs):
+        data = read_json(request)
+        self.api.update(self.get_object(), data, partial=False)
+        return self.object_response(request, kwargs['id'])
+
+    def patch(self, request, *args, **kwargs):
+        data = read_json(request)
+        self.api.update(self.get_object(), data, partial=True)
+        return self.object_response(request, kwargs['id'])
+
+    def delete(self, request, *args, **kwargs):
+        return JsonResponse({'detail': self.api.delete(self.get_object())})
+
+
+# 'csrf_failure' is 'settings.CSRF_FAILURE_VIEW'. Requests to the JSON API
+# that fail the CSRF check get a JSON response, the pages get Django's page.
+def csrf_failure(request, reason=''):
+    view = getattr(getattr(request, 'resolver_match', None), 'func', None)
+    if issubclass(getattr(view, 'view_class', object), ApiView):
+        return JsonResponse({
+            'detail': 'CSRF check failed: {} Send the csrftoken cookie in an X-CSRFToken header.'.format(reason),
+        }, status=403)
+    return django_csrf_failure(request, reason)
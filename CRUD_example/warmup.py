@@ -0,0 +1,47 @@
+# 'warmup' contains the work done when the server starts so the first
+# requests are not slower than the others.
+# With the cached template loader every template is read and parsed on first
+# use, then kept in memory. 'warm_templates' uses every template up front,
+# which fills the cache before the first request is served.
+
+# 'Path' is used to find the templates of the app
+from pathlib import Path
+
+# 'settings' holds the project settings
+from django.conf import settings
+
+# 'engines' holds the configured template engines
+from django.template import engines
+
+# The tables are rendered with templates from 'django_tables2'
+from CRUD_example.tables import (
+    CustomerTable,
+    SoftwareTable,
+    CustomerSoftwareTable,
+)
+
+
+# 'TEMPLATE_DIR' holds the templates of the app
+TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates'
+
+
+# 'template_names' returns the names of every template the pages use
+def template_names():
+    names = [path.relative_to(TEMPLATE_DIR).as_posix() for path in sorted(TEMPLATE_DIR.rglob('*.html'))]
+    for table in (CustomerTable, SoftwareTable, CustomerSoftwareTable):
+        if table._meta.template_name not in names:
+            names.append(table._meta.template_name)
+    return names
+
+
+# 'warm_templates' compiles every template and returns how many there were.
+# It does nothing unless 'settings.TEMPLATE_WARMUP' is set, since templates
+# are not kept without the cached loader.
+def warm_templates():
+    if not getattr(settings, 'TEMPLATE_WARMUP', False):
+        return 0
+    engine = engines['django']
+    names = template_names()
+    for name in names:
+        engine.get_template(name)
+    return len(names)
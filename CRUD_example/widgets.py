@@ -0,0 +1,42 @@
+# 'widgets' contains custom form widgets
+from django import forms
+
+# 'reverse' converts a url name into a url
+from django.urls import reverse
+
+
+# 'LookupSelect' is a 'Select'
+# 'LookupSelect' is a dropdown for a 'ModelChoiceField' with many objects.
+# A regular 'Select' renders an <option> for every object in the queryset.
+# 'LookupSelect' only renders the selected object, and a search box next to it
+# loads matching objects from a lookup url (see 'LookupView') while typing.
+class LookupSelect(forms.Select):
+    template_name = 'widgets/lookupselect.html'
+
+    # 'lookup_url' is the name of the url that returns matching objects
+    def __init__(self, lookup_url, attrs=None):
+        super().__init__(attrs)
+        self.lookup_url = lookup_url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['lookup_url'] = reverse(self.lookup_url)
+        return context
+
+    # 'optgroups' returns the options to render. Only the selected object is
+    # loaded, instead of every object in the queryset.
+    def optgroups(self, name, value, attrs=None):
+        ids = []
+        for v in value:
+            try:
+                ids.append(int(v))
+            except (TypeError, ValueError):
+                pass
+        selected = list(self.choices.queryset.filter(pk__in=ids)) if ids else []
+
+        groups = []
+        # Empty option, selected when there is no valid value
+        groups.append((None, [self.create_option(name, '', self.choices.field.empty_label or '', not selected, 0, attrs=attrs)], 0))
+        for index, obj in enumerate(selected, start=1):
+            groups.append((None, [self.create_option(name, obj.pk, str(obj), True, index, attrs=attrs)], index))
+        return groups
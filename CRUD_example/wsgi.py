@@ -14,3 +14,14 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CRUD_example.settings')
 
 application = get_wsgi_application()
+
+# Switch SQLite to 'settings.SQLITE_JOURNAL_MODE', see 'CRUD_example/db.py'
+from CRUD_example.db import set_journal_modes
+
+set_journal_modes()
+
+# Compile the templates before the first request, see 'CRUD_example/warmup.py'.
+# Django is set up by now, so the app can be imported.
+from CRUD_example.warmup import warm_templates
+
+warm_templates()